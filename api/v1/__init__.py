@@ -28,6 +28,8 @@ from api.v1.tags import api as tags_namespace
 from api.v1.discussions import api as discussions_namespace
 from api.v1.posts import api as posts_namespace
 from api.v1.home import api as home_namespace
+from api.v1.autocomplete import api as autocomplete_namespace
+from api.v1.jobs import api as jobs_namespace
 
 # Register API namespaces
 api.add_namespace(users_namespace)
@@ -48,4 +50,6 @@ api.add_namespace(favourites_namespace)
 api.add_namespace(tags_namespace)
 api.add_namespace(discussions_namespace)
 api.add_namespace(posts_namespace)
-api.add_namespace(home_namespace)
\ No newline at end of file
+api.add_namespace(home_namespace)
+api.add_namespace(autocomplete_namespace)
+api.add_namespace(jobs_namespace)
\ No newline at end of file
@@ -0,0 +1,20 @@
+from flask import request
+from flask_restx import Namespace, Resource
+
+from services import autocomplete
+from . import api as api_v1
+
+api = Namespace('autocomplete', description='Typeahead operations')
+
+@api.route('/')
+@api.doc(params={ 'query': 'Prefix of a Game title, Developer name or Publisher name', 'limit': 'Number of suggestions (at most 25)' })
+class Autocomplete(Resource):
+    def get(self):
+        """
+        Get Game, Developer and Publisher name suggestions ranked by popularity
+        """
+        query = request.args.get('query') or ''
+        limit = request.args.get('limit', 10, type=int)
+        limit = max(1, min(limit, 25))
+
+        return autocomplete.complete(query, limit)
@@ -7,6 +7,7 @@ from marshmallow import ValidationError
 from models import DateType
 from .schemas import date_type_schema, date_types_schema
 from . import api as api_v1
+from .pagination import paginate
 
 api = Namespace('datetypes', description='Date Type operations')
 
@@ -36,19 +37,7 @@ class DateTypes(Resource):
         per_page = 8
         search = request.args.get('search') or ''
 
-        date_types = DateType.query.filter(DateType.name.like('%' + search + '%')).order_by(DateType.name.asc()).paginate(page,per_page,error_out=False)
-        response = {
-            'items': date_types_schema.dump(date_types.items),
-            'has_next': date_types.has_next,
-            'has_prev': date_types.has_prev,
-            'next_num': date_types.next_num,
-            'prev_num': date_types.prev_num,
-            'page': date_types.page,
-            'per_page': date_types.per_page,
-            'pages': date_types.pages,
-            'total': date_types.total       
-        }
-        return response
+        return paginate(DateType.query.filter(DateType.format.like('%' + search + '%')), date_types_schema, page, per_page, (DateType.format.asc(), DateType.id.asc()))
 
     @flask_praetorian.roles_required('admin')
     @api.expect(a_date_type)
@@ -5,8 +5,10 @@ from marshmallow import ValidationError
 from datetime import datetime
 
 from models import Discussion
+from services import view_counter
 from .schemas import discussion_schema, discussions_schema, user_schema, discussion_post_schema, discussion_patch_schema
 from . import api as api_v1
+from .streaming import stream
 
 api = Namespace('discussions', description='Discussion operations')
 
@@ -22,8 +24,7 @@ class Discussions(Resource):
         """
         List Discussions
         """
-        discussions = Discussion.query.all()
-        return discussions_schema.dump(discussions)
+        return stream(Discussion.query, discussions_schema)
 
     @flask_praetorian.auth_required
     @api.expect(a_discussion)
@@ -64,13 +65,8 @@ class SingleDiscussion(Resource):
         if discussion is None:
             return { 'message': 'Discussion does not exist'}, 404
 
-        # Update Discussion view count
-        discussion.view_count += 1
-
-        try:
-            db.session.commit()
-        except Exception:
-            return { 'message': 'Unable to update Discussion view count'}, 500
+        # Update Discussion view count (buffered and written in batches)
+        view_counter.increment(Discussion.view_count, discussion.id)
 
         return discussion_schema.dump(discussion)
 
@@ -6,6 +6,8 @@ from marshmallow import ValidationError
 from models import Favourite
 from .schemas import favourite_schema, favourites_schema, user_schema, favourite_post_schema, favourite_patch_schema
 from . import api as api_v1
+from .streaming import stream
+from .loaders import schema_options
 
 api = Namespace('favourites', description='Favourite operations')
 
@@ -19,8 +21,7 @@ class Favourites(Resource):
         """
         List Favourites
         """
-        favourites = Favourite.query.all()
-        return favourites_schema.dump(favourites)
+        return stream(Favourite.query, favourites_schema)
 
     @flask_praetorian.auth_required
     @api.expect(a_favourite)
@@ -120,7 +121,7 @@ class UserFavourites(Resource):
         """
         Get Favourites by User id
         """
-        user_favourites = Favourite.query.filter_by(user_id=id).all()
+        user_favourites = Favourite.query.options(*schema_options(favourites_schema)).filter_by(user_id=id).all()
         if user_favourites is None:
             return { 'message': 'User has no Favourites'}, 404
 
@@ -1,15 +1,20 @@
 import flask_praetorian
 from flask import request, json
 from flask_restx import Namespace, Resource, Api, fields
-from extensions import guard, db, upload_img, delete_img
+from extensions import guard, db
 from marshmallow import ValidationError, INCLUDE
-from utilities import get_auto_increment, base64_to_pillow_img, pillow_img_to_bytes, slugify_text
+from utilities import get_auto_increment, base64_to_pillow_img, pillow_img_to_bytes, slugify_text, parse_id_list, image_file_name
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import or_, and_
+from flask_sqlalchemy import Pagination
 
-from models import Game, Genre, User, Release, Favourite, LibraryEntry
+from models import Game, User, SimilarGame
+from services import title_index, facet_index, view_counter, trending, user_status, fuzzy_search
+from services.title_index import normalize_title
+from services.jobs import enqueue_image_upload, enqueue_image_delete
 from .schemas import games_schema, game_schema, genres_schema, user_schema, GameSchema
 from . import api as api_v1
+from .loaders import game_detail_options, game_list_options
+from .pagination import cursor_requested, cursor_response, decode_cursor, encode_cursor, pagination_response, InvalidCursor
 
 api = Namespace('games', description='Game operations')
 
@@ -19,6 +24,19 @@ a_game = api_v1.model('Game', {
     'synopsis': fields.String(required=True, description='Synopsis'),
 })
 
+def hydrate_games(game_ids, options=None):
+    """
+    Load Games by id, preserving the order of the ids
+    :param game_ids: List of Int
+    :param options: Loader options, defaults to the games_schema plan
+    :return: List of Game
+    """
+    if not game_ids:
+        return []
+    query = Game.query.options(*(game_list_options() if options is None else options))
+    games_by_id = { game.id: game for game in query.filter(Game.id.in_(game_ids)).all() }
+    return [games_by_id[game_id] for game_id in game_ids if game_id in games_by_id]
+
 @api.route('/search')
 class SearchGames(Resource):
     def get(self):
@@ -26,7 +44,14 @@ class SearchGames(Resource):
         Get 25 Games that match search criteria
         """
         query = request.args.get('query') or ''
-        games = Game.query.filter(Game.title.like('%' + query + '%')).limit(25).all()
+
+        # Typo tolerant, relevance ranked results on request or when no title contains the query
+        game_ids = []
+        if request.args.get('fuzzy') not in ('1', 'true'):
+            game_ids = title_index.search(query, limit=25)
+        if not game_ids:
+            game_ids = fuzzy_search.search(query, limit=25)
+        games = hydrate_games(game_ids, game_detail_options())
         return GameSchema(many=True, exclude=['user']).dump(games)
 
 @api.route('/', defaults={ 'page': 1 }, methods=['GET'])
@@ -43,49 +68,40 @@ class Games(Resource):
         # Request Parameters (Filters applied)
         search = request.args.get('search') or ''
         score = request.args.get('score') or 0
-        developer_ids = request.args.get('developers') or None
-        publisher_ids = request.args.get('publishers') or None
-        platform_ids = request.args.get('platforms') or None
-        genre_ids = request.args.get('genres') or None
-        
-        # Prepare query
-        query = Game.query
-
-        # Apply filters if applicable
-        if search:
-            query = query.filter(Game.title.like('%' + search + '%'))
-        if score and int(score) > 0:
-            query = query.filter(Game.score >= score)
-        if developer_ids:
-            developer_list = developer_ids.split(",")
-            query = query.filter(or_(
-                Game.developer_id.in_((developer_list)), # Primary Developers
-                Game.releases.any(Release.codeveloper_id.in_((developer_list))) # Codevelopers
-            ))
-        if publisher_ids:
-            publisher_list = publisher_ids.split(",")
-            query = query.filter(Game.releases.any(Release.publisher_id.in_((publisher_list))))
-        if platform_ids:
-            platform_list = platform_ids.split(",")
-            query = query.filter(Game.releases.any(Release.platform_id.in_((platform_list))))
-        if genre_ids:
-            genre_list = genre_ids.split(",")
-            query = query.filter(Game.genres.any(Genre.id.in_((genre_list))))
-
-        # Execute query
-        games = query.order_by(Game.popularity_rank.asc()).paginate(page,per_page,error_out=False)
-
-        response = {
-            'items': games_schema.dump(games.items),
-            'has_next': games.has_next,
-            'has_prev': games.has_prev,
-            'next_num': games.next_num,
-            'prev_num': games.prev_num,
-            'page': games.page,
-            'per_page': games.per_page,
-            'pages': games.pages,
-            'total': games.total       
+        filters = {
+            'developers': parse_id_list(request.args.get('developers')),
+            'publishers': parse_id_list(request.args.get('publishers')),
+            'platforms': parse_id_list(request.args.get('platforms')),
+            'genres': parse_id_list(request.args.get('genres')),
         }
+
+        # Like the baseline, a score of 0 or less applies no score filter (Games without a score stay listed)
+        min_score = max(int(score), 0)
+
+        # Resolve matching Games from the in-memory indexes (already in popularity order), then hydrate only the requested page.
+        # Broad search terms need no LIKE fallback: their ids are intersected in memory and never sent to the database.
+        search_ids = title_index.search(search) if search else None
+        matches = facet_index.filter(filters, min_score=min_score, game_ids=search_ids)
+
+        if cursor_requested():
+            after = request.args.get('after')
+            try:
+                after_values = decode_cursor(after, [Game.popularity_rank, Game.id]) if after else None
+            except InvalidCursor:
+                return { 'message': 'Invalid cursor'}, 400
+
+            game_ids = facet_index.page_after(matches, after_values, per_page + 1)
+            next_cursor = encode_cursor(facet_index.cursor_values(game_ids[per_page - 1])) if len(game_ids) > per_page else None
+            response = cursor_response(hydrate_games(game_ids[:per_page]), games_schema, per_page, next_cursor, len(matches))
+        else:
+            game_ids = facet_index.page(matches, page, per_page)
+            games = Pagination(None, page, per_page, len(matches), hydrate_games(game_ids))
+            response = pagination_response(games, games_schema)
+
+        # Per facet value counts for faceted navigation (opt-in)
+        if request.args.get('facets') in ('1', 'true'):
+            response['facets'] = facet_index.counts(filters, min_score=min_score, game_ids=search_ids, search=normalize_title(search) if search else None)
+
         return response
 
     @flask_praetorian.roles_required('admin')
@@ -113,20 +129,20 @@ class Games(Resource):
             except IndexError:
                 return { 'error': 'Unable to retrieve database auto increment value' }, 500
 
-            # Upload Icon
+            # Upload Icon (uploads are queued in the insert's transaction, a failed insert uploads nothing)
             icon_base64_string = req['icon'].split(',')[1]
             icon = base64_to_pillow_img(icon_base64_string)
-            icon_file_name = '{}.{}'.format(AUTO_INCREMENT, icon.format.lower())
+            icon_file_name = image_file_name(AUTO_INCREMENT, icon.format.lower())
             icon_bytes = pillow_img_to_bytes(icon)
-            upload_img(icon_bytes, icon.format.lower(), Key=icon_file_name, Prefix='games/icons')
+            enqueue_image_upload(db.session, icon_bytes, icon.format.lower(), icon_file_name, 'games/icons')
             new_game.icon = icon_file_name
 
             # Upload Banner
             banner_base64_string = req['banner'].split(',')[1]
             banner = base64_to_pillow_img(banner_base64_string)
-            banner_file_name = '{}.{}'.format(AUTO_INCREMENT, banner.format.lower())
+            banner_file_name = image_file_name(AUTO_INCREMENT, banner.format.lower())
             banner_bytes = pillow_img_to_bytes(banner)
-            upload_img(banner_bytes, banner.format.lower(), Key=banner_file_name, Prefix='games/banners')
+            enqueue_image_upload(db.session, banner_bytes, banner.format.lower(), banner_file_name, 'games/banners')
             new_game.banner = banner_file_name
 
             # Perform SQL Insertion Query
@@ -134,8 +150,6 @@ class Games(Resource):
                 db.session.add(new_game)
                 db.session.commit()
             except SQLAlchemyError:
-                delete_img(new_game.icon, Prefix='games/icons')
-                delete_img(new_game.banner, Prefix='games/banners')
                 db.session.rollback()
                 return { 'error': 'Unable to add Game' }, 500
             
@@ -147,14 +161,14 @@ class SingleGame(Resource):
         """
         Get Game by id
         """
-        game = Game.query.filter_by(id=id).first()
-        game.trending_page_views += 1
+        game = Game.query.options(*game_detail_options()).filter_by(id=id).first()
+        if game is None:
+            return { 'message': 'Game does not exist'}, 404
+
+        # Buffered and written in batches, so this read does not open a write transaction
+        view_counter.increment(Game.trending_page_views, game.id)
+        trending.record_view(game.id)
 
-        try:
-            db.session.commit()
-        except SQLAlchemyError:
-            return { 'error': 'Unable to update view count' }, 500
-        
         return game_schema.dump(game)
     
     @flask_praetorian.roles_required('admin')
@@ -184,20 +198,20 @@ class SingleGame(Resource):
             if edit_game.icon != icon_name:
                 icon_base64_string = req['icon'].split(',')[1]
                 icon = base64_to_pillow_img(icon_base64_string)
-                icon_file_name = '{}.{}'.format(game.id, icon.format.lower())
+                icon_file_name = image_file_name(game.id, icon.format.lower())
                 icon_bytes = pillow_img_to_bytes(icon)
-                delete_img(icon_name, Prefix='games/icons')
-                upload_img(icon_bytes, icon.format.lower(), Key=icon_file_name, Prefix='games/icons')
+                enqueue_image_delete(db.session, icon_name, 'games/icons')
+                enqueue_image_upload(db.session, icon_bytes, icon.format.lower(), icon_file_name, 'games/icons')
                 edit_game.icon = icon_file_name
 
             # Update Banner
             if edit_game.banner != banner_name:
                 banner_base64_string = req['banner'].split(',')[1]
                 banner = base64_to_pillow_img(banner_base64_string)
-                banner_file_name = '{}.{}'.format(game.id, banner.format.lower())
+                banner_file_name = image_file_name(game.id, banner.format.lower())
                 banner_bytes = pillow_img_to_bytes(banner)
-                delete_img(banner_name, Prefix='games/banners')
-                upload_img(banner_bytes, banner.format.lower(), Key=banner_file_name, Prefix='games/banners')
+                enqueue_image_delete(db.session, banner_name, 'games/banners')
+                enqueue_image_upload(db.session, banner_bytes, banner.format.lower(), banner_file_name, 'games/banners')
                 edit_game.banner = banner_file_name
 
             try:
@@ -217,19 +231,14 @@ class SingleGame(Resource):
         if game is None:
             return { 'message': 'Game does not exist'}, 404
 
+        # Images are deleted by the job workers once the Game is gone (and retried if Spaces fails)
         try:
+            enqueue_image_delete(db.session, game.icon, 'games/icons', delay=0)
+            enqueue_image_delete(db.session, game.banner, 'games/banners', delay=0)
             db.session.delete(game)
             db.session.commit()
         except Exception:
             return { 'message': 'Unable to delete Game'}, 500
-
-        del_icon = delete_img(game.icon, Prefix='games/icons')
-        if del_icon["ResponseMetadata"]["HTTPStatusCode"] != 204:
-            return { 'message': 'Unable to delete icon'}, 500
-
-        del_banner = delete_img(game.banner, Prefix='games/banners')
-        if del_banner["ResponseMetadata"]["HTTPStatusCode"] != 204:
-            return { 'message': 'Unable to delete banner'}, 500
         
         return { 'message': 'Game deleted successfully' }
 
@@ -239,10 +248,36 @@ class TrendingGames(Resource):
         """
         Get Trending Games
         """
-        games = Game.query.order_by(Game.trending_page_views.desc()).limit(6).all()
+        limit = 6
+        games = hydrate_games(trending.top(limit))
+
+        # Fill up with popular Games while there are not enough recent views
+        if len(games) < limit:
+            exclude = [game.id for game in games]
+            games += Game.query.options(*game_list_options()).filter(Game.id.notin_(exclude)).order_by(Game.popularity_rank.asc()).limit(limit - len(games)).all()
 
         return games_schema.dump(games)
 
+@api.route('/<int:id>/similar')
+@api.doc(params={ 'limit': 'Number of Games (at most 20)' })
+class SimilarGames(Resource):
+    def get(self, id):
+        """
+        Get Games most often found in the same Libraries as a Game
+        """
+        limit = request.args.get('limit', 10, type=int)
+        limit = max(1, min(limit, 20))
+
+        # Precomputed offline by scripts/update_similar_games.py
+        neighbours = db.session.query(SimilarGame.similar_game_id, SimilarGame.score)\
+            .filter(SimilarGame.game_id == id).order_by(SimilarGame.position.asc()).limit(limit).all()
+        similarity = dict(neighbours)
+
+        games = games_schema.dump(hydrate_games([game_id for game_id, score in neighbours]))
+        for game in games:
+            game['similarity'] = similarity[game['id']]
+        return games
+
 @api.route('/<int:id>/userStatus')
 class UserStatus(Resource):
     @flask_praetorian.auth_required
@@ -251,31 +286,33 @@ class UserStatus(Resource):
         Get User Library and Favourite Status
         """
         current_user = flask_praetorian.current_user()
-        favourite = False
-        library = False
-
-        favourite_count = Favourite.query.filter(and_(
-                Favourite.user_id==current_user.id, 
-                Favourite.game_id==id
-            )).count()
-
-        if favourite_count > 0:
-            favourite = True
-
-        library_count = LibraryEntry.query.filter(and_(
-                LibraryEntry.user_id==current_user.id, 
-                LibraryEntry.game_id==id
-            )).count()
-
-        if library_count > 0:
-            library = True
+        status = user_status.get(current_user.id, [id])[id]
 
         response = {
-            'favourite': json.dumps(favourite),
-            'library': json.dumps(library)
+            'favourite': json.dumps(status['favourite']),
+            'library': json.dumps(status['library'])
         }
         return response
 
+@api.route('/userStatus')
+@api.doc(params={ 'ids': 'Comma separated Game ids (at most 100)' })
+class BulkUserStatus(Resource):
+    @flask_praetorian.auth_required
+    def get(self):
+        """
+        Get User Library and Favourite Status for several Games
+        """
+        game_ids = list(dict.fromkeys(parse_id_list(request.args.get('ids'))))
+        if not game_ids:
+            return { 'message': 'No Game ids provided'}, 400
+        if len(game_ids) > 100:
+            return { 'message': 'Too many Game ids'}, 400
+
+        current_user = flask_praetorian.current_user()
+        statuses = user_status.get(current_user.id, game_ids)
+
+        return { str(game_id): status for game_id, status in statuses.items() }
+
 @api.route('/icon/<int:id>')
 class GameIcon(Resource):  
     @flask_praetorian.roles_required('admin')
@@ -297,10 +334,10 @@ class GameIcon(Resource):
 
             # Update Icon
             icon = base64_to_pillow_img(req['icon'])
-            icon_file_name = '{}.{}'.format(game.id, icon.format.lower())
+            icon_file_name = image_file_name(game.id, icon.format.lower())
             icon_bytes = pillow_img_to_bytes(icon)
-            delete_img(game.icon, Prefix='games/icons')
-            upload_img(icon_bytes, icon.format.lower(), Key=icon_file_name, Prefix='games/icons')
+            enqueue_image_delete(db.session, game.icon, 'games/icons')
+            enqueue_image_upload(db.session, icon_bytes, icon.format.lower(), icon_file_name, 'games/icons')
             game.icon = icon_file_name                
 
             try:
@@ -0,0 +1,20 @@
+import flask_praetorian
+from flask import request
+from flask_restx import Namespace, Resource
+
+from services import job_queue
+
+api = Namespace('jobs', description='Background job operations')
+
+@api.route('/stats')
+@api.doc(params={ 'window': 'Seconds of finished jobs the latency is measured over (default 3600)' })
+class JobStats(Resource):
+    @flask_praetorian.roles_required('admin')
+    def get(self):
+        """
+        Get background job queue depth and latency
+        """
+        window = request.args.get('window', 3600, type=int)
+        window = max(60, min(window, 86400))
+
+        return job_queue.stats(window)
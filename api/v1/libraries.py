@@ -1,12 +1,20 @@
 import flask_praetorian
+from flask import request, current_app as app
 from flask_restx import Namespace, Resource, Api, reqparse, fields
 from extensions import guard, db
 from marshmallow import ValidationError
 from sqlalchemy import and_
+from sqlalchemy.exc import SQLAlchemyError
+import csv, io, time
 
-from models import LibraryEntry
-from .schemas import library_entry_schema, library_entries_schema, library_entry_post_schema, library_entry_patch_schema, user_schema
+from models import LibraryEntry, LibrarySummary, PlayStatus, Release
+from .schemas import library_entry_schema, library_entries_schema, library_entry_post_schema, library_entry_patch_schema, library_import_schema, user_schema
 from . import api as api_v1
+from .streaming import stream, stream_rows
+from .pagination import paginate
+from .loaders import schema_options
+from services.library_summaries import COUNTERS
+from services.library_import import insert_library_entries
 
 api = Namespace('libraries', description='Library operations')
 
@@ -15,14 +23,58 @@ a_library_entry = api_v1.model('LibraryEntry', {
     'name': fields.String(required=True, description='Name'),
 })
 
+# Columns of exported Library Entries (the import accepts the same format and ignores id and timestamps)
+EXPORT_COLUMNS = ('id', 'game_id', 'release_id', 'play_status_id', 'score', 'own', 'digital', 'hours', 'notes', 'created_at', 'updated_at')
+
+def resolve_import_references(rows):
+    """
+    Check the Release and Play Status of every imported row with set-based queries, filling in game_id from the Release
+    :param rows: List of Dict (updated in place)
+    :return: Dict of row index => { field: [message] }
+    """
+    release_ids = sorted({ row['release_id'] for row in rows })
+    release_games = {}
+    for start in range(0, len(release_ids), 1000):
+        release_games.update(db.session.query(Release.id, Release.game_id).filter(Release.id.in_(release_ids[start:start + 1000])))
+    play_status_ids = { id for (id,) in db.session.query(PlayStatus.id) }
+
+    errors = {}
+    for i, row in enumerate(rows):
+        game_id = release_games.get(row['release_id'])
+        if game_id is None:
+            errors.setdefault(i, {})['release_id'] = ['Release does not exist']
+        elif row['game_id'] is not None and row['game_id'] != game_id:
+            errors.setdefault(i, {})['game_id'] = ['Release does not belong to Game']
+        else:
+            row['game_id'] = game_id
+        if row['play_status_id'] not in play_status_ids:
+            errors.setdefault(i, {})['play_status_id'] = ['Play Status does not exist']
+    return errors
+
+def summarize(counters, **extra):
+    """
+    Serialize Library totals
+    :param counters: Dict of LibrarySummary counter => value
+    :return: Dict
+    """
+    response = dict(extra)
+    response.update({
+        'entries': counters['entry_count'],
+        'score': round(counters['score_sum'] / counters['score_count'], 2) if counters['score_count'] else None,
+        'scored': counters['score_count'],
+        'hours': counters['hours'],
+        'own': counters['own_count'],
+        'digital': counters['digital_count'],
+    })
+    return response
+
 @api.route('/')
 class Libraries(Resource):
     def get(self):
         """
         List Libraries grouped by User
         """
-        user_libraries = LibraryEntry.query.all()
-        return library_entries_schema.dump(user_libraries)
+        return stream(LibraryEntry.query, library_entries_schema)
 
     @flask_praetorian.auth_required
     @api.expect(a_library_entry)
@@ -51,6 +103,48 @@ class Libraries(Resource):
         
         return library_entry_schema.dump(new_library_entry), 201
 
+@api.route('/import')
+class ImportLibrary(Resource):
+    @flask_praetorian.auth_required
+    def post(self):
+        """
+        Add many Library Entries at once, from a JSON list (or { entries: [...] }) or a CSV body (text/csv)
+        """
+        start = time.perf_counter()
+        if request.mimetype == 'text/csv':
+            # Empty cells are treated as missing values
+            reader = csv.DictReader(io.StringIO(request.get_data(as_text=True)))
+            payload = [{ name: value for name, value in row.items() if name is not None and value not in ('', None) } for row in reader]
+        else:
+            payload = request.get_json(silent=True)
+            if isinstance(payload, dict):
+                payload = payload.get('entries')
+
+        if not isinstance(payload, list) or not payload:
+            return { 'message': 'No Library Entries provided'}, 400
+        if len(payload) > app.config.get('LIBRARY_IMPORT_MAX_ENTRIES', 20000):
+            return { 'message': 'Too many Library Entries'}, 400
+
+        # Validate every row before writing any
+        try:
+            rows = library_import_schema.load(payload)
+        except ValidationError as err:
+            return { 'error': err.messages }, 400
+        errors = resolve_import_references(rows)
+        if errors:
+            return { 'error': errors }, 400
+
+        current_user = flask_praetorian.current_user()
+        try:
+            imported = insert_library_entries(db.session, current_user.id, rows)
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            return { 'message': 'Unable to import Library Entries'}, 500
+
+        elapsed = time.perf_counter() - start
+        return { 'imported': imported, 'seconds': round(elapsed, 3), 'entries_per_second': round(imported / elapsed) }, 201
+
 @api.route('/<int:id>')
 class SingleLibraryEntry(Resource):
     def get(self, id):
@@ -133,7 +227,7 @@ class RecentLibraryEntries(Resource):
         """
         Get Recent Library Entries
         """
-        recent_library_entries = LibraryEntry.query.order_by(LibraryEntry.created_at.desc()).limit(8).all()
+        recent_library_entries = LibraryEntry.query.options(*schema_options(library_entries_schema)).order_by(LibraryEntry.created_at.desc()).limit(8).all()
 
         return library_entries_schema.dump(recent_library_entries)
 
@@ -143,12 +237,44 @@ class UserLibrary(Resource):
         """
         Get Library Entries by User id
         """
-        user_library = LibraryEntry.query.filter_by(user_id=id).all()
+        user_library = LibraryEntry.query.options(*schema_options(library_entries_schema)).filter_by(user_id=id).all()
         if user_library is None:
             return { 'message': 'User has no Library'}, 404
 
         return library_entries_schema.dump(user_library)
 
+@api.route('/user/<int:id>/summary')
+class UserLibrarySummary(Resource):
+    def get(self, id):
+        """
+        Get Library totals by User id, overall and per Play Status
+        """
+        # Maintained on every Library Entry write, so this reads one row per Play Status instead of the whole Library
+        rows = db.session.query(LibrarySummary, PlayStatus.name)\
+            .join(PlayStatus, PlayStatus.id == LibrarySummary.play_status_id)\
+            .filter(LibrarySummary.user_id == id, LibrarySummary.entry_count > 0)\
+            .order_by(LibrarySummary.play_status_id.asc()).all()
+
+        play_statuses = []
+        total = dict.fromkeys(COUNTERS, 0)
+        for summary, name in rows:
+            counters = { counter: getattr(summary, counter) for counter in COUNTERS }
+            play_statuses.append(summarize(counters, id=summary.play_status_id, name=name))
+            for counter, value in counters.items():
+                total[counter] += value
+
+        return summarize(total, user_id=id, play_statuses=play_statuses)
+
+@api.route('/user/<int:id>/export')
+@api.doc(params={ 'format': 'json (default), ndjson or csv' })
+class ExportUserLibrary(Resource):
+    def get(self, id):
+        """
+        Export Library Entries by User id, streamed in the import format
+        """
+        query = db.session.query(*[getattr(LibraryEntry, name) for name in EXPORT_COLUMNS]).filter(LibraryEntry.user_id == id)
+        return stream_rows(query, LibraryEntry.id, EXPORT_COLUMNS, filename='library-{}'.format(id))
+
 @api.route('/user/<int:id>/status/<int:play_id>', defaults={ 'page': 1 }, methods=['GET'])
 @api.route('/user/<int:id>/status/<int:play_id>/page/<int:page>', methods=['GET'])
 class UserStatusLibrary(Resource):
@@ -159,22 +285,8 @@ class UserStatusLibrary(Resource):
         page = page
         per_page = 10
 
-        user_library = LibraryEntry.query.filter(LibraryEntry.user_id==id, LibraryEntry.play_status_id==play_id).paginate(page,per_page,error_out=False)
-        if user_library.items is None:
-            return { 'message': 'User has no Library'}, 404
-
-        response = {
-            'items': library_entries_schema.dump(user_library.items),
-            'has_next': user_library.has_next,
-            'has_prev': user_library.has_prev,
-            'next_num': user_library.next_num,
-            'prev_num': user_library.prev_num,
-            'page': user_library.page,
-            'per_page': user_library.per_page,
-            'pages': user_library.pages,
-            'total': user_library.total       
-        }
-        return response
+        query = LibraryEntry.query.filter(LibraryEntry.user_id==id, LibraryEntry.play_status_id==play_id)
+        return paginate(query, library_entries_schema, page, per_page, (LibraryEntry.id.asc(),))
 
 @api.route('/game/<int:id>')
 class GameUserLibrary(Resource):
@@ -185,7 +297,7 @@ class GameUserLibrary(Resource):
         """
         current_user = flask_praetorian.current_user()
         
-        user_library = LibraryEntry.query.filter(and_(
+        user_library = LibraryEntry.query.options(*schema_options(library_entries_schema)).filter(and_(
                 LibraryEntry.user_id==current_user.id, 
                 LibraryEntry.game_id==id
             )).all()
@@ -202,7 +314,7 @@ class RecentGameLibrary(Resource):
         Get recent Library Entries by Game id
         """
         
-        recent_library = LibraryEntry.query.filter(LibraryEntry.game_id==id).order_by(LibraryEntry.created_at.desc()).limit(4).all()
+        recent_library = LibraryEntry.query.options(*schema_options(library_entries_schema)).filter(LibraryEntry.game_id==id).order_by(LibraryEntry.created_at.desc()).limit(4).all()
         if recent_library is None:
             return { 'message': 'No Library Entries for specified Game'}, 404
 
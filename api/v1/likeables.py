@@ -1,7 +1,9 @@
 from extensions import db
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, select
 
 from models import Likeable
+from models.likeable import likeable_models
+from services.like_counts import apply_likeable_deltas
 
 class Likeables():
     def create(self, user_id, likeable_type, likeable_id, value):
@@ -43,6 +45,61 @@ class Likeables():
 
         return 200
 
+    def toggle(self, user_id, likeable_type, likeable_id, value):
+        """
+        Like/Dislike a model, or take the vote back when it is repeated, in one transaction
+        :param user_id: Int
+        :param likeable_type: String
+        :param likeable_id: Int
+        :param value: Int (1 like, 0 dislike)
+        :return: Dict of like_count, dislike_count, user_sentiment, None if the model does not exist
+        """
+        table = likeable_models[likeable_type].__table__
+        likeables = Likeable.__table__
+        vote = and_(
+            likeables.c.user_id == user_id,
+            likeables.c.likeable_type == likeable_type,
+            likeables.c.likeable_id == likeable_id,
+        )
+
+        try:
+            # Lock the liked row with the vote: concurrent clicks on it are applied one after the other
+            row = db.session.execute(
+                select([table.c.likes, table.c.dislikes, likeables.c.value])
+                    .select_from(table.outerjoin(likeables, vote))
+                    .where(table.c.id == likeable_id)
+                    .with_for_update()
+            ).first()
+            if row is None:
+                db.session.rollback()
+                return None
+            likes, dislikes, current = row
+
+            if current is None:
+                db.session.execute(likeables.insert().values(user_id=user_id, likeable_type=likeable_type, likeable_id=likeable_id, value=value))
+                sentiment = value
+            elif current != value:
+                db.session.execute(likeables.update().where(vote).values(value=value))
+                sentiment = value
+            else:
+                db.session.execute(likeables.delete().where(vote))
+                sentiment = None
+
+            # Core statements bypass the flush listener, so the counters are updated here
+            likes_delta = (sentiment == 1) - (current == 1)
+            dislikes_delta = (sentiment == 0) - (current == 0)
+            apply_likeable_deltas(db.session.connection(), { (likeable_type, likeable_id): [likes_delta, dislikes_delta] })
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return {
+            'like_count': likes + likes_delta,
+            'dislike_count': dislikes + dislikes_delta,
+            'user_sentiment': sentiment,
+        }
+
     def remove(self, user_id, likeable_type, likeable_id):
         """
         Remove a Likeable entry
@@ -69,17 +126,10 @@ class Likeables():
         """
         Get Like/Dislike count for specified Likeable id
         """
-        like_count = Likeable.query.filter(and_(
-                Likeable.likeable_id == likeable_id,
-                Likeable.likeable_type == likeable_type,
-                Likeable.value == 1, 
-            )).count()
-
-        dislike_count = Likeable.query.filter(and_(
-                Likeable.likeable_id == likeable_id,
-                Likeable.likeable_type == likeable_type,
-                Likeable.value == 0, 
-            )).count()
+        # Counters are kept on the liked row (see services/like_counts.py)
+        model = likeable_models[likeable_type]
+        counts = db.session.query(model.likes, model.dislikes).filter(model.id == likeable_id).first()
+        like_count, dislike_count = counts if counts is not None else (0, 0)
 
         response = {
             'like_count': like_count,
@@ -101,4 +151,20 @@ class Likeables():
 
         user_sentiment = None if likeable == None else likeable.value
 
-        return { 'user_sentiment': user_sentiment }
\ No newline at end of file
+        return { 'user_sentiment': user_sentiment }
+
+    def getUserSentiments(self, user_id, likeable_type, likeable_ids):
+        """
+        Get User Sentiment for several Likeable ids with one query
+        :return: Dict of likeable_id => 1, 0 or None
+        """
+        sentiments = dict.fromkeys(likeable_ids)
+        if likeable_ids:
+            votes = db.session.query(Likeable.likeable_id, Likeable.value).filter(and_(
+                    Likeable.user_id == user_id,
+                    Likeable.likeable_type == likeable_type,
+                    Likeable.likeable_id.in_(likeable_ids),
+                ))
+            sentiments.update(votes)
+
+        return sentiments
@@ -0,0 +1,128 @@
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, selectinload, load_only
+from marshmallow import fields
+from threading import Lock
+from weakref import WeakKeyDictionary
+
+from models import Game, Release, User
+
+"""
+Loader plans matching the nesting of the hot schemas in api/v1/schemas.py
+
+Many-to-one relationships are joined into the parent query; collections are
+loaded with one extra SELECT ... IN per level, so the number of queries stays
+constant however many Releases or Genres a Game has. Plans are functions
+because backref attributes (Release.platform, ...) only exist once the
+mappers are configured.
+
+schema_options() derives such a plan from any schema instead of writing one
+by hand.
+"""
+
+# Schema attributes that are not mapped but read relationships when dumped
+PROPERTY_RELATIONSHIPS = {
+    (User, 'rolenames'): ('roles',),
+}
+
+# Nesting deeper than this is loaded without column restrictions
+MAX_DEPTH = 4
+
+_derived = WeakKeyDictionary()
+_derived_lock = Lock()
+
+def release_options(path=None):
+    """
+    Loader options for ReleaseSchema
+    :param path: Loader option leading to the Releases (e.g. selectinload(Game.releases)), or None for a Release query
+    :return: List of loader options
+    """
+    related = (Release.platform, Release.publisher, Release.codeveloper, Release.region, Release.date_type)
+    if path is None:
+        return [joinedload(relationship) for relationship in related]
+    return [path.joinedload(relationship) for relationship in related]
+
+def game_detail_options():
+    """
+    Loader options for game_schema (developer, genres, releases)
+    :return: List of loader options
+    """
+    return [
+        joinedload(Game.developer),
+        selectinload(Game.genres),
+        *release_options(selectinload(Game.releases)),
+    ]
+
+def game_list_options():
+    """
+    Loader options for games_schema (developer, genres, user with rolenames)
+    :return: List of loader options
+    """
+    return [
+        joinedload(Game.developer),
+        selectinload(Game.genres),
+        joinedload(Game.user).selectinload(User.roles),
+    ]
+
+def schema_options(schema, model=None):
+    """
+    Derive loader options from what a schema dumps.
+
+    Honours the schema's only/exclude and walks fields.Nested (and the Related
+    fields ModelSchema generates): many-to-one relationships are joined,
+    collections select-in loaded, and each level only loads the columns the
+    schema dumps plus the keys needed to follow its relationships. Levels
+    dumping attributes that are neither columns nor listed in
+    PROPERTY_RELATIONSHIPS are loaded in full.
+    Only use it on read endpoints: columns left unloaded are fetched one
+    query per row if code outside the schema touches them.
+    :param schema: Schema instance
+    :param model: Model class, defaults to the schema's Meta.model
+    :return: List of loader options
+    """
+    with _derived_lock:
+        options = _derived.get(schema)
+    if options is None:
+        options = _schema_options(schema, model or schema.opts.model, None, 0)
+        with _derived_lock:
+            _derived[schema] = options
+    return options
+
+def _schema_options(schema, model, path, depth):
+    mapper = inspect(model)
+    columns = set(mapper.get_property_by_column(column).key for column in mapper.primary_key)
+    restrict = True
+    options = []
+
+    def follow(relationship, nested=None):
+        # Keep the local keys the loader needs to find the related rows
+        for column in relationship.local_columns:
+            if column.table in mapper.tables:
+                columns.add(mapper.get_property_by_column(column).key)
+        loader = selectinload if relationship.uselist else joinedload
+        attribute = getattr(model, relationship.key)
+        child = getattr(path, loader.__name__)(attribute) if path is not None else loader(attribute)
+        if nested is None or depth + 1 >= MAX_DEPTH:
+            options.append(child)
+        else:
+            options.extend(_schema_options(nested, relationship.mapper.class_, child, depth + 1))
+
+    for name, field in schema.dump_fields.items():
+        attribute = field.attribute or name
+        if attribute in mapper.column_attrs:
+            columns.add(attribute)
+        elif attribute in mapper.relationships:
+            follow(mapper.relationships[attribute], field.schema if isinstance(field, fields.Nested) else None)
+        elif not hasattr(model, attribute):
+            # Dumped as missing, nothing to load
+            continue
+        elif (model, attribute) in PROPERTY_RELATIONSHIPS:
+            for relationship in PROPERTY_RELATIONSHIPS[(model, attribute)]:
+                follow(mapper.relationships[relationship])
+        else:
+            restrict = False
+
+    if restrict:
+        options.append(path.load_only(*columns) if path is not None else load_only(*columns))
+    elif path is not None:
+        options.append(path)
+    return options
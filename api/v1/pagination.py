@@ -0,0 +1,189 @@
+from flask import request, current_app as app
+from sqlalchemy import and_, or_, false
+from sqlalchemy.sql import operators
+from binascii import Error as BinasciiError
+from datetime import date, datetime
+from threading import Lock
+import base64, json, time
+
+from .loaders import schema_options
+
+_count_cache = {}
+_count_cache_lock = Lock()
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(values):
+    """
+    Encode sort key values into an opaque cursor token
+    :param values: List
+    :return: String
+    """
+    payload = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token, columns=None):
+    """
+    Decode a cursor token back into sort key values
+    :param token: String
+    :param columns: List of Columns used to restore value types (e.g. datetimes)
+    :return: List
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (BinasciiError, ValueError, UnicodeDecodeError):
+        raise InvalidCursor(token)
+    if not isinstance(values, list) or (columns is not None and len(values) != len(columns)):
+        raise InvalidCursor(token)
+
+    if columns is not None:
+        try:
+            values = [_restore_type(column, value) for column, value in zip(columns, values)]
+        except (TypeError, ValueError):
+            raise InvalidCursor(token)
+    return values
+
+def cursor_requested():
+    """
+    Check if the client opted into cursor pagination (`?after=` with or without a token)
+    :return: Boolean
+    """
+    return 'after' in request.args
+
+def total_requested():
+    return request.args.get('total') in ('1', 'true')
+
+def pagination_response(pagination, schema):
+    """
+    Serialize a Flask-SQLAlchemy Pagination
+    :param pagination: Pagination
+    :param schema: Schema (many=True)
+    :return: Dict
+    """
+    return {
+        'items': schema.dump(pagination.items),
+        'has_next': pagination.has_next,
+        'has_prev': pagination.has_prev,
+        'next_num': pagination.next_num,
+        'prev_num': pagination.prev_num,
+        'page': pagination.page,
+        'per_page': pagination.per_page,
+        'pages': pagination.pages,
+        'total': pagination.total
+    }
+
+def cursor_response(items, schema, per_page, next_cursor, total=None):
+    """
+    Serialize one page of cursor pagination
+    :return: Dict
+    """
+    response = {
+        'items': schema.dump(items),
+        'has_next': next_cursor is not None,
+        'next': next_cursor,
+        'per_page': per_page,
+    }
+    if total is not None:
+        response['total'] = total
+    return response
+
+def paginate(query, schema, page, per_page, order_by):
+    """
+    Paginate and serialize a query.
+
+    Uses page number pagination unless the request carries `after`, in which
+    case the page starts after the row encoded in that cursor and only
+    per_page + 1 rows are fetched (no OFFSET, no COUNT). Add `total=1` to get
+    a total in cursor mode, served from a short-lived cached COUNT. Loader
+    options are derived from the schema.
+    :param query: Query
+    :param schema: Schema (many=True)
+    :param page: Int
+    :param per_page: Int
+    :param order_by: Ordering expressions forming a unique sort key, e.g. (Review.created_at.desc(), Review.id.desc())
+    :return: Response
+    """
+    if not cursor_requested():
+        return pagination_response(query.options(*schema_options(schema)).order_by(*order_by).paginate(page, per_page, error_out=False), schema)
+
+    keyset = [_keyset_column(expression) for expression in order_by]
+    columns = [column for column, descending in keyset]
+
+    total = cached_count(query) if total_requested() else None
+
+    after = request.args.get('after')
+    if after:
+        try:
+            values = decode_cursor(after, columns)
+        except InvalidCursor:
+            return { 'message': 'Invalid cursor'}, 400
+        query = query.filter(_after(keyset, values))
+
+    rows = query.options(*schema_options(schema)).order_by(*order_by).limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+
+    return cursor_response(items, schema, per_page, next_cursor, total)
+
+def cached_count(query):
+    """
+    COUNT(*) a query, reusing the result for identical queries for PAGINATION_COUNT_CACHE_SECONDS
+    :param query: Query
+    :return: Int
+    """
+    ttl = app.config.get('PAGINATION_COUNT_CACHE_SECONDS', 60)
+    compiled = query.statement.compile()
+    key = (str(compiled), tuple(sorted(compiled.params.items())))
+    now = time.monotonic()
+
+    with _count_cache_lock:
+        cached = _count_cache.get(key)
+        if cached is not None and now - cached[1] < ttl:
+            return cached[0]
+
+    total = query.order_by(None).count()
+    with _count_cache_lock:
+        for expired in [k for k, (_, at) in _count_cache.items() if now - at >= ttl]:
+            del _count_cache[expired]
+        _count_cache[key] = (total, now)
+    return total
+
+def _keyset_column(expression):
+    modifier = getattr(expression, 'modifier', None)
+    if modifier in (operators.desc_op, operators.asc_op):
+        return expression.element, modifier is operators.desc_op
+    return expression, False
+
+def _after(keyset, values):
+    # (a, b) > (x, y) expanded as: a > x OR (a = x AND b > y), honouring each column's direction
+    clauses = []
+    for i, (column, descending) in enumerate(keyset):
+        equal = [_equal(c, v) for (c, _), v in zip(keyset[:i], values[:i])]
+        clauses.append(and_(*equal, _beyond(column, values[i], descending)))
+    return or_(*clauses)
+
+def _equal(column, value):
+    return column.is_(None) if value is None else column == value
+
+def _beyond(column, value, descending):
+    # MySQL sorts NULL before every value, so it comes first ascending and last descending
+    nullable = getattr(column, 'nullable', True)
+    if value is None:
+        return false() if descending else column.isnot(None)
+    if descending:
+        return or_(column < value, column.is_(None)) if nullable else column < value
+    return column > value
+
+def _restore_type(column, value):
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
@@ -7,6 +7,8 @@ from marshmallow import ValidationError
 from models import Platform
 from .schemas import platform_schema, platforms_schema
 from . import api as api_v1
+from .streaming import stream
+from .pagination import paginate
 
 api = Namespace('platforms', description='Platform operations')
 
@@ -21,8 +23,7 @@ class AllPlatforms(Resource):
         """
         Get all Platforms
         """
-        platforms = Platform.query.all()
-        return platforms_schema.dump(platforms)
+        return stream(Platform.query, platforms_schema)
 
 @api.route('/', defaults={ 'page': 1 }, methods=['GET'])
 @api.route('/', methods=['POST'])
@@ -36,19 +37,7 @@ class Platforms(Resource):
         per_page = 8
         search = request.args.get('search') or ''
 
-        platforms = Platform.query.filter(Platform.name.like('%' + search + '%')).order_by(Platform.name.asc()).paginate(page,per_page,error_out=False)
-        response = {
-            'items': platforms_schema.dump(platforms.items),
-            'has_next': platforms.has_next,
-            'has_prev': platforms.has_prev,
-            'next_num': platforms.next_num,
-            'prev_num': platforms.prev_num,
-            'page': platforms.page,
-            'per_page': platforms.per_page,
-            'pages': platforms.pages,
-            'total': platforms.total       
-        }
-        return response
+        return paginate(Platform.query.filter(Platform.name.like('%' + search + '%')), platforms_schema, page, per_page, (Platform.name.asc(), Platform.id.asc()))
 
     @flask_praetorian.roles_required('admin')
     @api.expect(a_platform)
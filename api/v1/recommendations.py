@@ -6,6 +6,9 @@ from marshmallow import ValidationError
 from models import Recommendation
 from .schemas import recommendation_schema, recommendations_schema, user_schema, recommendation_post_schema, recommendation_patch_schema
 from . import api as api_v1
+from .streaming import stream
+from .pagination import paginate
+from .loaders import schema_options
 
 api = Namespace('recommendations', description='Recommendation operations')
 
@@ -20,8 +23,7 @@ class AllRecommendations(Resource):
         """
         Get all Recommendations
         """
-        recommendations = Recommendation.query.all()
-        return recommendations_schema.dump(recommendations)
+        return stream(Recommendation.query, recommendations_schema)
 
 @api.route('/', defaults={ 'page': 1 }, methods=['GET'])
 @api.route('/', methods=['POST'])
@@ -34,19 +36,7 @@ class Recommendations(Resource):
         page = page
         per_page = 8
 
-        recommendations = Recommendation.query.order_by(Recommendation.created_at.desc()).paginate(page,per_page,error_out=False)
-        response = {
-            'items': recommendations_schema.dump(recommendations.items),
-            'has_next': recommendations.has_next,
-            'has_prev': recommendations.has_prev,
-            'next_num': recommendations.next_num,
-            'prev_num': recommendations.prev_num,
-            'page': recommendations.page,
-            'per_page': recommendations.per_page,
-            'pages': recommendations.pages,
-            'total': recommendations.total       
-        }
-        return response
+        return paginate(Recommendation.query, recommendations_schema, page, per_page, (Recommendation.created_at.desc(), Recommendation.id.desc()))
 
     @flask_praetorian.auth_required
     @api.expect(a_recommendation)
@@ -81,7 +71,7 @@ class SingleRecommendation(Resource):
         """
         Get Recommendation by id
         """
-        recommendation = Recommendation.query.filter_by(id=id).first()
+        recommendation = Recommendation.query.options(*schema_options(recommendation_schema)).filter_by(id=id).first()
         if recommendation is None:
             return { 'message': 'Recommendation does not exist'}, 404
 
@@ -167,19 +157,7 @@ class GameRecommendations(Resource):
         page = page
         per_page = 8
 
-        recommendations = Recommendation.query.filter(Recommendation.game_id==id).order_by(Recommendation.created_at.desc()).paginate(page,per_page,error_out=False)
-        response = {
-            'items': recommendations_schema.dump(recommendations.items),
-            'has_next': recommendations.has_next,
-            'has_prev': recommendations.has_prev,
-            'next_num': recommendations.next_num,
-            'prev_num': recommendations.prev_num,
-            'page': recommendations.page,
-            'per_page': recommendations.per_page,
-            'pages': recommendations.pages,
-            'total': recommendations.total       
-        }
-        return response
+        return paginate(Recommendation.query.filter(Recommendation.game_id==id), recommendations_schema, page, per_page, (Recommendation.created_at.desc(), Recommendation.id.desc()))
 
 @api.route('/user/<int:id>', defaults={ 'page': 1 }, methods=['GET'])
 @api.route('/user/<int:id>/page/<int:page>', methods=['GET'])
@@ -191,16 +169,4 @@ class UserRecommendations(Resource):
         page = page
         per_page = 8
 
-        recommendations = Recommendation.query.filter(Recommendation.user_id==id).order_by(Recommendation.created_at.desc()).paginate(page,per_page,error_out=False)
-        response = {
-            'items': recommendations_schema.dump(recommendations.items),
-            'has_next': recommendations.has_next,
-            'has_prev': recommendations.has_prev,
-            'next_num': recommendations.next_num,
-            'prev_num': recommendations.prev_num,
-            'page': recommendations.page,
-            'per_page': recommendations.per_page,
-            'pages': recommendations.pages,
-            'total': recommendations.total       
-        }
-        return response
\ No newline at end of file
+        return paginate(Recommendation.query.filter(Recommendation.user_id==id), recommendations_schema, page, per_page, (Recommendation.created_at.desc(), Recommendation.id.desc()))
\ No newline at end of file
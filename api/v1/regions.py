@@ -7,6 +7,7 @@ from marshmallow import ValidationError
 from models import Region
 from .schemas import region_schema, regions_schema
 from . import api as api_v1
+from .pagination import paginate
 
 api = Namespace('regions', description='Region operations')
 
@@ -36,19 +37,7 @@ class Regions(Resource):
         per_page = 8
         search = request.args.get('search') or ''
 
-        regions = Region.query.filter(Region.name.like('%' + search + '%')).order_by(Region.name.asc()).paginate(page,per_page,error_out=False)
-        response = {
-            'items': regions_schema.dump(regions.items),
-            'has_next': regions.has_next,
-            'has_prev': regions.has_prev,
-            'next_num': regions.next_num,
-            'prev_num': regions.prev_num,
-            'page': regions.page,
-            'per_page': regions.per_page,
-            'pages': regions.pages,
-            'total': regions.total       
-        }
-        return response
+        return paginate(Region.query.filter(Region.name.like('%' + search + '%')), regions_schema, page, per_page, (Region.name.asc(), Region.id.asc()))
 
     @flask_praetorian.roles_required('admin')
     @api.expect(a_region)
@@ -5,6 +5,7 @@ from marshmallow import ValidationError, INCLUDE
 
 from models import Release, Game
 from .schemas import releases_schema, release_schema
+from .loaders import release_options
 from . import api as api_v1
 
 api = Namespace('releases', description='Release operations')
@@ -21,7 +22,7 @@ class Releases(Resource):
         """
         List Releases for specified game
         """
-        releases = Release.query.filter_by(game_id=id).all()
+        releases = Release.query.options(*release_options()).filter_by(game_id=id).all()
         return releases_schema.dump(releases)
 
     @flask_praetorian.roles_required('admin')
@@ -59,7 +60,7 @@ class SingleRelease(Resource):
         """
         Get Release by id
         """
-        release = Release.query.filter_by(id=id).first()
+        release = Release.query.options(*release_options()).filter_by(id=id).first()
         if release is None:
             return { 'message': 'Release does not exist'}, 404
 
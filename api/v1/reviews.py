@@ -1,15 +1,47 @@
 import flask_praetorian
+from flask import request
 from flask_restx import Namespace, Resource, Api, reqparse, fields
 from extensions import guard, db
 from marshmallow import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from utilities import get_current_user_id
 
 from models import Review
 from .schemas import review_schema, reviews_schema, user_schema, review_post_schema, review_patch_schema
 from . import api as api_v1
+from .streaming import stream
+from .pagination import paginate
+from .loaders import schema_options
 from api.v1.likeables import Likeables
 
 api = Namespace('reviews', description='Review operations')
 
+sentiment_doc = { 'sentiment': 'Set to 1 to embed the authenticated User\'s like (1) or dislike (0) as user_sentiment' }
+
+def paginate_reviews(query, page, per_page):
+    """
+    Paginate Reviews, newest first, embedding the authenticated User's sentiment on request (`sentiment=1`)
+    :param query: Query
+    :param page: Int
+    :param per_page: Int
+    :return: Response
+    """
+    user_id = None
+    if request.args.get('sentiment') in ('1', 'true'):
+        user_id = get_current_user_id()
+        if user_id is None:
+            return { 'message': 'Authentication required for sentiment'}, 401
+
+    response = paginate(query, reviews_schema, page, per_page, (Review.created_at.desc(), Review.id.desc()))
+    if user_id is None or not isinstance(response, dict):
+        return response
+
+    # One IN (...) query for the whole page instead of a user-sentiment request per Review
+    sentiments = Likeables.getUserSentiments(Likeables, user_id, Review.__name__.lower(), [item['id'] for item in response['items']])
+    for item in response['items']:
+        item['user_sentiment'] = sentiments[item['id']]
+    return response
+
 # Required for proper Swagger documentation via Flask RESTPlus (Deserialization is completed by marshmallow)
 a_review = api_v1.model('Review', {
     'summary': fields.String(required=True, description='Summary'),
@@ -23,13 +55,13 @@ class AllReviews(Resource):
         """
         Get all Reviews
         """
-        reviews = Review.query.all()
-        return reviews_schema.dump(reviews)
+        return stream(Review.query, reviews_schema)
 
 @api.route('/', defaults={ 'page': 1 }, methods=['GET'])
 @api.route('/', methods=['POST'])
 @api.route('/page/<int:page>', methods=['GET'])
 class Reviews(Resource):
+    @api.doc(params=sentiment_doc)
     def get(self, page):
         """
         List Reviews
@@ -37,19 +69,7 @@ class Reviews(Resource):
         page = page
         per_page = 8
 
-        reviews = Review.query.order_by(Review.created_at.desc()).paginate(page,per_page,error_out=False)
-        response = {
-            'items': reviews_schema.dump(reviews.items),
-            'has_next': reviews.has_next,
-            'has_prev': reviews.has_prev,
-            'next_num': reviews.next_num,
-            'prev_num': reviews.prev_num,
-            'page': reviews.page,
-            'per_page': reviews.per_page,
-            'pages': reviews.pages,
-            'total': reviews.total       
-        }
-        return response
+        return paginate_reviews(Review.query, page, per_page)
 
     @flask_praetorian.auth_required
     @api.expect(a_review)
@@ -84,7 +104,7 @@ class SingleReview(Resource):
         """
         Get Review by id
         """
-        review = Review.query.filter_by(id=id).first()
+        review = Review.query.options(*schema_options(review_schema)).filter_by(id=id).first()
         if review is None:
             return { 'message': 'Review does not exist'}, 404
 
@@ -164,6 +184,7 @@ class RecentReview(Resource):
 @api.route('/game/<int:id>', defaults={ 'page': 1 }, methods=['GET'])
 @api.route('/game/<int:id>/page/<int:page>', methods=['GET'])
 class GameReviews(Resource):
+    @api.doc(params=sentiment_doc)
     def get(self, page, id):
         """
         List Game Reviews
@@ -171,23 +192,12 @@ class GameReviews(Resource):
         page = page
         per_page = 8
 
-        reviews = Review.query.filter(Review.game_id==id).order_by(Review.created_at.desc()).paginate(page,per_page,error_out=False)
-        response = {
-            'items': reviews_schema.dump(reviews.items),
-            'has_next': reviews.has_next,
-            'has_prev': reviews.has_prev,
-            'next_num': reviews.next_num,
-            'prev_num': reviews.prev_num,
-            'page': reviews.page,
-            'per_page': reviews.per_page,
-            'pages': reviews.pages,
-            'total': reviews.total       
-        }
-        return response
+        return paginate_reviews(Review.query.filter(Review.game_id==id), page, per_page)
 
 @api.route('/user/<int:id>', defaults={ 'page': 1 }, methods=['GET'])
 @api.route('/user/<int:id>/page/<int:page>', methods=['GET'])
 class UserReviews(Resource):
+    @api.doc(params=sentiment_doc)
     def get(self, page, id):
         """
         List User Reviews
@@ -195,19 +205,7 @@ class UserReviews(Resource):
         page = page
         per_page = 8
 
-        reviews = Review.query.filter(Review.user_id==id).order_by(Review.created_at.desc()).paginate(page,per_page,error_out=False)
-        response = {
-            'items': reviews_schema.dump(reviews.items),
-            'has_next': reviews.has_next,
-            'has_prev': reviews.has_prev,
-            'next_num': reviews.next_num,
-            'prev_num': reviews.prev_num,
-            'page': reviews.page,
-            'per_page': reviews.per_page,
-            'pages': reviews.pages,
-            'total': reviews.total       
-        }
-        return response
+        return paginate_reviews(Review.query.filter(Review.user_id==id), page, per_page)
 
 @api.route('/<int:id>/like')
 class LikeReview(Resource):
@@ -218,28 +216,14 @@ class LikeReview(Resource):
         """
         current_user = flask_praetorian.current_user()
 
-        # Find Review
-        review = Review.query.filter_by(id=id).first()
-        if review is None:
-            return { 'message': 'Review does not exist'}, 404
-
-        # Like the Review
-        status_code = Likeables.create(Likeables, current_user.id, Review.__name__.lower(), review.id, 1)
-
-        if status_code == 500:
+        # Like the Review, returning the new counts and sentiment from the same transaction
+        try:
+            response = Likeables.toggle(Likeables, current_user.id, Review.__name__.lower(), id, 1)
+        except SQLAlchemyError:
             return { 'message': 'Unable to update like status for Review'}, 500
-        if status_code == 404:
-            return { 'message': 'Unable to find like for Review'}, 404
+        if response is None:
+            return { 'message': 'Review does not exist'}, 404
 
-        # Get likes/dislikes count
-        count = Likeables.getCount(Likeables, Review.__name__.lower(), review.id)
-        user_sentiment = Likeables.getUserSentiment(Likeables, current_user.id, Review.__name__.lower(), review.id)
-        
-        response = {
-            'like_count': count.get('like_count'),
-            'dislike_count': count.get('dislike_count'),
-            'user_sentiment': user_sentiment.get('user_sentiment')
-        }
         return response
 
 @api.route('/<int:id>/dislike')
@@ -251,28 +235,14 @@ class DislikeReview(Resource):
         """
         current_user = flask_praetorian.current_user()
 
-        # Find Review
-        review = Review.query.filter_by(id=id).first()
-        if review is None:
-            return { 'message': 'Review does not exist'}, 404
-
-        # Dislike the Review
-        status_code = Likeables.create(Likeables, current_user.id, Review.__name__.lower(), review.id, 0)
-
-        if status_code == 500:
+        # Dislike the Review, returning the new counts and sentiment from the same transaction
+        try:
+            response = Likeables.toggle(Likeables, current_user.id, Review.__name__.lower(), id, 0)
+        except SQLAlchemyError:
             return { 'message': 'Unable to update like status for Review'}, 500
-        if status_code == 404:
-            return { 'message': 'Unable to find dislike for Review'}, 404
+        if response is None:
+            return { 'message': 'Review does not exist'}, 404
 
-        # Get likes/dislikes count
-        count = Likeables.getCount(Likeables, Review.__name__.lower(), review.id)
-        user_sentiment = Likeables.getUserSentiment(Likeables, current_user.id, Review.__name__.lower(), review.id)
-        
-        response = {
-            'like_count': count.get('like_count'),
-            'dislike_count': count.get('dislike_count'),
-            'user_sentiment': user_sentiment.get('user_sentiment')
-        }
         return response
 
 @api.route('/<int:id>/user-sentiment')
@@ -1,6 +1,6 @@
 from models import *
 from extensions import db
-from marshmallow import fields, validate
+from marshmallow import Schema, fields, validate, EXCLUDE
 from marshmallow_sqlalchemy import ModelSchema
 
 # DateTypeSchema
@@ -94,7 +94,7 @@ class UserSchema(ModelSchema):
     class Meta:
         model = User
         sqla_session = db.session
-        fields = ("id", "username", "rolenames", "about_me", "avatar", "banner", "timezone", "birthday", "gender", "location", "created_at")
+        fields = ("id", "username", "rolenames", "about_me", "avatar", "banner", "timezone", "birthday", "gender", "location", "created_at", "follower_count", "following_count")
 
 user_schema = UserSchema()
 users_schema = UserSchema(only=("id", "username", "avatar", "rolenames"), many=True)
@@ -162,6 +162,22 @@ library_entries_schema = LibraryEntrySchema(many=True)
 library_entry_post_schema = LibraryEntrySchema(only=("game.id", "digital", "play_status", "score", "user", "release", "own", "notes", "hours"))
 library_entry_patch_schema = LibraryEntrySchema(only=("id", "digital", "play_status", "score", "own", "notes", "hours"))    
 
+# LibraryImportSchema (flat rows, references are resolved in bulk by the import endpoint)
+class LibraryImportSchema(Schema):
+    game_id = fields.Integer(missing=None, allow_none=True)
+    release_id = fields.Integer(required=True)
+    play_status_id = fields.Integer(required=True)
+    score = fields.Integer(missing=None, allow_none=True, validate=validate.Range(min=1, max=10))
+    own = fields.Integer(missing=1, validate=validate.OneOf([0, 1]))
+    digital = fields.Integer(missing=0, validate=validate.OneOf([0, 1]))
+    hours = fields.Integer(missing=None, allow_none=True, validate=validate.Range(min=0))
+    notes = fields.String(missing=None, allow_none=True, validate=validate.Length(max=255))
+
+    class Meta:
+        unknown = EXCLUDE
+
+library_import_schema = LibraryImportSchema(many=True)
+
 # ReviewSchema
 class ReviewSchema(ModelSchema):
     summary = fields.String(required=True, validate=[validate.Length(min=60, max=255)])
@@ -0,0 +1,117 @@
+from flask import Response, request, stream_with_context, current_app as app
+from sqlalchemy import inspect
+from datetime import date, datetime
+import csv, io, json, logging, time
+
+from extensions import db
+from .loaders import schema_options
+
+"""
+Streamed responses for endpoints that list a whole table.
+
+Rows are read in primary key order, STREAM_BATCH_SIZE at a time (keyset
+batches rather than yield_per, so each batch can still be eager loaded by
+schema_options()), serialized and written out before the next batch is read.
+Memory stays at one batch however large the table grows.
+"""
+
+logger = logging.getLogger(__name__)
+
+def ndjson_requested():
+    """
+    Check if the request asks for newline delimited JSON (`format=ndjson` or an application/x-ndjson Accept header)
+    :return: Boolean
+    """
+    return request.args.get('format') == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', '')
+
+def stream(query, schema):
+    """
+    Stream every row of a query as a JSON array, or as NDJSON on request
+    :param query: Query
+    :param schema: Schema (many=True)
+    :return: Response
+    """
+    mapper = inspect(schema.opts.model)
+    key = mapper.primary_key[0]
+    attribute = mapper.get_property_by_column(key).key
+    query = query.options(*schema_options(schema))
+
+    def batches():
+        # Drop each batch, and what it eager loaded, from the identity map so memory does not grow with the table.
+        # Objects the request loaded before streaming stay attached.
+        existing = set(db.session.identity_map.keys())
+        for items in _batches(query, key, lambda row: getattr(row, attribute), schema.dump):
+            for identity_key in set(db.session.identity_map.keys()) - existing:
+                obj = db.session.identity_map.get(identity_key)
+                if obj is not None:
+                    db.session.expunge(obj)
+            yield items
+
+    if ndjson_requested():
+        return Response(stream_with_context(_ndjson(batches())), mimetype='application/x-ndjson')
+    return Response(stream_with_context(_array(batches())), mimetype='application/json')
+
+def stream_rows(query, key, names, filename='export'):
+    """
+    Stream the rows of a column query as a JSON array, NDJSON (`format=ndjson`) or CSV (`format=csv`)
+    :param query: Query selecting the columns in `names`, `key` first
+    :param key: Column (unique, used to read in batches)
+    :param names: List of String
+    :param filename: String (CSV attachment name, without extension)
+    :return: Response
+    """
+    def dump(rows):
+        return [{ name: _plain(value) for name, value in zip(names, row) } for row in rows]
+
+    batches = _batches(query, key, lambda row: row[0], dump)
+    if request.args.get('format') == 'csv':
+        return Response(stream_with_context(_csv(batches, names)), mimetype='text/csv',
+                        headers={ 'Content-Disposition': 'attachment; filename="{}.csv"'.format(filename) })
+    if ndjson_requested():
+        return Response(stream_with_context(_ndjson(batches)), mimetype='application/x-ndjson')
+    return Response(stream_with_context(_array(batches)), mimetype='application/json')
+
+def _batches(query, key, key_of, dump):
+    batch_size = app.config.get('STREAM_BATCH_SIZE', 500)
+    query = query.order_by(key)
+    path = request.path
+    start = time.perf_counter()
+    count = 0
+    last = None
+    while True:
+        rows = (query if last is None else query.filter(key > last)).limit(batch_size).all()
+        if rows:
+            last = key_of(rows[-1])
+            count += len(rows)
+            yield dump(rows)
+        if len(rows) < batch_size:
+            break
+    elapsed = time.perf_counter() - start
+    logger.info('Streamed %d rows from %s in %.2fs (%.0f rows/s)', count, path, elapsed, count / elapsed if elapsed else 0)
+
+def _ndjson(batches):
+    for items in batches:
+        yield ''.join(json.dumps(item) + '\n' for item in items)
+
+def _array(batches):
+    yield '['
+    separator = ''
+    for items in batches:
+        if items:
+            yield separator + ','.join(json.dumps(item) for item in items)
+            separator = ','
+    yield ']'
+
+def _csv(batches, names):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=names)
+    writer.writeheader()
+    for items in batches:
+        writer.writerows(items)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
@@ -6,6 +6,7 @@ from marshmallow import ValidationError
 from models import Tag
 from .schemas import tag_schema, tags_schema
 from . import api as api_v1
+from .streaming import stream
 
 api = Namespace('tags', description='Forum Tag operations')
 
@@ -20,8 +21,7 @@ class Tags(Resource):
         """
         List Tags
         """
-        tags = Tag.query.all()
-        return tags_schema.dump(tags)
+        return stream(Tag.query, tags_schema)
 
     @flask_praetorian.roles_required('admin')
     @api.expect(a_tag)
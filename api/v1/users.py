@@ -1,14 +1,21 @@
 import flask_praetorian
-from flask import current_app as app
+from flask import request, current_app as app
 from flask_restx import Namespace, Resource, Api, reqparse, fields
-from extensions import guard, db, upload_img, delete_img
+from extensions import guard, db
 from marshmallow import ValidationError, INCLUDE
-from utilities import base64_to_pillow_img, pillow_img_to_bytes, base64_validation, get_base64_file_type
+from utilities import base64_to_pillow_img, pillow_img_to_bytes, base64_validation, get_base64_file_type, image_file_name
 import os, requests
 
-from models import User
-from .schemas import users_schema, user_schema, roles_schema
+from models import User, LibraryEntry, Review, Recommendation
+from .schemas import users_schema, user_schema, roles_schema, library_entries_schema, reviews_schema, recommendations_schema
 from . import api as api_v1
+from .streaming import stream
+from .pagination import paginate, encode_cursor, decode_cursor, InvalidCursor
+from .loaders import schema_options
+from services.activity_feed import activity_feed
+from services.password_hasher import password_hasher, PasswordHasherBusy
+from services.jobs import enqueue_registration_email, enqueue_image_upload, enqueue_image_delete
+from services.follow_graph import is_following, follow as follow_user, unfollow as unfollow_user, followers_query, following_query
 
 api = Namespace('users', description='User operations')
 
@@ -26,8 +33,72 @@ class UserList(Resource):
         """
         List Users
         """
-        users = User.query.all()
-        return users_schema.dump(users)
+        return stream(User.query, users_schema)
+
+# activity_type => (model, schema) used to serialize feed items
+FEED_SUBJECTS = {
+    'library_entry': (LibraryEntry, library_entries_schema),
+    'review': (Review, reviews_schema),
+    'recommendation': (Recommendation, recommendations_schema),
+}
+
+def hydrate_activities(activities):
+    """
+    Serialize Activities with their subject, loading the subjects with one query per activity type
+    :param activities: List of Activity
+    :return: List of Dict, without the Activities whose subject no longer exists
+    """
+    subject_ids = {}
+    for activity in activities:
+        subject_ids.setdefault(activity.activity_type, []).append(activity.subject_id)
+
+    subjects = {}
+    for activity_type, ids in subject_ids.items():
+        model, schema = FEED_SUBJECTS[activity_type]
+        rows = model.query.options(*schema_options(schema)).filter(model.id.in_(ids)).all()
+        subjects.update(((activity_type, row.id), item) for row, item in zip(rows, schema.dump(rows)))
+
+    items = []
+    for activity in activities:
+        subject = subjects.get((activity.activity_type, activity.subject_id))
+        if subject is not None:
+            items.append({
+                'id': activity.id,
+                'type': activity.activity_type,
+                'created_at': activity.created_at.isoformat(),
+                'subject': subject,
+            })
+    return items
+
+@api.route('/feed')
+@api.doc(params={ 'after': 'Cursor of the last page' })
+class UserFeed(Resource):
+    @flask_praetorian.auth_required
+    def get(self):
+        """
+        List recent activity of the Users followed by the authenticated User, newest first
+        """
+        per_page = 20
+        current_user = flask_praetorian.current_user()
+
+        before = None
+        if request.args.get('after'):
+            try:
+                before, = decode_cursor(request.args['after'])
+                before = int(before)
+            except (InvalidCursor, TypeError, ValueError):
+                return { 'message': 'Invalid cursor'}, 400
+
+        activities = activity_feed.timeline(current_user.id, before, per_page)
+        page = activities[:per_page]
+        next_cursor = encode_cursor([page[-1].id]) if len(activities) > per_page else None
+
+        return {
+            'items': hydrate_activities(page),
+            'has_next': next_cursor is not None,
+            'next': next_cursor,
+            'per_page': per_page,
+        }
 
 @api.route('/<string:username>')
 class SingleUser(Resource):
@@ -52,7 +123,10 @@ class Login(Resource):
         req = api.payload
         username = req.get('username', None)
         password = req.get('password', None)
-        user = guard.authenticate(username, password)
+        try:
+            user = guard.authenticate(username, password)
+        except PasswordHasherBusy:
+            return { 'message': 'Too many login attempts, please try again shortly'}, 503
 
         if user.is_verified != 1:
             return { 'message': 'Please verify your email.'}, 403
@@ -91,8 +165,10 @@ class Refresh(Resource):
         if user.is_verified == 1:
             return { 'message': 'Account associated with that e-mail address is already verified'}, 403
 
+        # Sent by the job workers
         try:
-            guard.send_registration_email(email, user=user)
+            enqueue_registration_email(db.session, user)
+            db.session.commit()
         except Exception:
             return { 'message': 'Unable to send verification e-mail'}, 500
         
@@ -118,7 +194,7 @@ class Register(Resource):
         password = req.get('password', None)
         recaptchaToken = req.get('recaptchaToken', None)
 
-        # Verify recaptchaToken via Google's recaptcha API
+        # Verify recaptchaToken via Google's recaptcha API (tokens are single use and short lived, so not in a job)
         if recaptchaToken is None:
             return { 'message': 'Missing recaptcha token'}, 500
 
@@ -126,18 +202,16 @@ class Register(Resource):
             'secret': os.getenv('CAPTCHA_SECRET'),
             'response': recaptchaToken
         }
-        r = requests.post('https://www.google.com/recaptcha/api/siteverify', data = payload)
+        try:
+            r = requests.post('https://www.google.com/recaptcha/api/siteverify', data = payload, timeout=app.config.get('RECAPTCHA_TIMEOUT_SECONDS', 5))
+            r.raise_for_status()
+            recaptcha = r.json()
+        except (requests.RequestException, ValueError):
+            return { 'message': 'Unable to verify recaptcha token, please try again shortly'}, 503
 
-        if r.json()['success'] is False:
+        if recaptcha['success'] is False:
             return { 'message': 'Invalid recaptcha token'}, 500
 
-        # Instantiate new User
-        new_user = User(
-            username=username,
-            password=guard.hash_password(password),
-            email=email,
-        )
-
         username_exists = User.query.filter_by(username=username).scalar() is not None
         if (username_exists):
             return { 'message': 'Username already in use'}, 500
@@ -146,10 +220,23 @@ class Register(Resource):
         if (email_exists):
             return { 'message': 'E-mail already in use'}, 500
 
+        # Instantiate new User (hashed last, so rejected registrations do not use the pool)
+        try:
+            password_hash = guard.hash_password(password)
+        except PasswordHasherBusy:
+            return { 'message': 'Too many registrations, please try again shortly'}, 503
+        new_user = User(
+            username=username,
+            password=password_hash,
+            email=email,
+        )
+
+        # The verification e-mail is sent by the job workers
         try:
             db.session.add(new_user)
+            db.session.flush()
+            enqueue_registration_email(db.session, new_user, key='registration-email:{}'.format(new_user.id))
             db.session.commit()
-            guard.send_registration_email(email, user=new_user)
         except Exception:
             return { 'message': 'Unable to register new account'}, 500
 
@@ -185,26 +272,20 @@ class follow(Resource):
         """
         Follow a User by id
         """
-        req = api.payload
-
         # Get Authenticated User
         current_user = flask_praetorian.current_user()
     
-        # Get User to follow        
-        user = User.query.filter_by(id=id).first()
-        if user is None:
+        # Check User to follow exists
+        if db.session.query(User.id).filter_by(id=id).scalar() is None:
             return { 'message': 'User does not exist'}, 404
 
-        # Check if current_user is already following specified user
-        if user in current_user.following:
-            return { 'message': 'Already following User'}, 403
-
-        # Follow User
+        # Follow User (an existing follow is detected by the primary key, without loading either User's lists)
         try:
-            current_user.following.append(user)
-            db.session.commit()
+            followed = follow_user(current_user.id, id)
         except Exception:
             return { 'message': 'Unable to follow User'}, 500
+        if not followed:
+            return { 'message': 'Already following User'}, 403
         
         return { 'data': user_schema.dump(current_user) }
 
@@ -214,52 +295,48 @@ class follow(Resource):
         Unfollow a User by id
         """
         # Validate
-        user = User.query.filter_by(id=id).first()
-        if user is None:
+        if db.session.query(User.id).filter_by(id=id).scalar() is None:
             return { 'message': 'User does not exist'}, 404
 
         # Get Authenticated User
         current_user = flask_praetorian.current_user()
 
-        # Check if current_user is following specified user
-        if user not in current_user.following:
-            return { 'message': 'User is not being followed'}, 403
-            
         try:
-            current_user.following.remove(user)
-            db.session.commit()
+            unfollowed = unfollow_user(current_user.id, id)
         except Exception:
             return { 'message': 'Unable to unfollow User'}, 500
+        if not unfollowed:
+            return { 'message': 'User is not being followed'}, 403
         
         return { 'message': 'User unfollowed successfully' }
 
-@api.route('/<int:id>/following')
+@api.route('/<int:id>/following', defaults={ 'page': 1 }, methods=['GET'])
+@api.route('/<int:id>/following/page/<int:page>', methods=['GET'])
 class UserFollowing(Resource):
-    def get(self, id):
+    def get(self, id, page):
         """
-        List User Following
+        List User Following, by page or by cursor (`?after=`)
         """
-        user = User.query.filter_by(id=id).first()
-        if user is None:
+        if db.session.query(User.id).filter_by(id=id).scalar() is None:
             return { 'message': 'User does not exist'}, 404
 
-        users = user.following
+        per_page = 20
 
-        return users_schema.dump(users)
+        return paginate(following_query(id), users_schema, page, per_page, (User.id.asc(),))
 
-@api.route('/<int:id>/followers')
+@api.route('/<int:id>/followers', defaults={ 'page': 1 }, methods=['GET'])
+@api.route('/<int:id>/followers/page/<int:page>', methods=['GET'])
 class UserFollowers(Resource):
-    def get(self, id):
+    def get(self, id, page):
         """
-        List User Followers
+        List User Followers, by page or by cursor (`?after=`)
         """
-        user = User.query.filter_by(id=id).first()
-        if user is None:
+        if db.session.query(User.id).filter_by(id=id).scalar() is None:
             return { 'message': 'User does not exist'}, 404
 
-        users = user.followers
+        per_page = 20
 
-        return users_schema.dump(users)
+        return paginate(followers_query(id), users_schema, page, per_page, (User.id.asc(),))
 
 @api.route('/<int:id>/follow-status')
 class FollowStatus(Resource):
@@ -270,11 +347,10 @@ class FollowStatus(Resource):
         """
         current_user = flask_praetorian.current_user()
 
-        user = User.query.filter_by(id=id).first()
-        if user is None:
+        if db.session.query(User.id).filter_by(id=id).scalar() is None:
             return { 'message': 'User does not exist'}, 404
 
-        status = any(x for x in user.followers if x.id == current_user.id)
+        status = is_following(current_user.id, id)
 
         return { 'status': status }
 
@@ -339,11 +415,11 @@ class UserAvatar(Resource):
     
         # Edit Avatar
         img = base64_to_pillow_img(img_base64_string, max_width=500)
-        img_file_name = '{}.{}'.format(user.id, file_type)
+        img_file_name = image_file_name(user.id, file_type)
         img_bytes = pillow_img_to_bytes(img, file_type)
         if user.avatar:
-            delete_img(user.avatar, Prefix='users/avatars')
-        upload_img(img_bytes, file_type, Key=img_file_name, Prefix='users/avatars')
+            enqueue_image_delete(db.session, user.avatar, 'users/avatars')
+        enqueue_image_upload(db.session, img_bytes, file_type, img_file_name, 'users/avatars')
         user.avatar = img_file_name
 
         try:
@@ -382,11 +458,11 @@ class UserBanner(Resource):
     
         # Edit Banner
         img = base64_to_pillow_img(img_base64_string)
-        img_file_name = '{}.{}'.format(user.id, file_type)
+        img_file_name = image_file_name(user.id, file_type)
         img_bytes = pillow_img_to_bytes(img, file_type)
         if user.banner:
-            delete_img(user.banner, Prefix='users/banners')
-        upload_img(img_bytes, file_type, Key=img_file_name, Prefix='users/banners')
+            enqueue_image_delete(db.session, user.banner, 'users/banners')
+        enqueue_image_upload(db.session, img_bytes, file_type, img_file_name, 'users/banners')
         user.banner = img_file_name
 
         try:
@@ -415,7 +491,10 @@ class UserPassword(Resource):
 
         # Edit Password
         password = req.get('password')
-        password_hash = guard.hash_password(password)
+        try:
+            password_hash = guard.hash_password(password)
+        except PasswordHasherBusy:
+            return { 'message': 'Too many password changes, please try again shortly'}, 503
         user.password = password_hash
 
         try:
@@ -427,4 +506,13 @@ class UserPassword(Resource):
             'message': 'Password updated successfully'
         }
 
-        return response
\ No newline at end of file
+        return response
+
+@api.route('/password-hasher')
+class PasswordHasherStats(Resource):
+    @flask_praetorian.roles_required('admin')
+    def get(self):
+        """
+        Get the password hashing pool queueing metrics of this server process
+        """
+        return password_hasher.stats()
@@ -1,6 +1,7 @@
 from flask import Flask
 from extensions import db, migrate, guard, cors, mail, ma
 from models import User
+from services import title_index, facet_index, view_counter, trending, user_status, autocomplete, fuzzy_search, activity_feed, identity_cache, password_hasher, job_queue
 # from logging.config import fileConfig
 
 # Import API
@@ -20,5 +21,18 @@ cors.init_app(app)
 ma.init_app(app)
 mail.init_app(app)
 
+# Initialize in-process services
+title_index.init_app(app)
+facet_index.init_app(app)
+view_counter.init_app(app)
+trending.init_app(app)
+user_status.init_app(app)
+autocomplete.init_app(app)
+fuzzy_search.init_app(app)
+activity_feed.init_app(app)
+identity_cache.init_app(app)
+password_hasher.init_app(app)
+job_queue.init_app(app)
+
 # Register blueprints
 app.register_blueprint(api_v1)
\ No newline at end of file
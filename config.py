@@ -8,6 +8,63 @@ MAX_USER_BANNER_SIZE = 6291456
 SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI')
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+# In-process game indexes (seconds before a worker rebuilds to pick up writes from other workers)
+TITLE_INDEX_REFRESH_SECONDS = 300
+FACET_INDEX_REFRESH_SECONDS = 300
+AUTOCOMPLETE_REFRESH_SECONDS = 300
+FUZZY_SEARCH_REFRESH_SECONDS = 300
+FACET_COUNT_CACHE_SIZE = 256
+
+# Buffered page view counters (a worker dying abruptly loses at most VIEW_COUNTER_MAX_PENDING views)
+VIEW_COUNTER_FLUSH_SECONDS = 10
+VIEW_COUNTER_MAX_PENDING = 1000
+
+# Trending games (decayed hourly view buckets)
+TRENDING_WINDOW_HOURS = 168
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_TOP_K = 50
+TRENDING_REFRESH_SECONDS = 60
+
+# Per-user favourite/library status (0 disables caching, reading only the requested games)
+USER_STATUS_CACHE_SIZE = 0
+USER_STATUS_CACHE_SECONDS = 60
+
+# Authenticated users resolved without a query (0 disables caching)
+IDENTITY_CACHE_SIZE = 10000
+IDENTITY_CACHE_SECONDS = 60
+
+# Password hashing pool (hashes in flight per server process, PASSWORD_HASH_ROUNDS from scripts/calibrate_password_hash.py)
+PASSWORD_HASH_WORKERS = 2
+PASSWORD_HASH_MAX_PENDING = 16
+PASSWORD_HASH_QUEUE_SECONDS = 1
+PASSWORD_HASH_TIMEOUT_SECONDS = 10
+PASSWORD_HASH_ROUNDS = int(os.getenv('PASSWORD_HASH_ROUNDS', 0)) or None
+
+# Background jobs (e-mail and Spaces calls run by scripts/run_jobs.py)
+JOB_MAX_ATTEMPTS = 5
+JOB_BACKOFF_SECONDS = 30
+JOB_MAX_BACKOFF_SECONDS = 3600
+JOB_LOCK_SECONDS = 300
+JOB_BATCH_SIZE = 10
+JOB_POLL_SECONDS = 1
+
+# Cursor pagination (seconds an optional total is served from cache)
+PAGINATION_COUNT_CACHE_SECONDS = 60
+
+# Streamed list endpoints (rows loaded and serialized per batch)
+STREAM_BATCH_SIZE = 500
+
+# Activity feed (Users with more followers are pulled at read time instead of fanned out on write)
+FEED_FANOUT_MAX_FOLLOWERS = 5000
+FEED_BACKFILL_SIZE = 20
+FEED_TIMELINE_LENGTH = 1000
+
+# Bulk library import (entries per request)
+LIBRARY_IMPORT_MAX_ENTRIES = 20000
+
+# reCAPTCHA check of registrations (seconds the request waits for Google)
+RECAPTCHA_TIMEOUT_SECONDS = 5
+
 # Flask Praetorian 
 SECRET_KEY = os.getenv('PRAETORIAN_SECRET_KEY')
 PRAETORIAN_CONFIRMATION_SENDER = os.getenv('PRAETORIAN_CONFIRMATION_SENDER')
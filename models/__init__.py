@@ -11,10 +11,16 @@ from .likeable import Likeable
 from .user import User, user_role
 from .release import Release
 from .library_entry import LibraryEntry
+from .library_summary import LibrarySummary
 from .game import Game, game_genre
 from .review import Review
 from .recommendation import Recommendation
 from .favourite import Favourite
+from .game_view_bucket import GameViewBucket
+from .similar_game import SimilarGame
+from .activity import Activity
+from .timeline_entry import TimelineEntry
+from .job import Job
 
 # Forum Models
 from .forums.tag import Tag
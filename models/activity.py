@@ -0,0 +1,28 @@
+from extensions import db
+from datetime import datetime
+
+__all__ = ['Activity']
+
+class Activity(db.Model):
+    """
+    Compact record of something a User did, fanned out to their followers' timelines (see services/activity_feed.py)
+    """
+    __tablename__ = 'activities'
+    __table_args__ = (
+        # Serves the pull path and backfills: latest (not) fanned out activities of a User
+        db.Index('ix_activities_user_id_fanned_out_id', 'user_id', 'fanned_out', 'id'),
+        # Serves removing the Activity of a deleted subject
+        db.Index('ix_activities_subject', 'activity_type', 'subject_id'),
+        {'extend_existing': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    activity_type = db.Column(db.String(32), nullable=False) # library_entry, review or recommendation
+    subject_id = db.Column(db.Integer, nullable=False)
+    game_id = db.Column(db.Integer, db.ForeignKey('games.id', ondelete='CASCADE'), nullable=True)
+    fanned_out = db.Column(db.Integer, nullable=False, default=1) # 0 when followers pull it instead
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    def __repr__(self):
+        return '<Activity %r>' % self.activity_type
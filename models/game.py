@@ -22,6 +22,8 @@ class Game(db.Model):
     developer_id = db.Column(db.Integer, db.ForeignKey('developers.id'), nullable=False)
     score = db.Column(db.Float, nullable=True)
     library_count = db.Column(db.Integer, nullable=True)
+    score_sum = db.Column(db.Integer, nullable=False, default=0)
+    score_count = db.Column(db.Integer, nullable=False, default=0)
     score_rank = db.Column(db.Integer, nullable=True)
     popularity_rank = db.Column(db.Integer, nullable=True)
     trending_page_views = db.Column(db.Integer, nullable=True)
@@ -0,0 +1,14 @@
+from extensions import db
+
+__all__ = ['GameViewBucket']
+
+class GameViewBucket(db.Model):
+    __tablename__ = 'game_view_buckets'
+    __table_args__ = {'extend_existing': True}
+
+    game_id = db.Column(db.Integer, db.ForeignKey('games.id', ondelete='CASCADE'), primary_key=True)
+    hour = db.Column(db.Integer, primary_key=True) # Hours since the Unix epoch
+    views = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return '<GameViewBucket %r>' % self.hour
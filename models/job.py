@@ -0,0 +1,34 @@
+from extensions import db
+from datetime import datetime
+
+__all__ = ['Job']
+
+class Job(db.Model):
+    """
+    A side effect (e-mail, storage call) run by the job workers (see services/job_queue.py)
+    """
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Serves claiming due jobs and the queue metrics
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+        db.Index('ix_jobs_status_finished_at', 'status', 'finished_at'),
+        {'extend_existing': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)
+    idempotency_key = db.Column(db.String(255), unique=True, nullable=True)
+    payload = db.Column(db.Text, nullable=False) # JSON
+    data = db.Column(db.LargeBinary(length=16777215), nullable=True) # e.g. image bytes
+    status = db.Column(db.String(16), nullable=False, default='queued') # queued, running, done or failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    locked_by = db.Column(db.String(255), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return '<Job %r>' % self.kind
@@ -0,0 +1,24 @@
+from extensions import db
+
+__all__ = ['LibrarySummary']
+
+class LibrarySummary(db.Model):
+    """
+    Library totals of a User per Play Status, maintained on every Library Entry write (see services/library_summaries.py)
+    """
+    __tablename__ = 'library_summaries'
+    __table_args__ = {'extend_existing': True}
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    play_status_id = db.Column(db.Integer, db.ForeignKey('play_statuses.id', ondelete='CASCADE'), primary_key=True)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Integer, nullable=False, default=0)
+    score_count = db.Column(db.Integer, nullable=False, default=0)
+    hours = db.Column(db.Integer, nullable=False, default=0)
+    own_count = db.Column(db.Integer, nullable=False, default=0)
+    digital_count = db.Column(db.Integer, nullable=False, default=0)
+
+    play_status = db.relationship('PlayStatus')
+
+    def __repr__(self):
+        return '<LibrarySummary %r>' % self.entry_count
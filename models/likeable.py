@@ -1,13 +1,17 @@
 from extensions import db
 from datetime import datetime
 from sqlalchemy import event, and_
-from sqlalchemy.orm import relationship, foreign, remote, backref, column_property
-from sqlalchemy import select, func
+from sqlalchemy.orm import relationship, foreign, remote, backref
 
-__all__ = ['Likeable']
+__all__ = ['Likeable', 'likeable_models']
+
+# likeable_type => HasLikes model, filled in as mappers are configured
+likeable_models = {}
 
 class HasLikes():
-    pass
+    # Vote counters, maintained on every Likeable write (see services/like_counts.py)
+    likes = db.Column(db.Integer, nullable=False, default=0)
+    dislikes = db.Column(db.Integer, nullable=False, default=0)
 
 class Likeable(db.Model):
     __tablename__ = 'likeables'
@@ -40,21 +44,7 @@ def setup_listener(mapper, class_):
                                 )
                         )
 
-    class_.likes = column_property(
-        select([func.count('*')]).where(and_(
-                Likeable.likeable_type == type,
-                Likeable.likeable_id == class_.id,
-                Likeable.value == 1, 
-            )).correlate_except(Likeable)
-    )
-
-    class_.dislikes = column_property(
-        select([func.count('*')]).where(and_(
-                Likeable.likeable_type == type,
-                Likeable.likeable_id == class_.id,
-                Likeable.value == 0, 
-            )).correlate_except(Likeable)
-    )
+    likeable_models[type] = class_
 
     @event.listens_for(class_.likeables, 'append')
     def append_like(target, value, initiator):
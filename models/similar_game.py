@@ -0,0 +1,18 @@
+from extensions import db
+
+__all__ = ['SimilarGame']
+
+class SimilarGame(db.Model):
+    """
+    Precomputed nearest neighbours of a Game by library co-occurrence (see scripts/update_similar_games.py)
+    """
+    __tablename__ = 'similar_games'
+    __table_args__ = {'extend_existing': True}
+
+    game_id = db.Column(db.Integer, db.ForeignKey('games.id', ondelete='CASCADE'), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True) # 1 is the most similar
+    similar_game_id = db.Column(db.Integer, db.ForeignKey('games.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return '<SimilarGame %r>' % self.similar_game_id
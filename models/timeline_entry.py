@@ -0,0 +1,21 @@
+from extensions import db
+
+__all__ = ['TimelineEntry']
+
+class TimelineEntry(db.Model):
+    """
+    An Activity delivered to a follower's feed, newest first by activity_id (see services/activity_feed.py)
+    """
+    __tablename__ = 'timelines'
+    __table_args__ = (
+        # Serves unfollowing: drop a leader's activities from one timeline
+        db.Index('ix_timelines_user_id_actor_id', 'user_id', 'actor_id'),
+        {'extend_existing': True},
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id', ondelete='CASCADE'), primary_key=True)
+    actor_id = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return '<TimelineEntry %r>' % self.activity_id
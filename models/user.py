@@ -12,12 +12,18 @@ user_role = db.Table('user_role',
 user_following = db.Table('followers',
     db.Column('follower_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
     db.Column('leader_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
+    # The primary key serves "who does X follow", this index serves "who follows X"
+    db.Index('ix_followers_leader_id', 'leader_id', 'follower_id'),
     extend_existing=True
 )
 
 class User(db.Model):
     __tablename__ = 'users'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Serves reading feeds: the few followed Users whose Activities are pulled
+        db.Index('ix_users_pulled_activities', 'pulled_activities'),
+        {'extend_existing': True},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String, unique=True, nullable=False)
@@ -34,6 +40,11 @@ class User(db.Model):
     gender = db.Column(db.String, unique=False, nullable=True)
     location = db.Column(db.String, unique=False, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.now)
+    # Follow counters, maintained on every followers write (see services/follow_graph.py)
+    follower_count = db.Column(db.Integer, nullable=False, default=0)
+    following_count = db.Column(db.Integer, nullable=False, default=0)
+    # 1 once the User has Activities that were not fanned out (see services/activity_feed.py)
+    pulled_activities = db.Column(db.Integer, nullable=False, default=0)
 
     following = db.relationship(
         'User', lambda: user_following,
@@ -66,7 +77,9 @@ class User(db.Model):
 
     @classmethod
     def identify(cls, id):
-        return cls.query.get(id)
+        # Served from the per-worker identity cache (imported here, services depend on the models)
+        from services.identity import identity_cache
+        return identity_cache.get(id)
 
     @property
     def identity(self):
@@ -0,0 +1,69 @@
+import os, random, statistics, time
+
+from services.fuzzy_search import FuzzySearch
+
+"""
+Latency and recall of the in-process fuzzy title search
+
+Usage: python -m scripts.benchmark_fuzzy_search
+Each query is a catalog title with one typo (deletion, substitution or
+transposition) in one of its longer words; recall is the share of queries
+whose title is among the first LIMIT results.
+"""
+
+CATALOG_SIZE = int(os.getenv('BENCHMARK_CATALOG_SIZE', 100000))
+QUERY_COUNT = 500
+LIMIT = 25
+
+SYLLABLES = ['ka', 'ze', 'lo', 'mi', 'ra', 'to', 'shi', 'dra', 'gon', 'fan', 'ta', 'sy', 'mar', 'io', 'me', 'tro',
+             'pri', 'chro', 'no', 'tri', 'ger', 'sou', 'dar', 'hea', 'ven', 'ly', 'sa', 'ga', 'xe', 'blade', 'per', 'so',
+             'na', 'kin', 'dom', 'ar', 'cade', 'ti', 'tan', 'quest', 'star', 'oce', 'an', 'fi', 're', 'em', 'blem']
+COMMON = ['the', 'of', 'legend', 'final', 'super', 'world', 'tales', 'chronicles', 'saga', 'ii', 'iii', 'hd']
+
+def typo(word):
+    i = random.randint(1, len(word) - 2)
+    kind = random.choice(['delete', 'substitute', 'transpose'])
+    if kind == 'delete':
+        return word[:i] + word[i + 1:]
+    if kind == 'substitute':
+        return word[:i] + random.choice('abcdefghijklmnopqrstuvwxyz'.replace(word[i], '')) + word[i + 1:]
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+random.seed(42)
+vocabulary = list({''.join(random.choice(SYLLABLES) for _ in range(random.randint(2, 4))) for _ in range(30000)})
+titles = set()
+while len(titles) < CATALOG_SIZE:
+    words = random.sample(vocabulary, random.randint(1, 3))
+    if random.random() < 0.5:
+        words.insert(0, random.choice(COMMON))
+    titles.add(' '.join(w.capitalize() for w in words))
+games = [(i + 1, title, i + 1 if random.random() < 0.9 else None, round(random.uniform(20, 100), 2)) for i, title in enumerate(titles)]
+
+start = time.perf_counter()
+index = FuzzySearch()
+index.refresh_seconds = None
+index.load((game_id, title, rank, score) for game_id, title, rank, score in games)
+print("Indexed {} titles ({} distinct words) in {:.2f}s".format(len(games), len(index._postings), time.perf_counter() - start))
+
+queries = []
+for _ in range(QUERY_COUNT):
+    game_id, title, rank, score = random.choice(games)
+    words = title.lower().split()
+    candidates = [i for i, word in enumerate(words) if len(word) >= 5]
+    if candidates:
+        i = random.choice(candidates)
+        words[i] = typo(words[i])
+    queries.append((game_id, ' '.join(words)))
+
+samples = []
+hits = 0
+for game_id, query in queries:
+    start = time.perf_counter()
+    results = index.search(query, limit=LIMIT)
+    samples.append((time.perf_counter() - start) * 1000)
+    hits += game_id in results
+samples.sort()
+
+print("Queries: {}, recall@{}: {:.1%}".format(len(queries), LIMIT, hits / len(queries)))
+print("Latency mean {:.2f}ms  p50 {:.2f}ms  p95 {:.2f}ms  p99 {:.2f}ms".format(
+    statistics.mean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.95)], samples[int(len(samples) * 0.99)]))
@@ -0,0 +1,54 @@
+import sqlalchemy
+import os, random, time
+
+from scripts.update_game_rankings import update_rankings
+
+"""
+Time the ranking pipeline at several catalog sizes
+
+Usage: python -m scripts.benchmark_game_rankings
+Set BENCHMARK_DATABASE_URI to run against MySQL (defaults to in-memory SQLite)
+Set BENCHMARK_SIZES to override the catalog sizes (comma separated)
+"""
+
+SIZES = [int(size) for size in os.getenv('BENCHMARK_SIZES', '10000,100000,1000000').split(',')]
+INSERT_CHUNK = 50000
+
+engine = sqlalchemy.create_engine(os.getenv('BENCHMARK_DATABASE_URI', 'sqlite://'))
+metadata = sqlalchemy.MetaData()
+games = sqlalchemy.Table('benchmark_games', metadata,
+    sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column('score', sqlalchemy.Float),
+    sqlalchemy.Column('library_count', sqlalchemy.Integer),
+    sqlalchemy.Column('trending_page_views', sqlalchemy.Integer),
+    sqlalchemy.Column('score_rank', sqlalchemy.Integer),
+    sqlalchemy.Column('popularity_rank', sqlalchemy.Integer),
+)
+
+random.seed(42)
+print("{:>9} {:>9} {:>9} {:>9} {:>9} {:>9}".format('games', 'read', 'rank', 'write', 'total', 'rerun'))
+with engine.connect() as con:
+    for size in SIZES:
+        metadata.drop_all(con)
+        metadata.create_all(con)
+        for start in range(0, size, INSERT_CHUNK):
+            con.execute(games.insert(), [{
+                'id': id,
+                'score': round(random.uniform(10, 100), 2) if random.random() < 0.8 else None,
+                'library_count': random.randint(0, 5000),
+                'trending_page_views': random.randint(0, 100000) if random.random() < 0.9 else None,
+            } for id in range(start + 1, min(start + INSERT_CHUNK, size) + 1)])
+
+        with con.begin():
+            timings = update_rankings(con, games.name)
+        total = timings['read'] + timings['rank'] + timings['write']
+
+        # Second run with nothing changed: the write stage has nothing to stage
+        start = time.perf_counter()
+        with con.begin():
+            rerun = update_rankings(con, games.name)
+        assert rerun['updated'] == 0
+
+        print("{:>9} {:>8.2f}s {:>8.2f}s {:>8.2f}s {:>8.2f}s {:>8.2f}s".format(
+            size, timings['read'], timings['rank'], timings['write'], total, time.perf_counter() - start))
+    metadata.drop_all(con)
@@ -0,0 +1,72 @@
+import os, random, statistics, time
+
+from app import app
+from extensions import db
+from sqlalchemy import event
+from models import Likeable, Review
+from api.v1.likeables import Likeables
+
+"""
+Latency and statements per click of the review like/dislike toggle
+
+Usage: python -m scripts.benchmark_like_toggle
+Set BENCHMARK_DATABASE_URI to run against an empty MySQL database (defaults to in-memory SQLite)
+Compares the previous path (create, then getCount and getUserSentiment) with toggle()
+"""
+
+REVIEWS = 1000
+USERS = 200
+CLICKS = int(os.getenv('BENCHMARK_CLICKS', 5000))
+
+def previous_path(user_id, review_id, value):
+    review = Review.query.filter_by(id=review_id).first()
+    Likeables.create(Likeables, user_id, 'review', review.id, value)
+    count = Likeables.getCount(Likeables, 'review', review.id)
+    user_sentiment = Likeables.getUserSentiment(Likeables, user_id, 'review', review.id)
+    return {
+        'like_count': count.get('like_count'),
+        'dislike_count': count.get('dislike_count'),
+        'user_sentiment': user_sentiment.get('user_sentiment')
+    }
+
+def toggle_path(user_id, review_id, value):
+    return Likeables.toggle(Likeables, user_id, 'review', review_id, value)
+
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('BENCHMARK_DATABASE_URI', 'sqlite://')
+with app.app_context():
+    engine = db.engine
+    db.create_all()
+    with engine.begin() as con:
+        if con.dialect.name == 'mysql':
+            con.execute('SET FOREIGN_KEY_CHECKS = 0')
+        con.execute(Review.__table__.insert(), [
+            { 'id': id, 'summary': 'Summary', 'content': 'Content', 'score': 80, 'user_id': 1, 'game_id': 1, 'release_id': 1, 'likes': 0, 'dislikes': 0 }
+            for id in range(1, REVIEWS + 1)
+        ])
+
+    statements = [0]
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.__setitem__(0, statements[0] + 1))
+
+    random.seed(42)
+    clicks = [(random.randint(1, USERS), random.randint(1, REVIEWS), random.randint(0, 1)) for _ in range(CLICKS)]
+
+    print("{:<10} {:>10} {:>10} {:>12}".format('path', 'p50 ms', 'mean ms', 'statements'))
+    results = {}
+    for name, path in (('previous', previous_path), ('toggle', toggle_path)):
+        db.session.execute(Likeable.__table__.delete())
+        db.session.execute(Review.__table__.update().values(likes=0, dislikes=0))
+        db.session.commit()
+        db.session.remove()
+
+        samples = []
+        statements[0] = 0
+        responses = []
+        for user_id, review_id, value in clicks:
+            start = time.perf_counter()
+            responses.append(path(user_id, review_id, value))
+            samples.append(time.perf_counter() - start)
+            db.session.remove()
+        results[name] = responses
+        print("{:<10} {:>10.3f} {:>10.3f} {:>12.1f}".format(name, statistics.median(samples) * 1000, statistics.mean(samples) * 1000, statements[0] / len(clicks)))
+
+    print("Responses identical: {}".format(results['previous'] == results['toggle']))
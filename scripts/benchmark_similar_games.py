@@ -0,0 +1,59 @@
+import sqlalchemy
+import numpy as np
+import os, time
+
+from scripts.update_similar_games import update_similar_games
+
+"""
+Time the similar games job on a synthetic library
+
+Usage: python -m scripts.benchmark_similar_games
+Set BENCHMARK_DATABASE_URI to run against MySQL (defaults to in-memory SQLite)
+Set BENCHMARK_ROWS, BENCHMARK_USERS and BENCHMARK_GAMES to change the library size
+Game popularity follows a Zipf distribution, so a few games are in most libraries.
+"""
+
+ROWS = int(os.getenv('BENCHMARK_ROWS', 1000000))
+USERS = int(os.getenv('BENCHMARK_USERS', 100000))
+GAMES = int(os.getenv('BENCHMARK_GAMES', 20000))
+INSERT_CHUNK = 50000
+
+engine = sqlalchemy.create_engine(os.getenv('BENCHMARK_DATABASE_URI', 'sqlite://'))
+metadata = sqlalchemy.MetaData()
+libraries = sqlalchemy.Table('benchmark_libraries', metadata,
+    sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column('user_id', sqlalchemy.Integer),
+    sqlalchemy.Column('game_id', sqlalchemy.Integer),
+    sqlalchemy.Column('score', sqlalchemy.Integer),
+)
+similar = sqlalchemy.Table('benchmark_similar_games', metadata,
+    sqlalchemy.Column('game_id', sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column('position', sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column('similar_game_id', sqlalchemy.Integer),
+    sqlalchemy.Column('score', sqlalchemy.Float),
+)
+
+random = np.random.default_rng(42)
+user_ids = random.integers(1, USERS + 1, ROWS)
+game_ids = np.minimum(random.zipf(1.3, ROWS), GAMES)
+scores = np.where(random.random(ROWS) < 0.4, None, random.integers(1, 11, ROWS)).tolist()
+
+with engine.connect() as con:
+    metadata.drop_all(con)
+    metadata.create_all(con)
+
+    start = time.perf_counter()
+    for chunk in range(0, ROWS, INSERT_CHUNK):
+        con.execute(libraries.insert(), [
+            { 'user_id': u, 'game_id': g, 'score': s }
+            for u, g, s in zip(user_ids[chunk:chunk + INSERT_CHUNK].tolist(), game_ids[chunk:chunk + INSERT_CHUNK].tolist(), scores[chunk:chunk + INSERT_CHUNK])
+        ])
+    print("Inserted {} library rows in {:.1f}s".format(ROWS, time.perf_counter() - start))
+
+    print("{:>9} {:>9} {:>9} {:>9} {:>9} {:>9}".format('weighted', 'games', 'read', 'compute', 'write', 'rows'))
+    for weighted in (False, True):
+        with con.begin():
+            timings = update_similar_games(con, libraries.name, similar.name, weighted=weighted)
+        print("{:>9} {:>9} {:>9.2f} {:>9.2f} {:>9.2f} {:>9}".format(str(weighted), timings['games'], timings['read'], timings['compute'], timings['write'], timings['rows']))
+
+    metadata.drop_all(con)
@@ -0,0 +1,84 @@
+import sqlalchemy
+import os, random, statistics, time
+
+from services.title_index import TitleIndex
+
+"""
+Compare LIKE '%query%' title search against the in-process trigram index
+
+Usage: python -m scripts.benchmark_title_search
+Set BENCHMARK_DATABASE_URI to run against MySQL (defaults to in-memory SQLite)
+"""
+
+CATALOG_SIZE = int(os.getenv('BENCHMARK_CATALOG_SIZE', 100000))
+QUERY_COUNT = 200
+LIMIT = 25
+
+WORDS = ['legend', 'final', 'fantasy', 'super', 'mario', 'zelda', 'metroid', 'prime', 'chrono', 'trigger',
+         'dragon', 'quest', 'souls', 'dark', 'kingdom', 'hearts', 'tales', 'star', 'ocean', 'fire', 'emblem',
+         'persona', 'shin', 'megami', 'tensei', 'xeno', 'blade', 'chronicles', 'saga', 'romancing', 'secret',
+         'mana', 'breath', 'wild', 'eternal', 'sonata', 'phantasy', 'monster', 'hunter', 'world', 'rise',
+         'golden', 'sun', 'lost', 'odyssey', 'blue', 'dragoon', 'legaia', 'suikoden', 'wild', 'arms', 'grandia']
+
+def timed(fn, queries):
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.95)]
+
+random.seed(42)
+titles = set()
+while len(titles) < CATALOG_SIZE:
+    words = random.sample(WORDS, random.randint(2, 4))
+    titles.add(' '.join(w.capitalize() for w in words) + ' {}'.format(random.randint(1, 999)))
+rows = [{'id': i + 1, 'title': title} for i, title in enumerate(sorted(titles))]
+
+engine = sqlalchemy.create_engine(os.getenv('BENCHMARK_DATABASE_URI', 'sqlite://'))
+metadata = sqlalchemy.MetaData()
+games = sqlalchemy.Table('benchmark_games', metadata,
+    sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column('title', sqlalchemy.String(255), nullable=False),
+)
+metadata.drop_all(engine)
+metadata.create_all(engine)
+
+queries = []
+for _ in range(QUERY_COUNT):
+    title = random.choice(rows)['title']
+    start = random.randint(0, len(title) - 3)
+    queries.append(title[start:start + random.randint(3, 8)])
+
+with engine.connect() as con:
+    con.execute(games.insert(), rows)
+
+    start = time.perf_counter()
+    index = TitleIndex()
+    index.refresh_seconds = None
+    index.load((row['id'], row['title']) for row in rows)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    like_sql = sqlalchemy.select([games.c.id, games.c.title]).where(games.c.title.like(sqlalchemy.bindparam('q'))).order_by(games.c.id)
+    hydrate_sql = sqlalchemy.select([games.c.id, games.c.title]).where(games.c.id.in_(sqlalchemy.bindparam('ids', expanding=True))).order_by(games.c.id)
+
+    def like_search(q, limit=None):
+        return con.execute(like_sql.limit(limit), q='%' + q + '%').fetchall()
+
+    def index_search(q, limit=None):
+        ids = index.search(q, limit=limit)
+        return con.execute(hydrate_sql, ids=ids).fetchall() if ids else []
+
+    mismatches = sum(1 for q in queries if [r.id for r in like_search(q)] != [r.id for r in index_search(q)])
+
+    print('Catalog: {} titles, {} queries, index built in {:.0f} ms'.format(CATALOG_SIZE, QUERY_COUNT, build_ms))
+    print('{:<28}{:>10}{:>10}{:>10}'.format('path', 'mean ms', 'p50 ms', 'p95 ms'))
+    for name, fn in (('LIKE (first 25)', lambda q: like_search(q, LIMIT)),
+                     ('trigram index (first 25)', lambda q: index_search(q, LIMIT)),
+                     ('LIKE (all matches)', like_search),
+                     ('trigram index (all matches)', index_search)):
+        print('{:<28}{:>10.3f}{:>10.3f}{:>10.3f}'.format(name, *timed(fn, queries)))
+    print('Result mismatches: {}'.format(mismatches))
+
+metadata.drop_all(engine)
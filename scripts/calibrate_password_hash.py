@@ -0,0 +1,70 @@
+from passlib.context import CryptContext
+import os, time
+
+"""
+Pick the password hashing cost that meets a target latency on this host
+
+Times the hash scheme used by the guard (PRAETORIAN_HASH_SCHEME, pbkdf2_sha512
+by default) at increasing costs and prints the highest PASSWORD_HASH_ROUNDS
+whose median hash time stays under PASSWORD_HASH_TARGET_MS. Run it on the
+production host type: the result depends on its CPUs.
+
+Usage: python -m scripts.calibrate_password_hash
+"""
+
+SCHEME = os.getenv('PRAETORIAN_HASH_SCHEME', 'pbkdf2_sha512')
+TARGET_MS = float(os.getenv('PASSWORD_HASH_TARGET_MS', 250))
+SAMPLES = int(os.getenv('PASSWORD_HASH_SAMPLES', 5))
+
+def median_ms(context, samples=SAMPLES):
+    """
+    Median time to hash a password
+    :param context: CryptContext
+    :return: Float milliseconds
+    """
+    timings = []
+    for i in range(samples):
+        start = time.perf_counter()
+        context.hash('calibration-password-{}'.format(i))
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+def context_for(rounds):
+    return CryptContext(schemes=[SCHEME], **{ '{}__default_rounds'.format(SCHEME): rounds })
+
+def calibrate():
+    """
+    Find the highest cost under the target
+    :return: Tuple of (rounds, milliseconds)
+    """
+    handler = CryptContext(schemes=[SCHEME]).handler()
+    rounds = handler.default_rounds
+    elapsed = median_ms(context_for(rounds))
+    print("{:>12} {:>10.1f}ms (default)".format(rounds, elapsed))
+
+    if getattr(handler, 'rounds_cost', 'linear') == 'log2':
+        # bcrypt style: every step doubles the cost
+        while elapsed * 2 <= TARGET_MS and rounds < handler.max_rounds:
+            rounds += 1
+            elapsed = median_ms(context_for(rounds))
+            print("{:>12} {:>10.1f}ms".format(rounds, elapsed))
+        while elapsed > TARGET_MS and rounds > handler.min_rounds:
+            rounds -= 1
+            elapsed = median_ms(context_for(rounds))
+            print("{:>12} {:>10.1f}ms".format(rounds, elapsed))
+        return rounds, elapsed
+
+    # pbkdf2 style: the cost is linear in rounds, estimate then step down until under the target
+    rounds = min(max(int(rounds * TARGET_MS / elapsed), handler.min_rounds), handler.max_rounds)
+    elapsed = median_ms(context_for(rounds))
+    print("{:>12} {:>10.1f}ms".format(rounds, elapsed))
+    while elapsed > TARGET_MS and rounds > handler.min_rounds:
+        rounds = max(int(rounds * 0.9), handler.min_rounds)
+        elapsed = median_ms(context_for(rounds))
+        print("{:>12} {:>10.1f}ms".format(rounds, elapsed))
+    return rounds, elapsed
+
+if __name__ == '__main__':
+    print("Calibrating {} for {:.0f}ms per hash ({} samples per cost)".format(SCHEME, TARGET_MS, SAMPLES))
+    rounds, elapsed = calibrate()
+    print("PASSWORD_HASH_ROUNDS={} ({:.1f}ms per hash)".format(rounds, elapsed))
@@ -0,0 +1,20 @@
+import sqlalchemy
+import os
+from datetime import datetime, timedelta
+
+"""
+Delete finished background jobs (and their image data) older than JOB_RETENTION_HOURS, failed ones included
+"""
+
+# Connect to Database
+engine = sqlalchemy.create_engine(os.getenv('SQLALCHEMY_DATABASE_URI'))
+retention_hours = int(os.getenv('JOB_RETENTION_HOURS', 168))
+oldest = datetime.now() - timedelta(hours=retention_hours)
+
+# Prepare SQL query
+sql = sqlalchemy.text("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < :oldest")
+
+# Execute query
+with engine.connect() as con:
+    rs = con.execute(sql, oldest=oldest)
+    print("Pruned {} jobs".format(rs.rowcount))
@@ -0,0 +1,45 @@
+import sqlalchemy
+import os
+
+"""
+Trim every feed timeline to its newest FEED_TIMELINE_LENGTH entries, one User at a time
+"""
+
+# Connect to Database
+engine = sqlalchemy.create_engine(os.getenv('SQLALCHEMY_DATABASE_URI'))
+timeline_length = int(os.getenv('FEED_TIMELINE_LENGTH', 1000))
+
+# Prepare SQL queries
+sql_users = sqlalchemy.text("""
+SELECT   DISTINCT user_id
+FROM     timelines
+WHERE    user_id > :last_id
+ORDER BY user_id
+LIMIT    1000
+""")
+
+sql_oldest_kept = sqlalchemy.text("""
+SELECT   activity_id
+FROM     timelines
+WHERE    user_id = :user_id
+ORDER BY activity_id DESC
+LIMIT    1 OFFSET :offset
+""")
+
+sql_delete = sqlalchemy.text('DELETE FROM timelines WHERE user_id = :user_id AND activity_id < :activity_id')
+
+# Execute queries
+pruned = 0
+last_id = 0
+with engine.connect() as con:
+    while True:
+        users = [row[0] for row in con.execute(sql_users, last_id=last_id)]
+        if not users:
+            break
+        for user_id in users:
+            oldest_kept = con.execute(sql_oldest_kept, user_id=user_id, offset=timeline_length - 1).scalar()
+            if oldest_kept is not None:
+                pruned += con.execute(sql_delete, user_id=user_id, activity_id=oldest_kept).rowcount
+        last_id = users[-1]
+
+print("Pruned {} timeline entries".format(pruned))
@@ -0,0 +1,19 @@
+import sqlalchemy
+import os, time
+
+"""
+Delete hourly game view buckets that have slid out of the trending window
+"""
+
+# Connect to Database
+engine = sqlalchemy.create_engine(os.getenv('SQLALCHEMY_DATABASE_URI'))
+window_hours = int(os.getenv('TRENDING_WINDOW_HOURS', 168))
+oldest_hour = int(time.time() // 3600) - window_hours + 1
+
+# Prepare SQL query
+sql = sqlalchemy.text('DELETE FROM game_view_buckets WHERE hour < :oldest_hour')
+
+# Execute query
+with engine.connect() as con:
+    rs = con.execute(sql, oldest_hour=oldest_hour)
+    print("Pruned {} view buckets".format(rs.rowcount))
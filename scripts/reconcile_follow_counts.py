@@ -0,0 +1,70 @@
+import sqlalchemy
+import os, sys
+
+"""
+Verify the follower_count / following_count counters of every User against the followers table, in batches.
+Users that drifted are corrected unless --dry-run is passed. Also backfills the counters after they are added.
+"""
+
+# Connect to Database
+engine = sqlalchemy.create_engine(os.getenv('SQLALCHEMY_DATABASE_URI'))
+batch_size = int(os.getenv('RECONCILE_BATCH_SIZE', 1000))
+dry_run = '--dry-run' in sys.argv[1:]
+
+# Prepare SQL queries
+sql_users = sqlalchemy.text("""
+SELECT   id, follower_count, following_count
+FROM     users
+WHERE    id > :last_id
+ORDER BY id
+LIMIT    :batch_size
+FOR UPDATE
+""")
+
+sql_followers = sqlalchemy.text("""
+SELECT   leader_id, Count(*)
+FROM     followers
+WHERE    leader_id BETWEEN :first_id AND :last_id
+GROUP BY leader_id
+""")
+
+sql_following = sqlalchemy.text("""
+SELECT   follower_id, Count(*)
+FROM     followers
+WHERE    follower_id BETWEEN :first_id AND :last_id
+GROUP BY follower_id
+""")
+
+sql_fix = sqlalchemy.text("""
+UPDATE users
+SET    follower_count = :follower_count,
+       following_count = :following_count
+WHERE  id = :id
+""")
+
+# Execute queries, locking each batch of users so concurrent follows wait for the fix
+checked = drifted = 0
+last_id = 0
+while True:
+    with engine.begin() as con:
+        users = con.execute(sql_users, last_id=last_id, batch_size=batch_size).fetchall()
+        if not users:
+            break
+        bounds = { 'first_id': users[0][0], 'last_id': users[-1][0] }
+        followers = dict(con.execute(sql_followers, **bounds).fetchall())
+        following = dict(con.execute(sql_following, **bounds).fetchall())
+
+        fixes = []
+        for id, follower_count, following_count in users:
+            expected = (followers.get(id, 0), following.get(id, 0))
+            if (follower_count or 0, following_count or 0) != expected:
+                fixes.append({ 'id': id, 'follower_count': expected[0], 'following_count': expected[1] })
+
+        if fixes and not dry_run:
+            con.execute(sql_fix, fixes)
+
+    checked += len(users)
+    drifted += len(fixes)
+    last_id = users[-1][0]
+
+print("Checked {} users, {} drifted{}".format(checked, drifted, " (dry run, nothing changed)" if dry_run else ", corrected"))
@@ -0,0 +1,65 @@
+import sqlalchemy
+import os, sys
+
+"""
+Verify the library_count / score accumulators on games against the libraries table, in batches.
+Games that drifted are corrected unless --dry-run is passed.
+"""
+
+# Connect to Database
+engine = sqlalchemy.create_engine(os.getenv('SQLALCHEMY_DATABASE_URI'))
+batch_size = int(os.getenv('RECONCILE_BATCH_SIZE', 1000))
+dry_run = '--dry-run' in sys.argv[1:]
+
+# Prepare SQL queries
+sql_games = sqlalchemy.text("""
+SELECT   id, library_count, score_sum, score_count, score
+FROM     games
+WHERE    id > :last_id
+ORDER BY id
+LIMIT    :batch_size
+FOR UPDATE
+""")
+
+sql_libraries = sqlalchemy.text("""
+SELECT   game_id, Count(id), Coalesce(Sum(score), 0), Count(score)
+FROM     libraries
+WHERE    game_id BETWEEN :first_id AND :last_id
+GROUP BY game_id
+""")
+
+sql_fix = sqlalchemy.text("""
+UPDATE games
+SET    score = CASE WHEN :score_count > 0 THEN Round(:score_sum * 10.0 / :score_count, 2) END,
+       library_count = :library_count,
+       score_sum = :score_sum,
+       score_count = :score_count
+WHERE  id = :id
+""")
+
+# Execute queries, locking each batch of games so concurrent library writes wait for the fix
+checked = drifted = 0
+last_id = 0
+while True:
+    with engine.begin() as con:
+        games = con.execute(sql_games, last_id=last_id, batch_size=batch_size).fetchall()
+        if not games:
+            break
+        actual = { row[0]: row[1:] for row in con.execute(sql_libraries, first_id=games[0][0], last_id=games[-1][0]) }
+
+        fixes = []
+        for id, library_count, score_sum, score_count, score in games:
+            count, total, scored = actual.get(id, (0, 0, 0))
+            expected_score = round(total * 10.0 / scored, 2) if scored else None
+            score_drifted = (score is None) != (expected_score is None) or (score is not None and abs(score - expected_score) > 0.01)
+            if (library_count or 0, score_sum or 0, score_count or 0) != (count, total, scored) or score_drifted:
+                fixes.append({ 'id': id, 'library_count': count, 'score_sum': total, 'score_count': scored })
+
+        if fixes and not dry_run:
+            con.execute(sql_fix, fixes)
+
+    checked += len(games)
+    drifted += len(fixes)
+    last_id = games[-1][0]
+
+print("Checked {} games, {} drifted{}".format(checked, drifted, " (dry run, nothing changed)" if dry_run else ", corrected"))
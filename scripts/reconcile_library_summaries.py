@@ -0,0 +1,80 @@
+import sqlalchemy
+import os, sys
+
+from services.library_summaries import COUNTERS
+
+"""
+Verify the per User, per Play Status library_summaries rows against the libraries table, in batches of Users.
+Rows that drifted are rewritten unless --dry-run is passed. Also backfills the table after it is created.
+
+Usage: python -m scripts.reconcile_library_summaries [--dry-run]
+"""
+
+# Connect to Database
+engine = sqlalchemy.create_engine(os.getenv('SQLALCHEMY_DATABASE_URI'))
+batch_size = int(os.getenv('RECONCILE_BATCH_SIZE', 1000))
+dry_run = '--dry-run' in sys.argv[1:]
+
+# Prepare SQL queries
+sql_users = sqlalchemy.text("""
+SELECT   id
+FROM     users
+WHERE    id > :last_id
+ORDER BY id
+LIMIT    :batch_size
+""")
+
+sql_summaries = sqlalchemy.text("""
+SELECT   user_id, play_status_id, entry_count, score_sum, score_count, hours, own_count, digital_count
+FROM     library_summaries
+WHERE    user_id BETWEEN :first_id AND :last_id
+FOR UPDATE
+""")
+
+sql_libraries = sqlalchemy.text("""
+SELECT   user_id, play_status_id, Count(id), Coalesce(Sum(score), 0), Count(score), Coalesce(Sum(hours), 0),
+         Sum(CASE WHEN own <> 0 THEN 1 ELSE 0 END), Sum(CASE WHEN digital <> 0 THEN 1 ELSE 0 END)
+FROM     libraries
+WHERE    user_id BETWEEN :first_id AND :last_id
+GROUP BY user_id, play_status_id
+""")
+
+sql_delete = sqlalchemy.text("""
+DELETE FROM library_summaries
+WHERE  user_id = :user_id AND play_status_id = :play_status_id
+""")
+
+sql_insert = sqlalchemy.text("""
+INSERT INTO library_summaries (user_id, play_status_id, entry_count, score_sum, score_count, hours, own_count, digital_count)
+VALUES (:user_id, :play_status_id, :entry_count, :score_sum, :score_count, :hours, :own_count, :digital_count)
+""")
+
+# Execute queries, locking each batch of summaries so concurrent library writes wait for the fix
+checked = drifted = 0
+last_id = 0
+while True:
+    with engine.begin() as con:
+        users = [row[0] for row in con.execute(sql_users, last_id=last_id, batch_size=batch_size)]
+        if not users:
+            break
+        bounds = { 'first_id': users[0], 'last_id': users[-1] }
+        stored = { tuple(row[:2]): tuple(row[2:]) for row in con.execute(sql_summaries, **bounds) }
+        actual = { tuple(row[:2]): tuple(int(value) for value in row[2:]) for row in con.execute(sql_libraries, **bounds) }
+
+        fixes = []
+        for key in set(stored) | set(actual):
+            expected = actual.get(key, (0,) * len(COUNTERS))
+            if stored.get(key, (0,) * len(COUNTERS)) != expected:
+                fixes.append(dict(zip(COUNTERS, expected), user_id=key[0], play_status_id=key[1]))
+
+        if fixes and not dry_run:
+            con.execute(sql_delete, fixes)
+            inserts = [fix for fix in fixes if fix['entry_count']]
+            if inserts:
+                con.execute(sql_insert, inserts)
+
+    checked += len(users)
+    drifted += len(fixes)
+    last_id = users[-1]
+
+print("Checked {} users, {} summaries drifted{}".format(checked, drifted, " (dry run, nothing changed)" if dry_run else ", corrected"))
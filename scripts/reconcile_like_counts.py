@@ -0,0 +1,67 @@
+import sqlalchemy
+import os, sys
+
+"""
+Verify the likes / dislikes counters of every likeable table against the likeables table, in batches.
+Rows that drifted are corrected unless --dry-run is passed. Also backfills the counters after they are added.
+"""
+
+# likeable_type => table holding its counters
+LIKEABLE_TABLES = {
+    'review': 'reviews',
+}
+
+# Connect to Database
+engine = sqlalchemy.create_engine(os.getenv('SQLALCHEMY_DATABASE_URI'))
+batch_size = int(os.getenv('RECONCILE_BATCH_SIZE', 1000))
+dry_run = '--dry-run' in sys.argv[1:]
+
+# Prepare SQL queries
+sql_rows = """
+SELECT   id, likes, dislikes
+FROM     {}
+WHERE    id > :last_id
+ORDER BY id
+LIMIT    :batch_size
+FOR UPDATE
+"""
+
+sql_likeables = sqlalchemy.text("""
+SELECT   likeable_id, Sum(CASE WHEN value = 1 THEN 1 ELSE 0 END), Sum(CASE WHEN value = 0 THEN 1 ELSE 0 END)
+FROM     likeables
+WHERE    likeable_type = :likeable_type AND likeable_id BETWEEN :first_id AND :last_id
+GROUP BY likeable_id
+""")
+
+sql_fix = """
+UPDATE {}
+SET    likes = :likes,
+       dislikes = :dislikes
+WHERE  id = :id
+"""
+
+# Execute queries, locking each batch of rows so concurrent votes wait for the fix
+for likeable_type, table in LIKEABLE_TABLES.items():
+    checked = drifted = 0
+    last_id = 0
+    while True:
+        with engine.begin() as con:
+            rows = con.execute(sqlalchemy.text(sql_rows.format(table)), last_id=last_id, batch_size=batch_size).fetchall()
+            if not rows:
+                break
+            actual = { row[0]: row[1:] for row in con.execute(sql_likeables, likeable_type=likeable_type, first_id=rows[0][0], last_id=rows[-1][0]) }
+
+            fixes = []
+            for id, likes, dislikes in rows:
+                expected_likes, expected_dislikes = actual.get(id, (0, 0))
+                if (likes or 0, dislikes or 0) != (expected_likes, expected_dislikes):
+                    fixes.append({ 'id': id, 'likes': expected_likes, 'dislikes': expected_dislikes })
+
+            if fixes and not dry_run:
+                con.execute(sqlalchemy.text(sql_fix.format(table)), fixes)
+
+        checked += len(rows)
+        drifted += len(fixes)
+        last_id = rows[-1][0]
+
+    print("Checked {} {}, {} drifted{}".format(checked, table, drifted, " (dry run, nothing changed)" if dry_run else ", corrected"))
@@ -0,0 +1,38 @@
+from app import app
+from extensions import db
+from services import job_queue
+import multiprocessing, os, signal, socket
+
+"""
+Run background jobs (e-mails, Spaces uploads and deletions) in JOB_WORKERS processes
+
+Each process claims due jobs from the jobs table, so several hosts can run this side by side.
+SIGTERM / SIGINT let the jobs in hand finish before exiting.
+
+Usage: python -m scripts.run_jobs
+"""
+
+WORKERS = int(os.getenv('JOB_WORKERS', 2))
+
+def work(index):
+    signal.signal(signal.SIGTERM, lambda signum, frame: job_queue.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: job_queue.stop())
+    with app.app_context():
+        # Connections are not shared with the parent process
+        db.engine.dispose()
+        job_queue.work('{}:{}:{}'.format(socket.gethostname(), os.getpid(), index))
+
+if __name__ == '__main__':
+    processes = [multiprocessing.Process(target=work, args=(index,)) for index in range(WORKERS)]
+    for process in processes:
+        process.start()
+
+    # Forward shutdown to the workers
+    def stop(signum, frame):
+        for process in processes:
+            process.terminate()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    for process in processes:
+        process.join()
@@ -1,50 +1,129 @@
 import sqlalchemy
-import os
+import numpy as np
+import os, time
 
 """
 Update rankings for each game
-"""
 
-# Connect to Database
-engine = sqlalchemy.create_engine(os.getenv('SQLALCHEMY_DATABASE_URI'))
+score and library_count are maintained incrementally on every library write
+(see services/game_stats.py); run scripts/reconcile_game_stats.py to verify them.
 
-# Prepare SQL queries
-sql_avg_score = """
-UPDATE games g
-SET    g.score = (SELECT Round(( Avg(score) / 10 ) * 100, 2)
-                  FROM   libraries l
-                  WHERE  l.game_id = g.id
-                         AND l.score IS NOT NULL)  
-"""
+Runs as a pipeline: stream the ranking inputs in chunks, rank every game with
+NumPy, stage the ranks that changed in a temporary table and apply them with
+one joined UPDATE.
 
-sql_library_count = """
-UPDATE games g
-SET    g.library_count = (SELECT Count(id)
-                          FROM   libraries l
-                          WHERE  l.game_id = g.id)  
+Usage: python -m scripts.update_game_rankings
 """
 
-sql_score_rank = """
-UPDATE games g
-SET    g.score_rank = (SELECT rank
-                       FROM   (SELECT id,
-                                      Row_number() OVER (ORDER BY score DESC, library_count DESC) AS rank
-                               FROM   games) r
-                       WHERE  r.id = g.id)  
-"""
+CHUNK_SIZE = int(os.getenv('RANKINGS_CHUNK_SIZE', 50000))
 
-sql_popularity_rank = """
-UPDATE games g
-SET    g.popularity_rank = (SELECT rank
-                            FROM   (SELECT id,
-                                           Row_number() OVER (ORDER BY library_count DESC, trending_page_views DESC) AS rank
-                                    FROM   games) r
-                            WHERE  r.id = g.id)  
-"""
+def read_games(con, table='games', chunk_size=CHUNK_SIZE):
+    """
+    Stream ranking inputs into arrays, NULL is read as NaN
+    :return: Tuple of (ids, score, library_count, trending_page_views, score_rank, popularity_rank) arrays
+    """
+    sql = """
+    SELECT id, score, library_count, trending_page_views, score_rank, popularity_rank
+    FROM   {}
+    """.format(table)
+    # Plain DB-API cursor: rows go straight into NumPy without building SQLAlchemy rows
+    cursor = con.connection.cursor()
+    cursor.execute(sql)
+    chunks = []
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        chunks.append(np.array(rows, dtype=np.float64))
+    cursor.close()
+    data = np.concatenate(chunks) if chunks else np.empty((0, 6))
+    return (data[:, 0].astype(np.int64),) + tuple(data[:, i] for i in range(1, 6))
+
+def descending(values):
+    # Sort key for DESC with NULLs last, matching MySQL's ORDER BY ... DESC
+    return np.where(np.isnan(values), np.inf, -values)
+
+def rank(ids, *keys):
+    """
+    1-based rank of each row when ordered by the given DESC keys, ties broken by id
+    :param ids: Array
+    :param keys: Arrays, most significant first
+    :return: Array
+    """
+    order = np.lexsort((ids,) + tuple(descending(key) for key in reversed(keys)))
+    ranks = np.empty(len(ids), dtype=np.int64)
+    ranks[order] = np.arange(1, len(ids) + 1)
+    return ranks
+
+def write_ranks(con, ids, score_rank, popularity_rank, table='games', chunk_size=CHUNK_SIZE):
+    """
+    Stage ranks in a temporary table and apply them with a single joined UPDATE
+    :return: Int rows updated
+    """
+    # Only ever drop the temporary table: a plain DROP TABLE also commits implicitly on MySQL
+    drop = 'DROP TEMPORARY TABLE {} tmp_game_ranks' if con.dialect.name == 'mysql' else 'DROP TABLE {} temp.tmp_game_ranks'
+    con.execute(drop.format('IF EXISTS'))
+    con.execute('CREATE TEMPORARY TABLE tmp_game_ranks (id INTEGER PRIMARY KEY, score_rank INTEGER, popularity_rank INTEGER)')
+    insert = sqlalchemy.text('INSERT INTO tmp_game_ranks (id, score_rank, popularity_rank) VALUES (:id, :score_rank, :popularity_rank)')
+    for start in range(0, len(ids), chunk_size):
+        end = start + chunk_size
+        con.execute(insert, [
+            { 'id': id, 'score_rank': s, 'popularity_rank': p }
+            for id, s, p in zip(ids[start:end].tolist(), score_rank[start:end].tolist(), popularity_rank[start:end].tolist())
+        ])
+
+    if con.dialect.name == 'mysql':
+        sql = """
+        UPDATE {} g
+               JOIN tmp_game_ranks r ON r.id = g.id
+        SET    g.score_rank = r.score_rank,
+               g.popularity_rank = r.popularity_rank
+        """
+    else:
+        sql = """
+        UPDATE {0}
+        SET    score_rank = r.score_rank,
+               popularity_rank = r.popularity_rank
+        FROM   tmp_game_ranks r
+        WHERE  r.id = {0}.id
+        """
+    updated = con.execute(sql.format(table)).rowcount
+    con.execute(drop.format(''))
+    return updated
+
+def update_rankings(con, table='games', chunk_size=CHUNK_SIZE):
+    """
+    Recompute score_rank and popularity_rank for every game
+    :return: Dict of stage => seconds, plus games and updated counts
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    ids, score, library_count, views, score_rank, popularity_rank = read_games(con, table, chunk_size)
+    timings['read'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new_score_rank = rank(ids, score, library_count)
+    new_popularity_rank = rank(ids, library_count, views)
+    # Only rows whose rank moved are written back
+    changed = (new_score_rank != score_rank) | (new_popularity_rank != popularity_rank)
+    timings['rank'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    updated = write_ranks(con, ids[changed], new_score_rank[changed], new_popularity_rank[changed], table, chunk_size)
+    timings['write'] = time.perf_counter() - start
+
+    timings['games'] = len(ids)
+    timings['updated'] = updated
+    return timings
+
+if __name__ == '__main__':
+    # Connect to Database
+    engine = sqlalchemy.create_engine(os.getenv('SQLALCHEMY_DATABASE_URI'))
+
+    with engine.begin() as con:
+        timings = update_rankings(con)
 
-# Execute queries
-with engine.connect() as con:
-    con.execute(sql_avg_score)
-    con.execute(sql_library_count)
-    con.execute(sql_score_rank)
-    con.execute(sql_popularity_rank)
\ No newline at end of file
+    print("Ranked {} games, {} updated".format(timings['games'], timings['updated']))
+    for stage in ('read', 'rank', 'write'):
+        print("  {:<6} {:8.3f}s".format(stage, timings[stage]))
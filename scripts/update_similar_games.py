@@ -0,0 +1,161 @@
+import sqlalchemy
+import numpy as np
+from scipy import sparse
+import os, time
+
+"""
+Precompute "players who have X also have Y" for every game
+
+Builds a sparse game x user matrix from the libraries table (weighted by
+score when SIMILAR_GAMES_WEIGHTED is set, unscored entries count as
+UNSCORED_WEIGHT), then computes the cosine similarity of each game with
+every other game one block of games at a time, keeping the top K
+neighbours shared by at least SIMILAR_GAMES_MIN_COMMON users. The
+similar_games table is replaced in a single transaction.
+
+Usage: python -m scripts.update_similar_games
+"""
+
+K = int(os.getenv('SIMILAR_GAMES_K', 20))
+MIN_COMMON = int(os.getenv('SIMILAR_GAMES_MIN_COMMON', 2))
+WEIGHTED = os.getenv('SIMILAR_GAMES_WEIGHTED', '0') in ('1', 'true')
+BLOCK_SIZE = int(os.getenv('SIMILAR_GAMES_BLOCK_SIZE', 256))
+CHUNK_SIZE = int(os.getenv('SIMILAR_GAMES_CHUNK_SIZE', 50000))
+UNSCORED_WEIGHT = 0.5
+
+def read_libraries(con, table='libraries', chunk_size=CHUNK_SIZE):
+    """
+    Stream (user_id, game_id, score) into arrays, NULL score is read as NaN
+    :return: Tuple of (user_ids, game_ids, scores) arrays
+    """
+    cursor = con.connection.cursor()
+    cursor.execute('SELECT user_id, game_id, score FROM {}'.format(table))
+    chunks = []
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        chunks.append(np.array(rows, dtype=np.float64))
+    cursor.close()
+    data = np.concatenate(chunks) if chunks else np.empty((0, 3))
+    return data[:, 0].astype(np.int64), data[:, 1].astype(np.int64), data[:, 2]
+
+def build_matrix(user_ids, game_ids, scores, weighted=WEIGHTED):
+    """
+    Sparse game x user matrix, one entry per (game, user) keeping the highest weight
+    :return: Tuple of (csr_matrix, array of game ids per row)
+    """
+    games, game_index = np.unique(game_ids, return_inverse=True)
+    users, user_index = np.unique(user_ids, return_inverse=True)
+    if weighted:
+        weights = np.where(np.isnan(scores), UNSCORED_WEIGHT, scores / 10)
+    else:
+        weights = np.ones(len(user_ids))
+
+    # A game can be in a library more than once: keep the best entry per (game, user)
+    keys = game_index * len(users) + user_index
+    order = np.lexsort((weights, keys))
+    last = np.append(keys[order][1:] != keys[order][:-1], True)
+    keep = order[last]
+
+    matrix = sparse.csr_matrix((weights[keep], (game_index[keep], user_index[keep])), shape=(len(games), len(users)))
+    return matrix, games
+
+def top_neighbours(matrix, k=K, min_common=MIN_COMMON, block_size=BLOCK_SIZE):
+    """
+    Top k cosine neighbours of every row, among rows sharing at least min_common columns
+    :param matrix: csr_matrix (games x users)
+    :return: Tuple of (row, neighbour, position, score) arrays
+    """
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    normalized = (sparse.diags(1 / np.where(norms > 0, norms, 1)) @ matrix).tocsr()
+    normalized_t = normalized.T.tocsr()
+    binary = matrix.copy()
+    binary.data[:] = 1
+    binary_t = binary.T.tocsr()
+
+    rows, neighbours, positions, scores = [], [], [], []
+    for start in range(0, matrix.shape[0], block_size):
+        end = min(start + block_size, matrix.shape[0])
+        similarity = (normalized[start:end] @ normalized_t).tocsr()
+        common = (binary[start:end] @ binary_t).tocsr()
+        similarity.sort_indices()
+        common.sort_indices()
+
+        for i in range(end - start):
+            lo, hi = similarity.indptr[i], similarity.indptr[i + 1]
+            columns = similarity.indices[lo:hi]
+            values = similarity.data[lo:hi]
+            # The products do not share a sparsity (zero weights drop out of `similarity` only),
+            # so look up each similarity column in the row of `common`, which holds every game with a shared user
+            common_lo, common_hi = common.indptr[i], common.indptr[i + 1]
+            shared = common.data[common_lo:common_hi][np.searchsorted(common.indices[common_lo:common_hi], columns)]
+            mask = (shared >= min_common) & (columns != start + i)
+            columns, values = columns[mask], values[mask]
+            if not len(columns):
+                continue
+            if len(columns) > k:
+                # Keep everything tied with the k-th best, ties are then broken by id
+                top = values >= np.partition(values, len(values) - k)[len(values) - k]
+                columns, values = columns[top], values[top]
+            order = np.lexsort((columns, -values))[:k]
+            rows.append(np.full(len(order), start + i))
+            neighbours.append(columns[order])
+            positions.append(np.arange(1, len(order) + 1))
+            scores.append(values[order])
+
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, np.empty(0)
+    return np.concatenate(rows), np.concatenate(neighbours), np.concatenate(positions), np.concatenate(scores)
+
+def write_similar(con, game_ids, similar_game_ids, positions, scores, table='similar_games', chunk_size=CHUNK_SIZE):
+    """
+    Replace the contents of the similar games table
+    :return: Int rows written
+    """
+    con.execute('DELETE FROM {}'.format(table))
+    insert = sqlalchemy.text('INSERT INTO {} (game_id, position, similar_game_id, score) VALUES (:game_id, :position, :similar_game_id, :score)'.format(table))
+    for start in range(0, len(game_ids), chunk_size):
+        end = start + chunk_size
+        con.execute(insert, [
+            { 'game_id': g, 'position': p, 'similar_game_id': s, 'score': round(v, 6) }
+            for g, p, s, v in zip(game_ids[start:end].tolist(), positions[start:end].tolist(), similar_game_ids[start:end].tolist(), scores[start:end].tolist())
+        ])
+    return len(game_ids)
+
+def update_similar_games(con, libraries='libraries', table='similar_games', k=K, min_common=MIN_COMMON, weighted=WEIGHTED):
+    """
+    Recompute the similar games of every game
+    :return: Dict of stage => seconds, plus entries, games and rows counts
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    user_ids, game_ids, scores = read_libraries(con, libraries)
+    timings['read'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matrix, games = build_matrix(user_ids, game_ids, scores, weighted)
+    rows, neighbours, positions, similarity = top_neighbours(matrix, k, min_common)
+    timings['compute'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    written = write_similar(con, games[rows], games[neighbours], positions, similarity, table)
+    timings['write'] = time.perf_counter() - start
+
+    timings['entries'] = len(user_ids)
+    timings['games'] = len(games)
+    timings['rows'] = written
+    return timings
+
+if __name__ == '__main__':
+    # Connect to Database
+    engine = sqlalchemy.create_engine(os.getenv('SQLALCHEMY_DATABASE_URI'))
+
+    with engine.begin() as con:
+        timings = update_similar_games(con)
+
+    print("{} library entries, {} games, {} similar game rows".format(timings['entries'], timings['games'], timings['rows']))
+    for stage in ('read', 'compute', 'write'):
+        print("  {:<8} {:8.3f}s".format(stage, timings[stage]))
@@ -0,0 +1,17 @@
+# Import Services
+from .title_index import title_index
+from .facets import facet_index
+from .view_counter import view_counter
+from .trending import trending
+from .user_status import user_status
+from .autocomplete import autocomplete
+from .fuzzy_search import fuzzy_search
+from .game_stats import maintain_game_stats
+from .like_counts import maintain_like_counts
+from .library_summaries import maintain_library_summaries
+from .follow_graph import maintain_follow_counts
+from .activity_feed import activity_feed
+from .identity import identity_cache
+from .password_hasher import password_hasher
+from .job_queue import job_queue
+from . import jobs
@@ -0,0 +1,159 @@
+from extensions import db
+from sqlalchemy import event, select, literal, and_, not_, exists
+
+from models import Activity, TimelineEntry, User, LibraryEntry, Review, Recommendation
+from models.user import user_following
+
+__all__ = ['ActivityFeed', 'activity_feed']
+
+# Model => activity_type of the Activities recorded when it is created
+ACTIVITY_TYPES = {
+    LibraryEntry: 'library_entry',
+    Review: 'review',
+    Recommendation: 'recommendation',
+}
+
+class ActivityFeed():
+    """
+    Timelines of what followed Users did, newest first.
+
+    Creating a Library Entry, Review or Recommendation records one Activity
+    and copies its id into the timeline of every follower with a single
+    INSERT ... SELECT, in the same transaction (fan-out on write), so reading
+    a feed is a primary key range scan. Activities of Users with more than
+    `fanout_max_followers` followers are not fanned out: they are recorded
+    with fanned_out = 0 and pulled from the activities table when a follower
+    reads their feed, then merged with the pushed ones. The mode is kept per
+    Activity, so a User dropping back under the threshold keeps the
+    Activities recorded while above it. Their author is flagged with
+    pulled_activities = 1, so a feed read only looks at the flagged Users
+    among those followed.
+    """
+    def __init__(self, app=None):
+        self.fanout_max_followers = 5000
+        self.backfill_size = 20
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.fanout_max_followers = app.config.get('FEED_FANOUT_MAX_FOLLOWERS', self.fanout_max_followers)
+        self.backfill_size = app.config.get('FEED_BACKFILL_SIZE', self.backfill_size)
+
+    def record(self, connection, user_id, activity_type, subject_id, game_id=None):
+        """
+        Record an Activity and fan it out to the User's followers, in the caller's transaction
+        :param connection: Connection
+        :return: Int activity id
+        """
+        fanned_out = not self._pulled(connection, user_id)
+        activity_id = connection.execute(Activity.__table__.insert().values(
+            user_id=user_id, activity_type=activity_type, subject_id=subject_id, game_id=game_id, fanned_out=1 if fanned_out else 0,
+        )).inserted_primary_key[0]
+
+        if fanned_out:
+            timelines = TimelineEntry.__table__
+            connection.execute(timelines.insert().from_select(
+                ['user_id', 'activity_id', 'actor_id'],
+                select([user_following.c.follower_id, literal(activity_id), literal(user_id)])
+                    .where(user_following.c.leader_id == user_id)
+            ))
+        else:
+            users = User.__table__
+            connection.execute(users.update()
+                .where(and_(users.c.id == user_id, users.c.pulled_activities == 0))
+                .values(pulled_activities=1))
+        return activity_id
+
+    def remove(self, connection, activity_type, subject_ids):
+        """
+        Delete the Activities (and their timeline entries) of deleted subjects
+        :param connection: Connection
+        :param activity_type: String
+        :param subject_ids: List of Int
+        """
+        activities = Activity.__table__
+        timelines = TimelineEntry.__table__
+        ids = select([activities.c.id]).where(and_(activities.c.activity_type == activity_type, activities.c.subject_id.in_(subject_ids)))
+        activity_ids = [id for (id,) in connection.execute(ids)]
+        if activity_ids:
+            connection.execute(timelines.delete().where(timelines.c.activity_id.in_(activity_ids)))
+            connection.execute(activities.delete().where(activities.c.id.in_(activity_ids)))
+
+    def backfill(self, connection, follower_id, leader_id):
+        """
+        Copy a newly followed User's latest fanned out Activities into the follower's timeline (the others are pulled)
+        :param connection: Connection
+        """
+        activities = Activity.__table__
+        timelines = TimelineEntry.__table__
+        latest = select([activities.c.id])\
+            .where(and_(activities.c.user_id == leader_id, activities.c.fanned_out == 1))\
+            .order_by(activities.c.id.desc()).limit(self.backfill_size).alias('latest')
+        delivered = exists().where(and_(timelines.c.user_id == follower_id, timelines.c.activity_id == latest.c.id))
+        connection.execute(timelines.insert().from_select(
+            ['user_id', 'activity_id', 'actor_id'],
+            select([literal(follower_id), latest.c.id, literal(leader_id)]).where(not_(delivered))
+        ))
+
+    def prune(self, connection, follower_id, leader_id):
+        """
+        Drop an unfollowed User's Activities from the follower's timeline
+        :param connection: Connection
+        """
+        timelines = TimelineEntry.__table__
+        connection.execute(timelines.delete().where(and_(timelines.c.user_id == follower_id, timelines.c.actor_id == leader_id)))
+
+    def timeline(self, user_id, before=None, limit=20):
+        """
+        Read a User's feed, merging pushed timeline entries with the pulled Activities of followed Users
+        :param user_id: Int
+        :param before: Int activity id to continue after (exclusive), None for the newest
+        :param limit: Int
+        :return: List of at most limit + 1 Activities, newest first (the extra one means there is a next page)
+        """
+        pushed = db.session.query(TimelineEntry.activity_id).filter(TimelineEntry.user_id == user_id)
+        if before is not None:
+            pushed = pushed.filter(TimelineEntry.activity_id < before)
+        activity_ids = { id for (id,) in pushed.order_by(TimelineEntry.activity_id.desc()).limit(limit + 1) }
+
+        # One index range per followed User with Activities that were not fanned out (whatever their follower count is now),
+        # each bounded by the page size. Flagged Users are few, so they are read from their index and checked against the follows.
+        pulled_users = db.session.query(User.id)\
+            .join(user_following, user_following.c.leader_id == User.id)\
+            .filter(User.pulled_activities == 1, user_following.c.follower_id == user_id)
+        for (pulled_user_id,) in pulled_users:
+            pulled = db.session.query(Activity.id).filter(Activity.user_id == pulled_user_id, Activity.fanned_out == 0)
+            if before is not None:
+                pulled = pulled.filter(Activity.id < before)
+            activity_ids.update(id for (id,) in pulled.order_by(Activity.id.desc()).limit(limit + 1))
+
+        activity_ids = sorted(activity_ids, reverse=True)[:limit + 1]
+        if not activity_ids:
+            return []
+        activities = { activity.id: activity for activity in Activity.query.filter(Activity.id.in_(activity_ids)) }
+        return [activities[id] for id in activity_ids if id in activities]
+
+    def _pulled(self, connection, user_id):
+        users = User.__table__
+        follower_count = connection.execute(select([users.c.follower_count]).where(users.c.id == user_id)).scalar()
+        return (follower_count or 0) > self.fanout_max_followers
+
+activity_feed = ActivityFeed()
+
+@event.listens_for(db.session, 'after_flush')
+def record_activities(session, flush_context):
+    connection = None
+    for obj in session.new:
+        activity_type = ACTIVITY_TYPES.get(type(obj))
+        if activity_type is not None:
+            connection = connection or session.connection()
+            activity_feed.record(connection, obj.user_id, activity_type, obj.id, obj.game_id)
+
+    deleted = {}
+    for obj in session.deleted:
+        activity_type = ACTIVITY_TYPES.get(type(obj))
+        if activity_type is not None:
+            deleted.setdefault(activity_type, []).append(obj.id)
+    for activity_type, subject_ids in deleted.items():
+        connection = connection or session.connection()
+        activity_feed.remove(connection, activity_type, subject_ids)
@@ -0,0 +1,205 @@
+from extensions import db
+from sqlalchemy import event, inspect, func
+from bisect import bisect_left
+import heapq
+import numpy as np
+
+from models import Game, Developer, Publisher, Release
+from .events import after_commit
+from .index import InMemoryIndex
+from .title_index import normalize_title
+
+__all__ = ['Autocomplete', 'autocomplete']
+
+TYPES = ('game', 'developer', 'publisher')
+
+class Autocomplete(InMemoryIndex):
+    """
+    Sorted-array prefix index over Game titles, Developer names and Publisher names.
+
+    Every word start of a name is stored as a key (so "zel" finds "The Legend
+    of Zelda") in one sorted list, so a prefix matches one contiguous slice.
+    Games rank by popularity_rank, Developers and Publishers by the best
+    popularity_rank of their Games. A sparse table of range minimums over the
+    ranks lets a lookup pull the best entries of a slice in O(limit log limit),
+    however common the prefix.
+
+    Changes go to a small sorted overlay (replaced entries are skipped in the
+    main arrays) which is merged back once it reaches `overlay_size`.
+    """
+    config_prefix = 'AUTOCOMPLETE'
+    overlay_size = 1000
+
+    def __init__(self, app=None):
+        self._entries = {}
+        self._keys = []
+        self._refs = []
+        self._ranks = np.empty(0, dtype=np.int32)
+        self._sparse = []
+        self._packed = set()
+        self._dead = set()
+        self._extra_keys = []
+        self._extra_refs = []
+        super().__init__(app)
+
+    def build(self):
+        games = db.session.query(Game.id, Game.title, Game.slug, Game.icon, Game.popularity_rank).all()
+        developers = db.session.query(Developer.id, Developer.name, func.min(Game.popularity_rank))\
+            .outerjoin(Game, Game.developer_id == Developer.id).group_by(Developer.id, Developer.name).all()
+        publishers = db.session.query(Publisher.id, Publisher.name, func.min(Game.popularity_rank))\
+            .outerjoin(Release, Release.publisher_id == Publisher.id).outerjoin(Game, Game.id == Release.game_id)\
+            .group_by(Publisher.id, Publisher.name).all()
+        self.load(games, developers, publishers)
+
+    def load(self, games, developers=(), publishers=()):
+        """
+        Replace the index contents
+        :param games: Iterable of (id, title, slug, icon, popularity_rank)
+        :param developers: Iterable of (id, name, popularity_rank)
+        :param publishers: Iterable of (id, name, popularity_rank)
+        """
+        entries = {}
+        for id, title, slug, icon, rank in games:
+            entries[('game', id)] = _entry('game', id, title, slug, icon, rank)
+        for type, rows in (('developer', developers), ('publisher', publishers)):
+            for id, name, rank in rows:
+                entries[(type, id)] = _entry(type, id, name, None, None, rank)
+
+        with self._lock:
+            self._pack(entries)
+            self._mark_built()
+
+    def complete(self, prefix, limit=10):
+        """
+        Get the best ranked names with a word starting with the prefix
+        :param prefix: String
+        :param limit: Int
+        :return: List of { type, id, title, slug, icon }
+        """
+        self.ensure_fresh()
+
+        needle = normalize_title(prefix).strip()
+        if not needle:
+            return []
+        upper = needle + '\U0010ffff'
+        with self._lock:
+            best = self._best(bisect_left(self._keys, needle), bisect_left(self._keys, upper), limit)
+
+            lo = bisect_left(self._extra_keys, needle)
+            hi = bisect_left(self._extra_keys, upper, lo)
+            best += [self._entries[ref] for ref in set(self._extra_refs[lo:hi])]
+
+            best = sorted(best, key=_rank_key)[:limit]
+            return [{ name: entry[name] for name in ('type', 'id', 'title', 'slug', 'icon') } for entry in best]
+
+    def set_entry(self, type, id, title, slug=None, icon=None, rank=None):
+        with self._lock:
+            previous = self._entries.get((type, id))
+            if previous is not None and rank is None and type != 'game':
+                rank = previous['rank']
+            self._remove((type, id))
+            entry = self._entries[(type, id)] = _entry(type, id, title, slug, icon, rank)
+            for key in _word_keys(entry['title']):
+                i = bisect_left(self._extra_keys, key)
+                self._extra_keys.insert(i, key)
+                self._extra_refs.insert(i, (type, id))
+            if len(self._extra_keys) + len(self._dead) > self.overlay_size:
+                self._pack(self._entries)
+
+    def remove_entry(self, type, id):
+        with self._lock:
+            self._remove((type, id))
+
+    def _remove(self, ref):
+        entry = self._entries.pop(ref, None)
+        if entry is None:
+            return
+        if ref in self._packed and ref not in self._dead:
+            self._dead.add(ref)
+            return
+        for key in _word_keys(entry['title']):
+            i = bisect_left(self._extra_keys, key)
+            while self._extra_refs[i] != ref:
+                i += 1
+            del self._extra_keys[i]
+            del self._extra_refs[i]
+
+    def _pack(self, entries):
+        ordinals = {ref: i for i, ref in enumerate(sorted(entries, key=lambda ref: _rank_key(entries[ref])))}
+        pairs = sorted((key, ref) for ref, entry in entries.items() for key in _word_keys(entry['title']))
+        keys = [key for key, ref in pairs]
+        refs = [ref for key, ref in pairs]
+        ranks = np.fromiter((ordinals[ref] for ref in refs), dtype=np.int32, count=len(refs))
+
+        # sparse[j][i] is the position of the best rank in keys[i:i + 2 ** j]
+        sparse = [np.arange(len(refs), dtype=np.int32)]
+        while 2 ** len(sparse) <= len(refs):
+            previous, half = sparse[-1], 2 ** (len(sparse) - 1)
+            left = previous[:len(refs) - 2 * half + 1]
+            right = previous[half:half + len(left)]
+            sparse.append(np.where(ranks[left] <= ranks[right], left, right))
+
+        self._entries = entries
+        self._keys = keys
+        self._refs = refs
+        self._ranks = ranks
+        self._sparse = sparse
+        self._packed = set(entries)
+        self._dead = set()
+        self._extra_keys = []
+        self._extra_refs = []
+
+    def _best(self, lo, hi, limit):
+        # Pop range minimums best first, splitting the range around each hit
+        heap = []
+        self._push_range(heap, lo, hi)
+        best = []
+        seen = set()
+        while heap and len(best) < limit:
+            _, position, lo, hi = heapq.heappop(heap)
+            ref = self._refs[position]
+            if ref not in seen and ref not in self._dead:
+                seen.add(ref)
+                best.append(self._entries[ref])
+            self._push_range(heap, lo, position)
+            self._push_range(heap, position + 1, hi)
+        return best
+
+    def _push_range(self, heap, lo, hi):
+        if lo >= hi:
+            return
+        level = (hi - lo).bit_length() - 1
+        left = int(self._sparse[level][lo])
+        right = int(self._sparse[level][hi - 2 ** level])
+        position = left if self._ranks[left] <= self._ranks[right] else right
+        heapq.heappush(heap, (int(self._ranks[position]), position, lo, hi))
+
+def _entry(type, id, title, slug, icon, rank):
+    return { 'type': type, 'id': id, 'title': title, 'slug': slug, 'icon': icon, 'rank': rank }
+
+def _rank_key(entry):
+    # Unranked entries sort last
+    return (entry['rank'] is None, entry['rank'] or 0, TYPES.index(entry['type']), entry['id'])
+
+def _word_keys(title):
+    normalized = normalize_title(title)
+    return {normalized[i:] for i, c in enumerate(normalized) if c.isalnum() and (i == 0 or not normalized[i - 1].isalnum())}
+
+autocomplete = Autocomplete()
+
+@event.listens_for(db.session, 'after_flush')
+def track_name_changes(session, flush_context):
+    changes = []
+    for obj in list(session.new) + list(session.dirty):
+        state = inspect(obj)
+        if isinstance(obj, Game) and (obj in session.new or any(state.attrs[name].history.has_changes()
+                                                                for name in ('title', 'slug', 'icon', 'popularity_rank'))):
+            changes.append((autocomplete.set_entry, 'game', obj.id, obj.title, obj.slug, obj.icon, obj.popularity_rank))
+        elif isinstance(obj, (Developer, Publisher)) and (obj in session.new or state.attrs.name.history.has_changes()):
+            changes.append((autocomplete.set_entry, type(obj).__name__.lower(), obj.id, obj.name))
+    for obj in session.deleted:
+        if isinstance(obj, (Game, Developer, Publisher)):
+            changes.append((autocomplete.remove_entry, type(obj).__name__.lower(), obj.id))
+
+    for fn, *args in changes:
+        after_commit(session, lambda fn=fn, args=args: fn(*args))
@@ -0,0 +1,26 @@
+from extensions import db
+from sqlalchemy import event
+
+__all__ = ['after_commit']
+
+_CALLBACKS_KEY = 'after_commit_callbacks'
+
+def after_commit(session, callback):
+    """
+    Defer a callback until the session's current transaction commits.
+    Callbacks queued in a transaction that is rolled back are discarded,
+    so in-memory structures never see writes the database did not keep.
+    :param session: Session
+    :param callback: Callable taking no arguments
+    """
+    session.info.setdefault(_CALLBACKS_KEY, []).append(callback)
+
+@event.listens_for(db.session, 'after_commit')
+def run_callbacks(session):
+    callbacks = session.info.pop(_CALLBACKS_KEY, [])
+    for callback in callbacks:
+        callback()
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_callbacks(session):
+    session.info.pop(_CALLBACKS_KEY, None)
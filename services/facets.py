@@ -0,0 +1,337 @@
+from extensions import db
+from sqlalchemy import event, inspect
+from pyroaring import BitMap
+from collections import OrderedDict
+from bisect import bisect_right
+import math
+
+from models import Game, Genre, Release, game_genre
+from .events import after_commit
+from .index import InMemoryIndex
+from .title_index import title_index
+
+__all__ = ['FacetIndex', 'facet_index', 'FACETS']
+
+# Request parameter name => facet keys whose bitmaps are unioned for that filter
+FACETS = {
+    'developers': ('developer', 'codeveloper'),
+    'publishers': ('publisher',),
+    'platforms': ('platform',),
+    'genres': ('genre',),
+}
+
+class FacetIndex(InMemoryIndex):
+    """
+    Compressed bitmaps of games per developer, codeveloper, publisher, platform and genre.
+
+    Bits are positions in `popularity_rank` order rather than game ids, so
+    intersecting and unioning bitmaps yields matches already sorted for the
+    browse page and `len()` of the result is the exact total.
+    """
+    config_prefix = 'FACET_INDEX'
+
+    def __init__(self, app=None):
+        self._order = []
+        self._sort_keys = []
+        self._positions = {}
+        self._all = BitMap()
+        self._bitmaps = {}
+        self._score_buckets = {}
+        self._games = {}
+        self._release_games = {}
+        self._version = 0
+        self._count_cache = OrderedDict()
+        self.count_cache_size = 256
+        super().__init__(app)
+
+    def init_app(self, app):
+        self.count_cache_size = app.config.get('FACET_COUNT_CACHE_SIZE', self.count_cache_size)
+        super().init_app(app)
+
+    def build(self):
+        games = db.session.query(Game.id, Game.developer_id, Game.score, Game.popularity_rank)\
+            .order_by(Game.popularity_rank.is_(None), Game.popularity_rank.asc(), Game.id.asc()).all()
+        releases = db.session.query(Release.id, Release.game_id, Release.platform_id, Release.publisher_id, Release.codeveloper_id).all()
+        genres = db.session.query(game_genre.c.game_id, game_genre.c.genre_id).all()
+        self.load(games, releases, genres)
+
+    def load(self, games, releases=(), genres=()):
+        """
+        Replace the index contents
+        :param games: Iterable of (game_id, developer_id, score, popularity_rank) in popularity order
+        :param releases: Iterable of (release_id, game_id, platform_id, publisher_id, codeveloper_id)
+        :param genres: Iterable of (game_id, genre_id)
+        """
+        records = {}
+        order = []
+        sort_keys = []
+        for game_id, developer_id, score, popularity_rank in games:
+            records[game_id] = {'developer_id': developer_id, 'score': score, 'releases': {}, 'genres': set()}
+            order.append(game_id)
+            sort_keys.append(_sort_key(popularity_rank, game_id))
+        release_games = {}
+        for release_id, game_id, platform_id, publisher_id, codeveloper_id in releases:
+            if game_id in records:
+                records[game_id]['releases'][release_id] = (platform_id, publisher_id, codeveloper_id)
+                release_games[release_id] = game_id
+        for game_id, genre_id in genres:
+            if game_id in records:
+                records[game_id]['genres'].add(genre_id)
+
+        positions = {game_id: position for position, game_id in enumerate(order)}
+        members = {}
+        buckets = {}
+        for game_id, record in records.items():
+            position = positions[game_id]
+            for key in _facet_keys(record):
+                members.setdefault(key, []).append(position)
+            bucket = _score_bucket(record['score'])
+            if bucket is not None:
+                buckets.setdefault(bucket, []).append(position)
+
+        with self._lock:
+            self._games = records
+            self._release_games = release_games
+            self._order = order
+            self._sort_keys = sort_keys
+            self._positions = positions
+            self._all = BitMap(range(len(order)))
+            self._bitmaps = {key: BitMap(p) for key, p in members.items()}
+            self._score_buckets = {bucket: BitMap(p) for bucket, p in buckets.items()}
+            self._version += 1
+            self._mark_built()
+
+    def filter(self, filters=None, min_score=None, game_ids=None):
+        """
+        Get the positions of Games matching every applied filter
+        :param filters: Dict of facet name => list of ids, e.g. { 'platforms': [1, 2] }
+        :param min_score: Int
+        :param game_ids: Iterable of game ids to restrict to (e.g. title search results)
+        :return: BitMap
+        """
+        self.ensure_fresh()
+        with self._lock:
+            result = BitMap(self._all)
+            for name, ids in (filters or {}).items():
+                if ids:
+                    result = result & self._facet_bitmap(name, ids)
+            if min_score:
+                result = result & self._score_bitmap(min_score)
+            if game_ids is not None:
+                result = result & BitMap(self._positions[i] for i in game_ids if i in self._positions)
+            return result
+
+    def counts(self, filters=None, min_score=None, game_ids=None, search=None):
+        """
+        Get the number of matching Games per facet value for the current filter set.
+        Each facet is counted against every other applied filter but not its own,
+        so a count answers "how many games if I also tick this value".
+        :param filters: Dict of facet name => list of ids
+        :param min_score: Int
+        :param game_ids: Iterable of game ids to restrict to (e.g. title search results)
+        :param search: String that produced game_ids, used to key the cache
+        :return: Dict of facet name => { value id: count }
+        """
+        self.ensure_fresh()
+        filters = {name: sorted(set(ids)) for name, ids in (filters or {}).items() if ids}
+        # A title edit changes which games a search matches without touching the facets
+        search_key = (search, title_index.version) if search is not None else None
+        signature = (self._version, tuple(sorted((name, tuple(ids)) for name, ids in filters.items())), min_score or 0, search_key)
+
+        with self._lock:
+            counts = self._count_cache.get(signature)
+            if counts is not None:
+                self._count_cache.move_to_end(signature)
+                return counts
+
+            values = {}
+            for facet, value_id in self._bitmaps:
+                values.setdefault(facet, set()).add(value_id)
+
+            counts = {}
+            for name, facet_keys in FACETS.items():
+                others = {other: ids for other, ids in filters.items() if other != name}
+                base = self.filter(others, min_score=min_score, game_ids=game_ids)
+                value_ids = set().union(*(values.get(facet, ()) for facet in facet_keys))
+                facet_counts = {}
+                for value_id in sorted(value_ids):
+                    count = base.intersection_cardinality(self._facet_bitmap(name, [value_id]))
+                    if count:
+                        facet_counts[value_id] = count
+                counts[name] = facet_counts
+
+            self._count_cache[signature] = counts
+            while len(self._count_cache) > self.count_cache_size:
+                self._count_cache.popitem(last=False)
+            return counts
+
+    def page(self, matches, page, per_page):
+        """
+        Get the game ids for one page of a filter result, in popularity order
+        :param matches: BitMap returned by filter()
+        :param page: Int
+        :param per_page: Int
+        :return: List of game ids
+        """
+        start = (page - 1) * per_page
+        with self._lock:
+            return [self._order[position] for position in matches[start:start + per_page]]
+
+    def page_after(self, matches, after, limit):
+        """
+        Get the game ids of a filter result that sort after a cursor, in popularity order
+        :param matches: BitMap returned by filter()
+        :param after: List of (popularity_rank, game_id) from cursor_values(), or None for the first page
+        :param limit: Int
+        :return: List of game ids
+        """
+        with self._lock:
+            start = 0
+            if after is not None:
+                position = bisect_right(self._sort_keys, _sort_key(*after))
+                start = matches.rank(position - 1) if position > 0 else 0
+            return [self._order[position] for position in matches[start:start + limit]]
+
+    def cursor_values(self, game_id):
+        """
+        Get the (popularity_rank, game_id) sort key the index ordered a Game by
+        :param game_id: Int
+        :return: List
+        """
+        with self._lock:
+            is_unranked, popularity_rank, game_id = self._sort_keys[self._positions[game_id]]
+            return [None if is_unranked else popularity_rank, game_id]
+
+    def set_game(self, game_id, developer_id, score, genre_ids=None):
+        with self._lock:
+            record = self._games.get(game_id)
+            if record is None:
+                # New Games have no rank yet, which sorts them last
+                record = {'developer_id': None, 'score': None, 'releases': {}, 'genres': set()}
+                self._positions[game_id] = len(self._order)
+                self._order.append(game_id)
+                self._sort_keys.append(_sort_key(None, game_id))
+                self._all.add(self._positions[game_id])
+                self._games[game_id] = record
+            self._update(game_id, developer_id=developer_id, score=score,
+                         genres=set(genre_ids) if genre_ids is not None else record['genres'])
+
+    def set_score(self, game_id, score):
+        with self._lock:
+            if game_id in self._games:
+                self._update(game_id, score=score)
+
+    def remove_game(self, game_id):
+        with self._lock:
+            if game_id not in self._games:
+                return
+            for release_id in self._games[game_id]['releases']:
+                self._release_games.pop(release_id, None)
+            self._update(game_id, developer_id=None, score=None, releases={}, genres=set())
+            position = self._positions.pop(game_id)
+            self._all.discard(position)
+            self._order[position] = None
+            del self._games[game_id]
+
+    def set_release(self, game_id, release_id, platform_id, publisher_id, codeveloper_id):
+        with self._lock:
+            self.remove_release(release_id)
+            record = self._games.get(game_id)
+            if record is not None:
+                releases = dict(record['releases'])
+                releases[release_id] = (platform_id, publisher_id, codeveloper_id)
+                self._release_games[release_id] = game_id
+                self._update(game_id, releases=releases)
+
+    def remove_release(self, release_id):
+        with self._lock:
+            game_id = self._release_games.pop(release_id, None)
+            if game_id is None:
+                return
+            releases = dict(self._games[game_id]['releases'])
+            del releases[release_id]
+            self._update(game_id, releases=releases)
+
+    def _update(self, game_id, **changes):
+        record = self._games[game_id]
+        position = self._positions[game_id]
+        self._version += 1
+        before = _facet_keys(record)
+        before_bucket = _score_bucket(record['score'])
+        record.update(changes)
+        after = _facet_keys(record)
+        after_bucket = _score_bucket(record['score'])
+
+        for key in before - after:
+            self._bitmaps[key].discard(position)
+        for key in after - before:
+            self._bitmaps.setdefault(key, BitMap()).add(position)
+        if before_bucket != after_bucket:
+            if before_bucket is not None:
+                self._score_buckets[before_bucket].discard(position)
+            if after_bucket is not None:
+                self._score_buckets.setdefault(after_bucket, BitMap()).add(position)
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            super().invalidate()
+
+    def _facet_bitmap(self, name, ids):
+        return BitMap.union(BitMap(), *(self._bitmaps.get((facet, i), BitMap()) for facet in FACETS[name] for i in ids))
+
+    def _score_bitmap(self, min_score):
+        return BitMap.union(BitMap(), *(bitmap for bucket, bitmap in self._score_buckets.items() if bucket >= min_score))
+
+def _facet_keys(record):
+    keys = set()
+    if record['developer_id'] is not None:
+        keys.add(('developer', record['developer_id']))
+    for platform_id, publisher_id, codeveloper_id in record['releases'].values():
+        keys.add(('platform', platform_id))
+        keys.add(('publisher', publisher_id))
+        if codeveloper_id is not None:
+            keys.add(('codeveloper', codeveloper_id))
+    for genre_id in record['genres']:
+        keys.add(('genre', genre_id))
+    return keys
+
+def _sort_key(popularity_rank, game_id):
+    # Matches ORDER BY popularity_rank IS NULL, popularity_rank, id
+    return (popularity_rank is None, popularity_rank or 0, game_id)
+
+def _score_bucket(score):
+    # score >= n for an integer n holds exactly when floor(score) >= n
+    return None if score is None else math.floor(score)
+
+facet_index = FacetIndex()
+
+@event.listens_for(db.session, 'after_flush')
+def track_facet_changes(session, flush_context):
+    # Games are applied before Releases so a new Release always finds its Game indexed
+    game_changes = []
+    release_changes = []
+    for obj in session.new:
+        if isinstance(obj, Game):
+            game_changes.append((facet_index.set_game, obj.id, obj.developer_id, obj.score, [genre.id for genre in obj.genres]))
+        elif isinstance(obj, Release):
+            release_changes.append((facet_index.set_release, obj.game_id, obj.id, obj.platform_id, obj.publisher_id, obj.codeveloper_id))
+    for obj in session.dirty:
+        if isinstance(obj, Game):
+            state = inspect(obj)
+            if state.attrs.popularity_rank.history.has_changes():
+                game_changes.append((facet_index.invalidate,))
+            if any(state.attrs[attr].history.has_changes() for attr in ('developer_id', 'score', 'genres')):
+                game_changes.append((facet_index.set_game, obj.id, obj.developer_id, obj.score, [genre.id for genre in obj.genres]))
+        elif isinstance(obj, Release):
+            release_changes.append((facet_index.set_release, obj.game_id, obj.id, obj.platform_id, obj.publisher_id, obj.codeveloper_id))
+        elif isinstance(obj, Genre) and inspect(obj).attrs.games.history.has_changes():
+            game_changes.append((facet_index.invalidate,))
+    for obj in session.deleted:
+        if isinstance(obj, Game):
+            game_changes.append((facet_index.remove_game, obj.id))
+        elif isinstance(obj, Release):
+            release_changes.append((facet_index.remove_release, obj.id))
+
+    for fn, *args in game_changes + release_changes:
+        after_commit(session, lambda fn=fn, args=args: fn(*args))
@@ -0,0 +1,147 @@
+from extensions import db
+from sqlalchemy import event, inspect, and_, exists, select
+from sqlalchemy.exc import IntegrityError
+
+from models import User
+from models.user import user_following
+from .activity_feed import activity_feed
+
+__all__ = ['is_following', 'follow', 'unfollow', 'followers_query', 'following_query', 'apply_follow_deltas', 'follow_deltas']
+
+def is_following(follower_id, leader_id):
+    """
+    Check if a User follows another with a primary key lookup
+    :param follower_id: Int
+    :param leader_id: Int
+    :return: Boolean
+    """
+    return db.session.query(exists().where(and_(
+            user_following.c.follower_id == follower_id,
+            user_following.c.leader_id == leader_id,
+        ))).scalar()
+
+def follow(follower_id, leader_id):
+    """
+    Follow a User, update both counters and backfill the follower's feed, in one transaction
+    :param follower_id: Int
+    :param leader_id: Int
+    :return: Boolean, False if already following
+    """
+    try:
+        _lock_users(db.session.connection(), [follower_id, leader_id])
+        db.session.execute(user_following.insert().values(follower_id=follower_id, leader_id=leader_id))
+    except IntegrityError:
+        # Already following (possibly from a concurrent request)
+        db.session.rollback()
+        return False
+
+    try:
+        connection = db.session.connection()
+        apply_follow_deltas(connection, _pair_deltas([(follower_id, leader_id)], 1))
+        activity_feed.backfill(connection, follower_id, leader_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return True
+
+def unfollow(follower_id, leader_id):
+    """
+    Unfollow a User, update both counters and prune the follower's feed, in one transaction
+    :param follower_id: Int
+    :param leader_id: Int
+    :return: Boolean, False if not following
+    """
+    try:
+        _lock_users(db.session.connection(), [follower_id, leader_id])
+        result = db.session.execute(user_following.delete().where(and_(
+                user_following.c.follower_id == follower_id,
+                user_following.c.leader_id == leader_id,
+            )))
+        # Only the request that actually deleted the row decrements the counters
+        if not result.rowcount:
+            db.session.rollback()
+            return False
+        connection = db.session.connection()
+        apply_follow_deltas(connection, _pair_deltas([(follower_id, leader_id)], -1))
+        activity_feed.prune(connection, follower_id, leader_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return True
+
+def followers_query(user_id):
+    """
+    Users following a User, read through ix_followers_leader_id
+    :param user_id: Int
+    :return: Query
+    """
+    return User.query.join(user_following, user_following.c.follower_id == User.id).filter(user_following.c.leader_id == user_id)
+
+def following_query(user_id):
+    """
+    Users followed by a User, read through the primary key
+    :param user_id: Int
+    :return: Query
+    """
+    return User.query.join(user_following, user_following.c.leader_id == User.id).filter(user_following.c.follower_id == user_id)
+
+def follow_deltas(session):
+    """
+    Collect the follow counter changes made by a flush through the User.following / User.followers collections
+    :param session: Session
+    :return: Dict of user_id => [follower_count delta, following_count delta]
+    """
+    added, removed = set(), set()
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, User):
+            state = inspect(obj)
+            # Both sides of a backref record the same row, the sets keep it once
+            following = state.attrs.following.history
+            added.update((obj.id, leader.id) for leader in following.added or ())
+            removed.update((obj.id, leader.id) for leader in following.deleted or ())
+            followers = state.attrs.followers.history
+            added.update((follower.id, obj.id) for follower in followers.added or ())
+            removed.update((follower.id, obj.id) for follower in followers.deleted or ())
+
+    deltas = _pair_deltas(added - removed, 1)
+    for user_id, (follower_delta, following_delta) in _pair_deltas(removed - added, -1).items():
+        delta = deltas.setdefault(user_id, [0, 0])
+        delta[0] += follower_delta
+        delta[1] += following_delta
+    return { user_id: delta for user_id, delta in deltas.items() if any(delta) }
+
+def apply_follow_deltas(connection, deltas):
+    """
+    Apply counter changes with relative UPDATEs, in the caller's transaction
+    :param connection: Connection
+    :param deltas: Dict returned by follow_deltas()
+    """
+    table = User.__table__
+    # In id order, like _lock_users(), so concurrent transactions lock Users in the same order
+    for user_id, (follower_delta, following_delta) in sorted(deltas.items()):
+        connection.execute(
+            table.update()
+                .where(table.c.id == user_id)
+                .values(follower_count=table.c.follower_count + follower_delta, following_count=table.c.following_count + following_delta)
+        )
+
+def _lock_users(connection, user_ids):
+    # Lock both Users before touching followers: on InnoDB the foreign key check of the INSERT takes shared locks on
+    # them, and two follows of the same User would deadlock upgrading those to the counter UPDATEs' exclusive locks
+    table = User.__table__
+    connection.execute(select([table.c.id]).where(table.c.id.in_(user_ids)).order_by(table.c.id).with_for_update())
+
+def _pair_deltas(pairs, sign):
+    deltas = {}
+    for follower_id, leader_id in pairs:
+        deltas.setdefault(leader_id, [0, 0])[0] += sign
+        deltas.setdefault(follower_id, [0, 0])[1] += sign
+    return deltas
+
+@event.listens_for(db.session, 'after_flush')
+def maintain_follow_counts(session, flush_context):
+    deltas = follow_deltas(session)
+    if deltas:
+        apply_follow_deltas(session.connection(), deltas)
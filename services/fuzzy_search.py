@@ -0,0 +1,251 @@
+from extensions import db
+from bisect import bisect_left, insort
+from collections import Counter
+import heapq
+import math
+import re
+
+from models import Game
+from .index import InMemoryIndex
+from .title_index import normalize_title, title_index
+
+__all__ = ['FuzzySearch', 'fuzzy_search', 'edit_distance']
+
+WORD = re.compile(r'\w+')
+
+def edit_distance(a, b, limit):
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent transpositions), giving up past a limit
+    :param a: String
+    :param b: String
+    :param limit: Int
+    :return: Int (limit + 1 when the distance exceeds the limit)
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    # Only cells within `limit` of the diagonal can stay under the limit
+    over = limit + 1
+    previous2 = None
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [over] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        low, high = max(1, i - limit), min(len(b), i + limit)
+        best = current[0]
+        for j in range(low, high + 1):
+            value = previous[j - 1] + (a[i - 1] != b[j - 1])
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1] and previous2[j - 2] + 1 < value:
+                value = previous2[j - 2] + 1
+            current[j] = value if value < over else over
+            if value < best:
+                best = value
+        if best > limit:
+            return over
+        previous2, previous = previous, current
+    return previous[-1]
+
+def bigrams(word):
+    padded = '^{}$'.format(word)
+    return [padded[i:i + 2] for i in range(len(padded) - 1)]
+
+def max_typos(word):
+    if len(word) <= 3:
+        return 0
+    return 1 if len(word) <= 7 else 2
+
+class FuzzySearch(InMemoryIndex):
+    """
+    Typo tolerant search over Game titles and Release alternate titles.
+
+    Titles are split into words. Each query word is matched against the
+    vocabulary exactly, as a prefix (last word only, for search as you type)
+    and within max_typos() edits: candidates sharing enough padded bigrams with
+    the query word are verified with a bounded edit distance. A Game's text
+    relevance is the mean over query words of its best word similarity, and
+    results are ordered by relevance blended with popularity_rank and score.
+
+    Titles are read from the title index and kept current through its
+    subscription, scores through set_score(). popularity_rank is written by
+    scripts/update_game_rankings.py, so ranks only refresh on rebuild.
+    """
+    config_prefix = 'FUZZY_SEARCH'
+    text_weight = 0.75
+    popularity_weight = 0.15
+    score_weight = 0.10
+    max_prefix_words = 100
+
+    def __init__(self, app=None):
+        self._words = {}
+        self._ranks = {}
+        self._scores = {}
+        self._priors = {}
+        self._postings = {}
+        self._vocabulary = []
+        self._grams = {}
+        super().__init__(app)
+
+    def build(self):
+        titles = title_index.game_titles()
+        ranks, scores = {}, {}
+        for game_id, rank, score in db.session.query(Game.id, Game.popularity_rank, Game.score):
+            ranks[game_id] = rank
+            scores[game_id] = score
+        self._load(titles, ranks, scores)
+
+    def load(self, games, releases=()):
+        """
+        Replace the index contents
+        :param games: Iterable of (game_id, title, popularity_rank, score)
+        :param releases: Iterable of (release_id, game_id, alternate_title)
+        """
+        titles, ranks, scores = {}, {}, {}
+        for game_id, title, rank, score in games:
+            titles[game_id] = [normalize_title(title)]
+            ranks[game_id] = rank
+            scores[game_id] = score
+        for release_id, game_id, alternate_title in releases:
+            if game_id in titles and alternate_title:
+                titles[game_id].append(normalize_title(alternate_title))
+        self._load(titles, ranks, scores)
+
+    def _load(self, titles, ranks, scores):
+        words = {game_id: _words(game_titles) for game_id, game_titles in titles.items()}
+        postings = {}
+        for game_id, game_words in words.items():
+            for word in game_words:
+                postings.setdefault(word, set()).add(game_id)
+        grams = {}
+        for word in postings:
+            for gram in set(bigrams(word)):
+                grams.setdefault((gram, len(word)), []).append(word)
+
+        with self._lock:
+            self._words = words
+            self._ranks = {game_id: ranks.get(game_id) for game_id in words}
+            self._scores = {game_id: scores.get(game_id) for game_id in words}
+            self._priors = {game_id: self._prior(game_id) for game_id in words}
+            self._postings = postings
+            self._vocabulary = sorted(postings)
+            self._grams = grams
+            self._mark_built()
+
+    def search(self, query, limit=25):
+        """
+        Get ids of the best matching Games
+        :param query: String
+        :param limit: Int
+        :return: List of game ids, best first
+        """
+        self.ensure_fresh()
+
+        tokens = WORD.findall(normalize_title(query))
+        if not tokens:
+            return []
+        with self._lock:
+            relevance = Counter()
+            for i, token in enumerate(tokens):
+                best = {}
+                for word, similarity in self._similar_words(token, prefix=i == len(tokens) - 1).items():
+                    for game_id in self._postings[word]:
+                        if similarity > best.get(game_id, 0):
+                            best[game_id] = similarity
+                relevance.update(best)
+
+            weight = self.text_weight / len(tokens)
+            return heapq.nlargest(limit, relevance, key=lambda game_id: (
+                weight * relevance[game_id] + self._priors.get(game_id, 0), -game_id))
+
+    def set_titles(self, game_id, titles):
+        """
+        Reindex the words of a Game, called by the title index
+        :param game_id: Int
+        :param titles: List of normalized titles, None to remove the Game
+        """
+        with self._lock:
+            self._reindex(game_id, _words(titles or ()))
+            if titles is None:
+                self._ranks.pop(game_id, None)
+                self._scores.pop(game_id, None)
+                self._priors.pop(game_id, None)
+            else:
+                self._priors[game_id] = self._prior(game_id)
+
+    def set_score(self, game_id, score):
+        with self._lock:
+            if game_id in self._words:
+                self._scores[game_id] = score
+                self._priors[game_id] = self._prior(game_id)
+
+    def _prior(self, game_id):
+        # Query independent part of the ranking
+        rank = self._ranks.get(game_id)
+        total = len(self._words)
+        popularity = max(1 - math.log1p(rank - 1) / math.log1p(total), 0) if rank and total > 1 else 0
+        score = min(max((self._scores.get(game_id) or 0) / 100, 0), 1)
+        return self.popularity_weight * popularity + self.score_weight * score
+
+    def _similar_words(self, token, prefix=False):
+        similar = {}
+        if token in self._postings:
+            similar[token] = 1.0
+
+        typos = max_typos(token)
+        if typos:
+            # An edit changes at most two padded bigrams, a transposition three;
+            # bigram lists are kept per word length so only plausible lengths are counted
+            token_grams = set(bigrams(token))
+            needed = len(token_grams) - 3 * typos
+            shared = Counter()
+            for length in range(len(token) - typos, len(token) + typos + 1):
+                for gram in token_grams:
+                    shared.update(self._grams.get((gram, length), ()))
+            for word, count in shared.items():
+                if count >= needed and word not in similar:
+                    distance = edit_distance(token, word, typos)
+                    if distance <= typos:
+                        similar[word] = 1 - distance / (len(token) + 1)
+
+        if prefix and len(token) >= 2:
+            start = bisect_left(self._vocabulary, token)
+            end = bisect_left(self._vocabulary, token + '\U0010ffff', start)
+            words = self._vocabulary[start:end]
+            if len(words) > self.max_prefix_words:
+                words = heapq.nlargest(self.max_prefix_words, words, key=lambda word: len(self._postings[word]))
+            for word in words:
+                similarity = 0.5 + 0.5 * len(token) / len(word)
+                if similarity > similar.get(word, 0):
+                    similar[word] = similarity
+        return similar
+
+    def _reindex(self, game_id, words):
+        before = self._words.pop(game_id, frozenset())
+        if words:
+            self._words[game_id] = words
+
+        for word in before - words:
+            posting = self._postings[word]
+            posting.discard(game_id)
+            if not posting:
+                del self._postings[word]
+                del self._vocabulary[bisect_left(self._vocabulary, word)]
+                for gram in set(bigrams(word)):
+                    self._grams[(gram, len(word))].remove(word)
+        for word in words - before:
+            posting = self._postings.get(word)
+            if posting is None:
+                posting = self._postings[word] = set()
+                insort(self._vocabulary, word)
+                for gram in set(bigrams(word)):
+                    self._grams.setdefault((gram, len(word)), []).append(word)
+            posting.add(game_id)
+
+def _words(titles):
+    return frozenset(word for title in titles for word in WORD.findall(title))
+
+fuzzy_search = FuzzySearch()
+title_index.subscribe(fuzzy_search.set_titles)
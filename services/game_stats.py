@@ -0,0 +1,109 @@
+from extensions import db
+from sqlalchemy import event, inspect, case, func
+
+from models import Game, LibraryEntry
+from .events import after_commit
+from .facets import facet_index
+from .fuzzy_search import fuzzy_search
+
+__all__ = ['apply_library_deltas', 'library_entry_deltas', 'inserted_entry_deltas', 'publish_scores']
+
+def library_entry_deltas(session):
+    """
+    Collect the library_count / score accumulator changes made by a flush
+    :param session: Session
+    :return: Dict of game_id => [library_count delta, score_sum delta, score_count delta]
+    """
+    deltas = {}
+
+    def add(game_id, score, sign):
+        if game_id is None:
+            return
+        delta = deltas.setdefault(game_id, [0, 0, 0])
+        delta[0] += sign
+        if score is not None:
+            delta[1] += sign * score
+            delta[2] += sign
+
+    for obj in session.new:
+        if isinstance(obj, LibraryEntry):
+            add(obj.game_id, obj.score, 1)
+    for obj in session.deleted:
+        if isinstance(obj, LibraryEntry):
+            add(obj.game_id, obj.score, -1)
+    for obj in session.dirty:
+        if isinstance(obj, LibraryEntry):
+            state = inspect(obj)
+            game_history = state.attrs.game_id.history
+            score_history = state.attrs.score.history
+            if not game_history.has_changes() and not score_history.has_changes():
+                continue
+            old_game_id = game_history.deleted[0] if game_history.deleted else obj.game_id
+            old_score = score_history.deleted[0] if score_history.deleted else (None if score_history.has_changes() else obj.score)
+            add(old_game_id, old_score, -1)
+            add(obj.game_id, obj.score, 1)
+
+    return { game_id: delta for game_id, delta in deltas.items() if any(delta) }
+
+def inserted_entry_deltas(rows):
+    """
+    Collect the accumulator changes of LibraryEntry rows inserted without the ORM (e.g. bulk imports)
+    :param rows: Iterable of dicts with game_id and score
+    :return: Dict like library_entry_deltas()
+    """
+    deltas = {}
+    for row in rows:
+        delta = deltas.setdefault(row['game_id'], [0, 0, 0])
+        delta[0] += 1
+        if row.get('score') is not None:
+            delta[1] += row['score']
+            delta[2] += 1
+    return deltas
+
+def apply_library_deltas(connection, deltas):
+    """
+    Apply accumulator changes with relative UPDATEs, in the caller's transaction
+    :param connection: Connection
+    :param deltas: Dict returned by library_entry_deltas()
+    """
+    games = Game.__table__
+    for game_id, (count_delta, sum_delta, score_count_delta) in deltas.items():
+        score_sum = func.coalesce(games.c.score_sum, 0) + sum_delta
+        score_count = func.coalesce(games.c.score_count, 0) + score_count_delta
+        # score is assigned first: MySQL evaluates SET assignments left to right,
+        # so later assignments would otherwise see the already updated accumulators
+        connection.execute(
+            games.update(preserve_parameter_order=True)
+                .where(games.c.id == game_id)
+                .values([
+                    (games.c.score, case([(score_count > 0, func.round(score_sum * 10.0 / score_count, 2))], else_=None)),
+                    (games.c.library_count, func.coalesce(games.c.library_count, 0) + count_delta),
+                    (games.c.score_sum, score_sum),
+                    (games.c.score_count, score_count),
+                ])
+        )
+
+def publish_scores(session, connection, game_ids):
+    """
+    Hand the updated scores of Games to the in-memory indexes once the session commits
+    :param session: Session
+    :param connection: Connection
+    :param game_ids: List of Int
+    """
+    games = Game.__table__
+    scores = connection.execute(
+        games.select().with_only_columns([games.c.id, games.c.score]).where(games.c.id.in_(game_ids))
+    ).fetchall()
+    for game_id, score in scores:
+        after_commit(session, lambda game_id=game_id, score=score: facet_index.set_score(game_id, score))
+        after_commit(session, lambda game_id=game_id, score=score: fuzzy_search.set_score(game_id, score))
+
+@event.listens_for(db.session, 'after_flush')
+def maintain_game_stats(session, flush_context):
+    deltas = library_entry_deltas(session)
+    if not deltas:
+        return
+
+    connection = session.connection()
+    apply_library_deltas(connection, deltas)
+    publish_scores(session, connection, list(deltas))
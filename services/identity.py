@@ -0,0 +1,122 @@
+from extensions import db
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from collections import OrderedDict
+from threading import Lock
+import time
+
+from models import User, Role
+from .events import after_commit
+
+__all__ = ['IdentityCache', 'identity_cache']
+
+# User columns kept in the cache, any other attribute is loaded on first access
+IDENTITY_COLUMNS = ('id', 'username', 'email', 'password', 'is_verified', 'avatar')
+
+class IdentityCache():
+    """
+    Authenticated Users by id, so resolving the current user costs no query.
+
+    Role checks already trust the signed `rls` claim of the JWT; this covers
+    `flask_praetorian.current_user()`. The identity columns and roles of
+    recently active Users are kept as plain values in an LRU and rebuilt
+    into a User attached to the request's session with merge(load=False),
+    which is then used like a loaded one. Entries are revoked when the
+    User's identity columns or roles change, or when a Role is edited, once
+    the change commits. Other workers only notice after `cache_seconds`.
+    """
+    def __init__(self, app=None):
+        self._lock = Lock()
+        self._users = OrderedDict()
+        self._generation = 0
+        self.cache_size = 10000
+        self.cache_seconds = 60
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.cache_size = app.config.get('IDENTITY_CACHE_SIZE', self.cache_size)
+        self.cache_seconds = app.config.get('IDENTITY_CACHE_SECONDS', self.cache_seconds)
+
+    def get(self, user_id):
+        """
+        Get a User by id, attached to the current session
+        :param user_id: Int
+        :return: User, None if it does not exist
+        """
+        if not self.cache_size:
+            return User.query.get(user_id)
+
+        now = time.monotonic()
+        with self._lock:
+            cached = self._users.get(user_id)
+            fresh = cached is not None and now - cached[1] < self.cache_seconds
+            if fresh:
+                self._users.move_to_end(user_id)
+            generation = self._generation
+        if fresh:
+            return self._attach(cached[0])
+
+        user = User.query.options(joinedload(User.roles)).get(user_id)
+        if user is None:
+            return None
+
+        with self._lock:
+            # Skip caching if a change was committed while loading
+            if self._generation == generation:
+                self._users[user_id] = (_snapshot(user), now)
+                self._users.move_to_end(user_id)
+                while len(self._users) > self.cache_size:
+                    self._users.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id=None):
+        """
+        Revoke a cached User, or every cached User when user_id is None
+        :param user_id: Int
+        """
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+            self._generation += 1
+
+    def _attach(self, snapshot):
+        roles = []
+        for values in snapshot['roles']:
+            role = Role(**values)
+            make_transient_to_detached(role)
+            roles.append(role)
+
+        user = User(**snapshot['columns'])
+        # Set without history or backref events, as if loaded from the database
+        set_committed_value(user, 'roles', roles)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+def _snapshot(user):
+    return {
+        'columns': { column: getattr(user, column) for column in IDENTITY_COLUMNS },
+        'roles': [{ 'id': role.id, 'name': role.name } for role in user.roles],
+    }
+
+identity_cache = IdentityCache()
+
+@event.listens_for(db.session, 'after_flush')
+def track_identity_changes(session, flush_context):
+    user_ids = set()
+    roles_changed = False
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if obj in session.deleted or any(state.attrs[name].history.has_changes() for name in IDENTITY_COLUMNS + ('roles',)):
+                user_ids.add(obj.id)
+        elif isinstance(obj, Role):
+            roles_changed = roles_changed or obj in session.deleted or inspect(obj).attrs.name.history.has_changes()
+
+    if roles_changed:
+        after_commit(session, lambda: identity_cache.invalidate())
+    for user_id in user_ids:
+        after_commit(session, lambda user_id=user_id: identity_cache.invalidate(user_id))
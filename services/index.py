@@ -0,0 +1,51 @@
+from threading import RLock
+import time
+
+__all__ = ['InMemoryIndex']
+
+class InMemoryIndex():
+    """
+    Base class for per-worker indexes that are built from the database and
+    kept current from session events.
+
+    Each gunicorn worker holds its own copy, so writes committed by other
+    workers or by the scripts only show up after a rebuild. `refresh_seconds`
+    bounds that staleness; set it to None to disable periodic rebuilds.
+    """
+    config_prefix = None
+    refresh_seconds = 300
+
+    def __init__(self, app=None):
+        self._lock = RLock()
+        self._built_at = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.refresh_seconds = app.config.get('{}_REFRESH_SECONDS'.format(self.config_prefix), self.refresh_seconds)
+        app.before_first_request(self.build)
+
+    def build(self):
+        """
+        (Re)build the index from the database
+        """
+        raise NotImplementedError
+
+    def invalidate(self):
+        """
+        Force a rebuild on next use
+        """
+        self._built_at = None
+
+    def ensure_fresh(self):
+        if self.is_stale:
+            self.build()
+
+    @property
+    def is_stale(self):
+        if self._built_at is None:
+            return True
+        return bool(self.refresh_seconds) and time.monotonic() - self._built_at > self.refresh_seconds
+
+    def _mark_built(self):
+        self._built_at = time.monotonic()
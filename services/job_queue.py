@@ -0,0 +1,204 @@
+from extensions import db
+from sqlalchemy import and_, or_, func
+from datetime import datetime, timedelta
+import json, logging, random, time, traceback
+
+from models import Job
+
+__all__ = ['JobQueue', 'job_queue']
+
+logger = logging.getLogger(__name__)
+
+class JobQueue():
+    """
+    Durable queue of slow side effects, stored in the jobs table.
+
+    enqueue() adds a row in the caller's transaction, so a job exists if and
+    only if the write that needs it is committed. Worker processes
+    (scripts/run_jobs.py) claim due jobs with SELECT ... FOR UPDATE SKIP
+    LOCKED and run the handler registered for their kind. A failing job is
+    retried with exponential backoff up to `max_attempts` times, then kept
+    as failed. Each job of a claimed batch is stamped again when it starts,
+    and a job left running by a dead worker is claimed again `lock_seconds`
+    after that. Enqueueing twice with the same idempotency key returns
+    the first job.
+    """
+    def __init__(self, app=None):
+        self._handlers = {}
+        self._stopping = False
+        self.max_attempts = 5
+        self.backoff_seconds = 30
+        self.max_backoff_seconds = 3600
+        self.lock_seconds = 300
+        self.batch_size = 10
+        self.poll_seconds = 1
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_attempts = app.config.get('JOB_MAX_ATTEMPTS', self.max_attempts)
+        self.backoff_seconds = app.config.get('JOB_BACKOFF_SECONDS', self.backoff_seconds)
+        self.max_backoff_seconds = app.config.get('JOB_MAX_BACKOFF_SECONDS', self.max_backoff_seconds)
+        self.lock_seconds = app.config.get('JOB_LOCK_SECONDS', self.lock_seconds)
+        self.batch_size = app.config.get('JOB_BATCH_SIZE', self.batch_size)
+        self.poll_seconds = app.config.get('JOB_POLL_SECONDS', self.poll_seconds)
+
+    def handler(self, kind):
+        """
+        Register the function running a kind of job, called with (payload, data) in an app context
+        :param kind: String
+        :return: Decorator
+        """
+        def decorator(function):
+            self._handlers[kind] = function
+            return function
+        return decorator
+
+    def enqueue(self, session, kind, payload=None, data=None, key=None, delay=0, max_attempts=None):
+        """
+        Add a job in the session's transaction
+        :param session: Session
+        :param kind: String, a registered handler
+        :param payload: JSON compatible Dict
+        :param data: Bytes
+        :param key: String idempotency key
+        :param delay: Int seconds before the job is due
+        :return: Job
+        """
+        if kind not in self._handlers:
+            raise ValueError('Unknown job kind {}'.format(kind))
+        if key is not None:
+            existing = session.query(Job).filter(Job.idempotency_key == key).first()
+            if existing is not None:
+                return existing
+
+        job = Job(
+            kind=kind,
+            idempotency_key=key,
+            payload=json.dumps(payload or {}),
+            data=data,
+            status='queued',
+            attempts=0,
+            max_attempts=max_attempts or self.max_attempts,
+            run_at=datetime.now() + timedelta(seconds=delay),
+        )
+        session.add(job)
+        return job
+
+    def run_once(self, worker):
+        """
+        Claim and run one batch of due jobs
+        :param worker: String identifying the worker
+        :return: Int jobs run
+        """
+        job_ids = self._claim(worker)
+        return sum(1 for job_id in job_ids if self._run(job_id, worker))
+
+    def work(self, worker):
+        """
+        Run jobs until stop() is called, sleeping poll_seconds when the queue is empty
+        :param worker: String identifying the worker
+        """
+        self._stopping = False
+        while not self._stopping:
+            if not self.run_once(worker):
+                time.sleep(self.poll_seconds)
+
+    def stop(self):
+        self._stopping = True
+
+    def stats(self, window_seconds=3600):
+        """
+        Queue depth and latency metrics
+        :param window_seconds: Int, latency is measured over the jobs finished in this window
+        :return: Dict
+        """
+        now = datetime.now()
+        depth = dict(db.session.query(Job.kind, func.count(Job.id)).filter(Job.status == 'queued').group_by(Job.kind))
+        due = db.session.query(func.count(Job.id)).filter(Job.status == 'queued', Job.run_at <= now).scalar()
+        oldest_due = db.session.query(func.min(Job.run_at)).filter(Job.status == 'queued', Job.run_at <= now).scalar()
+        running = db.session.query(func.count(Job.id)).filter(Job.status == 'running').scalar()
+        failed = db.session.query(func.count(Job.id)).filter(Job.status == 'failed').scalar()
+
+        # Time from enqueue to completion, including retries
+        finished = db.session.query(Job.created_at, Job.finished_at)\
+            .filter(Job.status == 'done', Job.finished_at >= now - timedelta(seconds=window_seconds))\
+            .order_by(Job.finished_at.desc()).limit(1000).all()
+        latencies = sorted((finished_at - created_at).total_seconds() for created_at, finished_at in finished)
+
+        return {
+            'queued': sum(depth.values()),
+            'queued_by_kind': depth,
+            'due': due,
+            'oldest_due_seconds': round((now - oldest_due).total_seconds(), 1) if oldest_due else None,
+            'running': running,
+            'failed': failed,
+            'finished': len(latencies),
+            'latency_avg_seconds': round(sum(latencies) / len(latencies), 3) if latencies else None,
+            'latency_p95_seconds': round(latencies[int(len(latencies) * 0.95)], 3) if latencies else None,
+        }
+
+    def _claim(self, worker):
+        now = datetime.now()
+        due = or_(
+            and_(Job.status == 'queued', Job.run_at <= now),
+            and_(Job.status == 'running', Job.locked_at < now - timedelta(seconds=self.lock_seconds)),
+        )
+        try:
+            # Workers skip each other's rows instead of waiting on them
+            jobs = Job.query.filter(due).order_by(Job.run_at.asc()).limit(self.batch_size).with_for_update(skip_locked=True).all()
+            for job in jobs:
+                job.status = 'running'
+                job.locked_at = now
+                job.locked_by = worker
+            job_ids = [job.id for job in jobs]
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return job_ids
+
+    def _start(self, job_id, worker):
+        # Restart the lock when the job actually starts, unless another worker reclaimed it while the batch waited
+        try:
+            started = Job.query.filter(Job.id == job_id, Job.status == 'running', Job.locked_by == worker)\
+                .update({ Job.locked_at: datetime.now(), Job.attempts: Job.attempts + 1 }, synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return bool(started)
+
+    def _run(self, job_id, worker):
+        if not self._start(job_id, worker):
+            db.session.remove()
+            return False
+
+        job = Job.query.get(job_id)
+        try:
+            self._handlers[job.kind](json.loads(job.payload), job.data)
+            job.status = 'done'
+            job.finished_at = datetime.now()
+            job.last_error = None
+            # The handler's own changes commit with the job status
+            db.session.commit()
+        except Exception:
+            error = traceback.format_exc()
+            db.session.rollback()
+            job = Job.query.get(job_id)
+            job.last_error = error[-4000:]
+            if job.attempts >= job.max_attempts:
+                job.status = 'failed'
+                job.finished_at = datetime.now()
+                logger.error('Job %s (%s) failed after %s attempts', job.id, job.kind, job.attempts)
+            else:
+                job.status = 'queued'
+                backoff = min(self.backoff_seconds * 2 ** (job.attempts - 1), self.max_backoff_seconds)
+                job.run_at = datetime.now() + timedelta(seconds=backoff * random.uniform(0.75, 1.25))
+                logger.warning('Job %s (%s) attempt %s failed, retrying in %ss', job.id, job.kind, job.attempts, round(backoff))
+            db.session.commit()
+        finally:
+            db.session.remove()
+        return True
+
+job_queue = JobQueue()
@@ -0,0 +1,56 @@
+from extensions import guard, upload_img, delete_img
+
+from models import User
+from .job_queue import job_queue
+
+__all__ = ['enqueue_registration_email', 'enqueue_image_upload', 'enqueue_image_delete']
+
+# Old images are deleted a little later, once pages showing them have been replaced
+IMAGE_DELETE_DELAY = 60
+
+def enqueue_registration_email(session, user, key=None):
+    """
+    E-mail a registration token to a User
+    :param session: Session
+    :param user: User
+    :param key: String idempotency key
+    :return: Job
+    """
+    return job_queue.enqueue(session, 'send_registration_email', { 'user_id': user.id }, key=key)
+
+def enqueue_image_upload(session, img_bytes, file_type, key, prefix):
+    """
+    Upload an image to Spaces
+    :param session: Session
+    :param img_bytes: BytesIO
+    :param file_type: String
+    :param key: String file name
+    :param prefix: String folder
+    :return: Job
+    """
+    return job_queue.enqueue(session, 'upload_image', { 'file_type': file_type, 'key': key, 'prefix': prefix }, data=img_bytes.getvalue())
+
+def enqueue_image_delete(session, key, prefix, delay=IMAGE_DELETE_DELAY):
+    """
+    Delete an image from Spaces
+    :param session: Session
+    :param key: String file name
+    :param prefix: String folder
+    :return: Job
+    """
+    return job_queue.enqueue(session, 'delete_image', { 'key': key, 'prefix': prefix }, delay=delay)
+
+@job_queue.handler('send_registration_email')
+def send_registration_email(payload, data):
+    user = User.query.get(payload['user_id'])
+    if user is None or user.is_verified == 1:
+        return
+    guard.send_registration_email(user.email, user=user)
+
+@job_queue.handler('upload_image')
+def upload_image(payload, data):
+    upload_img(data, payload['file_type'], Key=payload['key'], Prefix=payload['prefix'])
+
+@job_queue.handler('delete_image')
+def delete_image(payload, data):
+    delete_img(payload['key'], Prefix=payload['prefix'])
@@ -0,0 +1,40 @@
+from models import LibraryEntry
+from .events import after_commit
+from .game_stats import apply_library_deltas, publish_scores, inserted_entry_deltas as game_deltas
+from .library_summaries import apply_library_summary_deltas, inserted_entry_deltas as summary_deltas
+from .user_status import user_status
+
+__all__ = ['insert_library_entries']
+
+BATCH_SIZE = 1000
+
+def insert_library_entries(session, user_id, rows, batch_size=BATCH_SIZE):
+    """
+    Insert validated Library Entries for a User with batched executemany, in the session's transaction.
+
+    Core inserts skip the after_flush listeners, so the Game accumulators,
+    library summaries and cached user status are maintained here instead.
+    :param session: Session
+    :param user_id: Int
+    :param rows: List of dicts with game_id, release_id, play_status_id, score, own, digital, hours, notes
+    :param batch_size: Int
+    :return: Int rows inserted
+    """
+    rows = [dict(row, user_id=user_id) for row in rows]
+    if not rows:
+        return 0
+
+    connection = session.connection()
+    insert = LibraryEntry.__table__.insert()
+    for start in range(0, len(rows), batch_size):
+        connection.execute(insert, rows[start:start + batch_size])
+
+    deltas = game_deltas(rows)
+    apply_library_deltas(connection, deltas)
+    game_ids = list(deltas)
+    for start in range(0, len(game_ids), batch_size):
+        publish_scores(session, connection, game_ids[start:start + batch_size])
+    apply_library_summary_deltas(connection, summary_deltas(rows))
+    after_commit(session, lambda: user_status.invalidate(user_id))
+
+    return len(rows)
@@ -0,0 +1,101 @@
+from extensions import db
+from sqlalchemy import event, inspect, and_
+from sqlalchemy.dialects import mysql
+
+from models import LibraryEntry, LibrarySummary
+
+__all__ = ['apply_library_summary_deltas', 'library_summary_deltas', 'inserted_entry_deltas', 'COUNTERS']
+
+# LibrarySummary counters, in the order of the delta lists
+COUNTERS = ('entry_count', 'score_sum', 'score_count', 'hours', 'own_count', 'digital_count')
+
+# LibraryEntry attributes the counters depend on
+TRACKED = ('user_id', 'play_status_id', 'score', 'hours', 'own', 'digital')
+
+def _contribution(score, hours, own, digital):
+    return [1, score or 0, 0 if score is None else 1, hours or 0, 1 if own else 0, 1 if digital else 0]
+
+def _previous(state, name):
+    history = state.attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    return None if history.has_changes() else getattr(state.obj(), name)
+
+def library_summary_deltas(session):
+    """
+    Collect the LibrarySummary counter changes made by a flush
+    :param session: Session
+    :return: Dict of (user_id, play_status_id) => list of deltas, in COUNTERS order
+    """
+    deltas = {}
+
+    def add(user_id, play_status_id, values, sign):
+        if user_id is None or play_status_id is None:
+            return
+        delta = deltas.setdefault((user_id, play_status_id), [0] * len(COUNTERS))
+        for i, value in enumerate(values):
+            delta[i] += sign * value
+
+    for obj in session.new:
+        if isinstance(obj, LibraryEntry):
+            add(obj.user_id, obj.play_status_id, _contribution(obj.score, obj.hours, obj.own, obj.digital), 1)
+    for obj in session.deleted:
+        if isinstance(obj, LibraryEntry):
+            add(obj.user_id, obj.play_status_id, _contribution(obj.score, obj.hours, obj.own, obj.digital), -1)
+    for obj in session.dirty:
+        if isinstance(obj, LibraryEntry):
+            state = inspect(obj)
+            if not any(state.attrs[name].history.has_changes() for name in TRACKED):
+                continue
+            user_id, play_status_id, score, hours, own, digital = (_previous(state, name) for name in TRACKED)
+            add(user_id, play_status_id, _contribution(score, hours, own, digital), -1)
+            add(obj.user_id, obj.play_status_id, _contribution(obj.score, obj.hours, obj.own, obj.digital), 1)
+
+    return { key: delta for key, delta in deltas.items() if any(delta) }
+
+def inserted_entry_deltas(rows):
+    """
+    Collect the LibrarySummary counter changes of LibraryEntry rows inserted without the ORM (e.g. bulk imports)
+    :param rows: Iterable of dicts with the LibraryEntry columns
+    :return: Dict like library_summary_deltas()
+    """
+    deltas = {}
+    for row in rows:
+        delta = deltas.setdefault((row['user_id'], row['play_status_id']), [0] * len(COUNTERS))
+        for i, value in enumerate(_contribution(row.get('score'), row.get('hours'), row.get('own'), row.get('digital'))):
+            delta[i] += value
+    return deltas
+
+def apply_library_summary_deltas(connection, deltas):
+    """
+    Apply counter changes with relative writes, in the caller's transaction
+    :param connection: Connection
+    :param deltas: Dict returned by library_summary_deltas()
+    """
+    if not deltas:
+        return
+    summaries = LibrarySummary.__table__
+    rows = [dict(zip(COUNTERS, deltas[key]), user_id=key[0], play_status_id=key[1]) for key in sorted(deltas)]
+
+    if connection.dialect.name == 'mysql':
+        # Creating the row of a first entry and adding to an existing one is a single statement, so concurrent first entries cannot collide
+        statement = mysql.insert(summaries)
+        statement = statement.on_duplicate_key_update({ name: summaries.c[name] + statement.inserted[name] for name in COUNTERS })
+        connection.execute(statement, rows)
+        return
+
+    # Elsewhere (e.g. SQLite in the tests) add to the existing row and create the missing ones
+    for row in rows:
+        result = connection.execute(
+            summaries.update()
+                .where(and_(summaries.c.user_id == row['user_id'], summaries.c.play_status_id == row['play_status_id']))
+                .values({ name: summaries.c[name] + row[name] for name in COUNTERS })
+        )
+        if not result.rowcount:
+            connection.execute(summaries.insert(), row)
+
+@event.listens_for(db.session, 'after_flush')
+def maintain_library_summaries(session, flush_context):
+    deltas = library_summary_deltas(session)
+    if deltas:
+        apply_library_summary_deltas(session.connection(), deltas)
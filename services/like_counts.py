@@ -0,0 +1,59 @@
+from extensions import db
+from sqlalchemy import event, inspect
+
+from models import Likeable
+from models.likeable import likeable_models
+
+__all__ = ['apply_likeable_deltas', 'likeable_deltas']
+
+def likeable_deltas(session):
+    """
+    Collect the like / dislike counter changes made by a flush
+    :param session: Session
+    :return: Dict of (likeable_type, likeable_id) => [likes delta, dislikes delta]
+    """
+    deltas = {}
+
+    def add(likeable_type, likeable_id, value, sign):
+        delta = deltas.setdefault((likeable_type, likeable_id), [0, 0])
+        delta[0 if value == 1 else 1] += sign
+
+    for obj in session.new:
+        if isinstance(obj, Likeable):
+            add(obj.likeable_type, obj.likeable_id, obj.value, 1)
+    for obj in session.deleted:
+        if isinstance(obj, Likeable):
+            add(obj.likeable_type, obj.likeable_id, obj.value, -1)
+    for obj in session.dirty:
+        if isinstance(obj, Likeable):
+            history = inspect(obj).attrs.value.history
+            if history.deleted and history.deleted[0] != obj.value:
+                add(obj.likeable_type, obj.likeable_id, history.deleted[0], -1)
+                add(obj.likeable_type, obj.likeable_id, obj.value, 1)
+
+    return { key: delta for key, delta in deltas.items() if any(delta) }
+
+def apply_likeable_deltas(connection, deltas):
+    """
+    Apply counter changes with relative UPDATEs, in the caller's transaction
+    :param connection: Connection
+    :param deltas: Dict returned by likeable_deltas()
+    """
+    for (likeable_type, likeable_id), (likes_delta, dislikes_delta) in deltas.items():
+        model = likeable_models.get(likeable_type)
+        if model is None:
+            continue
+        table = model.__table__
+        # A vote is not an edit: keep onupdate columns such as updated_at as they are
+        untouched = { column.name: column for column in table.c if column.onupdate is not None }
+        connection.execute(
+            table.update()
+                .where(table.c.id == likeable_id)
+                .values(likes=table.c.likes + likes_delta, dislikes=table.c.dislikes + dislikes_delta, **untouched)
+        )
+
+@event.listens_for(db.session, 'after_flush')
+def maintain_like_counts(session, flush_context):
+    deltas = likeable_deltas(session)
+    if deltas:
+        apply_likeable_deltas(session.connection(), deltas)
@@ -0,0 +1,208 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from flask_praetorian.exceptions import PraetorianError
+from passlib.context import CryptContext
+from threading import BoundedSemaphore, Lock
+import os, time
+
+__all__ = ['PasswordHasher', 'PasswordHasherBusy', 'password_hasher']
+
+class PasswordHasherBusy(PraetorianError):
+    """
+    Raised when too many password hashes are already waiting for the pool
+    """
+    status_code = 503
+
+class PasswordHasher():
+    """
+    Password hashing and verification on a bounded process pool.
+
+    init_app() swaps the guard's passlib context for a proxy, so
+    guard.authenticate() and guard.hash_password() are computed by
+    `workers` processes instead of the request thread. At most
+    `max_pending` hashes are in flight per worker process; a request that
+    cannot get a slot within `queue_seconds` fails fast with
+    PasswordHasherBusy instead of piling up behind a login spike. A slot is
+    only freed once the pool is done with its hash, so timed out requests
+    cannot grow the pool's backlog past `max_pending`. A pool whose process
+    died is replaced on the next hash.
+    PASSWORD_HASH_ROUNDS overrides the cost of the default scheme (see
+    scripts/calibrate_password_hash.py).
+    """
+    def __init__(self, app=None):
+        self._lock = Lock()
+        self._executor = None
+        self._pid = None
+        self.workers = 2
+        self.max_pending = 16
+        self.queue_seconds = 1
+        self.timeout_seconds = 10
+        self._slots = BoundedSemaphore(self.max_pending)
+        self._stats = { 'submitted': 0, 'completed': 0, 'rejected': 0, 'failed': 0, 'wait_seconds': 0.0, 'run_seconds': 0.0 }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', self.max_pending)
+        self.queue_seconds = app.config.get('PASSWORD_HASH_QUEUE_SECONDS', self.queue_seconds)
+        self.timeout_seconds = app.config.get('PASSWORD_HASH_TIMEOUT_SECONDS', self.timeout_seconds)
+        self._slots = BoundedSemaphore(self.max_pending)
+
+        guard = app.extensions['praetorian']
+        context = guard.pwd_ctx
+        rounds = app.config.get('PASSWORD_HASH_ROUNDS')
+        if rounds:
+            context = context.copy(**{ '{}__default_rounds'.format(context.default_scheme()): rounds })
+        self._config = context.to_string()
+        guard.pwd_ctx = PooledCryptContext(context, self)
+
+    def hash(self, password):
+        """
+        Hash a password with the default scheme
+        :param password: String
+        :return: String
+        """
+        return self._run(_hash, self._config, password)
+
+    def verify(self, password, hashed_password):
+        """
+        Check a password against a stored hash
+        :param password: String
+        :param hashed_password: String
+        :return: Boolean
+        """
+        return self._run(_verify, self._config, password, hashed_password)
+
+    def verify_and_update(self, password, hashed_password):
+        """
+        Check a password and rehash it if its hash uses a deprecated scheme or cost
+        :return: Tuple of (Boolean, String or None)
+        """
+        return self._run(_verify_and_update, self._config, password, hashed_password)
+
+    def stats(self):
+        """
+        Queueing metrics of this worker process
+        :return: Dict
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        completed = stats['completed']
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'in_flight': stats['submitted'] - completed - stats['failed'],
+            'submitted': stats['submitted'],
+            'completed': completed,
+            'rejected': stats['rejected'],
+            'failed': stats['failed'],
+            'avg_wait_ms': round(1000 * stats['wait_seconds'] / completed, 1) if completed else None,
+            'avg_run_ms': round(1000 * stats['run_seconds'] / completed, 1) if completed else None,
+        }
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(timeout=self.queue_seconds):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise PasswordHasherBusy('Too many password hashes in progress')
+
+        start = time.perf_counter()
+        with self._lock:
+            self._stats['submitted'] += 1
+        try:
+            try:
+                executor, future = self._submit(function, *args)
+            except Exception:
+                self._slots.release()
+                raise
+            # The slot is held until the pool is done with the hash, even if this request stops waiting for it
+            future.add_done_callback(lambda future: self._slots.release())
+
+            try:
+                result, run_seconds = future.result(timeout=self.timeout_seconds)
+            except TimeoutError:
+                # Drop it if it is still queued, so an overloaded pool does not keep working for requests that gave up
+                future.cancel()
+                raise PasswordHasherBusy('Password hashing timed out')
+            except BrokenProcessPool:
+                self._discard(executor)
+                raise PasswordHasherBusy('Password hashing pool failed')
+        except Exception:
+            with self._lock:
+                self._stats['failed'] += 1
+            raise
+
+        with self._lock:
+            self._stats['completed'] += 1
+            self._stats['run_seconds'] += run_seconds
+            self._stats['wait_seconds'] += time.perf_counter() - start - run_seconds
+        return result
+
+    def _submit(self, function, *args):
+        executor = self._pool()
+        try:
+            return executor, executor.submit(function, *args)
+        except BrokenProcessPool:
+            # A pool process died (e.g. killed for memory), replace the pool once
+            self._discard(executor)
+            executor = self._pool()
+            return executor, executor.submit(function, *args)
+
+    def _discard(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def _pool(self):
+        # Created on first use in each (forked) server process
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+class PooledCryptContext():
+    """
+    Stands in for the guard's CryptContext, hashing and verifying on the pool
+    """
+    def __init__(self, context, hasher):
+        self._context = context
+        self._hasher = hasher
+
+    def hash(self, secret, **kwargs):
+        return self._hasher.hash(secret)
+
+    def verify(self, secret, hash, **kwargs):
+        return self._hasher.verify(secret, hash)
+
+    def verify_and_update(self, secret, hash, **kwargs):
+        return self._hasher.verify_and_update(secret, hash)
+
+    def __getattr__(self, name):
+        # Cheap calls (needs_update, identify, schemes, ...) stay in process
+        return getattr(self._context, name)
+
+password_hasher = PasswordHasher()
+
+# Run in the pool processes, each keeping the context it was sent
+_contexts = {}
+
+def _context(config):
+    context = _contexts.get(config)
+    if context is None:
+        context = _contexts[config] = CryptContext.from_string(config)
+    return context
+
+def _hash(config, password):
+    start = time.perf_counter()
+    return _context(config).hash(password), time.perf_counter() - start
+
+def _verify(config, password, hashed_password):
+    start = time.perf_counter()
+    return _context(config).verify(password, hashed_password), time.perf_counter() - start
+
+def _verify_and_update(config, password, hashed_password):
+    start = time.perf_counter()
+    return _context(config).verify_and_update(password, hashed_password), time.perf_counter() - start
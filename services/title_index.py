@@ -0,0 +1,236 @@
+from extensions import db
+from sqlalchemy import event, inspect
+from array import array
+from bisect import bisect_left
+import unicodedata
+
+from models import Game, Release
+from .events import after_commit
+from .index import InMemoryIndex
+
+__all__ = ['TitleIndex', 'title_index', 'normalize_title']
+
+def normalize_title(text):
+    """
+    Normalize a title the way MySQL's case/accent insensitive collation compares it
+    :param text: String
+    :return: String
+    """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return stripped.casefold()
+
+def trigrams(text):
+    """
+    Get the set of trigrams contained in a normalized string
+    :param text: String
+    :return: Set
+    """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class TitleIndex(InMemoryIndex):
+    """
+    In-process trigram inverted index over Game titles and Release alternate titles.
+
+    Posting lists are sorted arrays of game ids, so a lookup intersects the
+    shortest lists first and then confirms the substring match against the
+    stored titles, giving the same results as `LIKE '%query%'`.
+    """
+    config_prefix = 'TITLE_INDEX'
+
+    def __init__(self, app=None):
+        self._postings = {}
+        self._titles = {}
+        self._alternates = {}
+        self._release_games = {}
+        self._subscribers = []
+        self.version = 0
+        super().__init__(app)
+
+    def build(self):
+        games = db.session.query(Game.id, Game.title).all()
+        releases = db.session.query(Release.id, Release.game_id, Release.alternate_title)\
+            .filter(Release.alternate_title.isnot(None)).all()
+        self.load(games, releases)
+
+    def load(self, games, releases=()):
+        """
+        Replace the index contents
+        :param games: Iterable of (game_id, title)
+        :param releases: Iterable of (release_id, game_id, alternate_title)
+        """
+        titles = {game_id: normalize_title(title) for game_id, title in games}
+        alternates = {}
+        release_games = {}
+        for release_id, game_id, alternate_title in releases:
+            if game_id in titles and alternate_title:
+                alternates.setdefault(game_id, {})[release_id] = normalize_title(alternate_title)
+                release_games[release_id] = game_id
+
+        postings = {}
+        for game_id in sorted(titles):
+            for gram in self._game_trigrams(titles[game_id], alternates.get(game_id)):
+                postings.setdefault(gram, array('i')).append(game_id)
+
+        with self._lock:
+            self._titles = titles
+            self._alternates = alternates
+            self._release_games = release_games
+            self._postings = postings
+            self.version += 1
+            self._mark_built()
+
+    def subscribe(self, fn):
+        """
+        Call fn(game_id, titles) after every committed change to a Game's titles, titles being
+        the normalized title and alternate titles (None once the Game is removed)
+        :param fn: Function
+        """
+        self._subscribers.append(fn)
+
+    def game_titles(self):
+        """
+        Get the normalized title and alternate titles of every indexed Game
+        :return: Dict of game_id => List of Strings
+        """
+        self.ensure_fresh()
+        with self._lock:
+            return {game_id: self._texts(game_id) for game_id in self._titles}
+
+    def search(self, query, limit=None):
+        """
+        Get ids of Games whose title or an alternate release title contains the query
+        :param query: String
+        :param limit: Int
+        :return: List of game ids in ascending order
+        """
+        self.ensure_fresh()
+
+        needle = normalize_title(query)
+        with self._lock:
+            grams = trigrams(needle)
+            if grams:
+                lists = []
+                for gram in grams:
+                    posting = self._postings.get(gram)
+                    if posting is None:
+                        return []
+                    lists.append(posting)
+                lists.sort(key=len)
+                candidates = (game_id for game_id in lists[0] if all(_contains(p, game_id) for p in lists[1:]))
+            else:
+                candidates = sorted(self._titles)
+
+            ids = []
+            for game_id in candidates:
+                if self._matches(game_id, needle):
+                    ids.append(game_id)
+                    if limit is not None and len(ids) >= limit:
+                        break
+            return ids
+
+    def set_title(self, game_id, title):
+        with self._lock:
+            self._reindex(game_id, lambda: self._titles.__setitem__(game_id, normalize_title(title)))
+
+    def remove_game(self, game_id):
+        with self._lock:
+            def remove():
+                self._titles.pop(game_id, None)
+            self._reindex(game_id, remove)
+
+    def set_alternate_title(self, game_id, release_id, alternate_title):
+        with self._lock:
+            self.remove_alternate_title(release_id)
+            if not alternate_title or game_id not in self._titles:
+                return
+
+            def add():
+                self._alternates.setdefault(game_id, {})[release_id] = normalize_title(alternate_title)
+                self._release_games[release_id] = game_id
+            self._reindex(game_id, add)
+
+    def remove_alternate_title(self, release_id):
+        with self._lock:
+            game_id = self._release_games.get(release_id)
+            if game_id is None:
+                return
+
+            def remove():
+                del self._release_games[release_id]
+                self._alternates[game_id].pop(release_id, None)
+            self._reindex(game_id, remove)
+
+    def _reindex(self, game_id, mutate):
+        self.version += 1
+        before = self._game_trigrams(self._titles.get(game_id), self._alternates.get(game_id))
+        mutate()
+        if game_id not in self._titles:
+            for release_id in self._alternates.pop(game_id, {}):
+                self._release_games.pop(release_id, None)
+        after = self._game_trigrams(self._titles.get(game_id), self._alternates.get(game_id))
+
+        for gram in before - after:
+            posting = self._postings[gram]
+            del posting[bisect_left(posting, game_id)]
+            if not posting:
+                del self._postings[gram]
+        for gram in after - before:
+            posting = self._postings.setdefault(gram, array('i'))
+            posting.insert(bisect_left(posting, game_id), game_id)
+
+        texts = self._texts(game_id)
+        for fn in self._subscribers:
+            fn(game_id, texts)
+
+    def _texts(self, game_id):
+        if game_id not in self._titles:
+            return None
+        return [self._titles[game_id]] + list(self._alternates.get(game_id, {}).values())
+
+    def _game_trigrams(self, title, alternates=None):
+        if title is None:
+            return set()
+        grams = trigrams(title)
+        for alternate_title in (alternates or {}).values():
+            grams |= trigrams(alternate_title)
+        return grams
+
+    def _matches(self, game_id, needle):
+        title = self._titles.get(game_id)
+        if title is None:
+            return False
+        if needle in title:
+            return True
+        return any(needle in alternate for alternate in self._alternates.get(game_id, {}).values())
+
+def _contains(posting, game_id):
+    i = bisect_left(posting, game_id)
+    return i < len(posting) and posting[i] == game_id
+
+title_index = TitleIndex()
+
+@event.listens_for(db.session, 'after_flush')
+def track_title_changes(session, flush_context):
+    # Games are applied before Releases so alternate titles always find their Game indexed
+    game_changes = []
+    release_changes = []
+    for obj in session.new:
+        if isinstance(obj, Game):
+            game_changes.append((title_index.set_title, obj.id, obj.title))
+        elif isinstance(obj, Release) and obj.alternate_title:
+            release_changes.append((title_index.set_alternate_title, obj.game_id, obj.id, obj.alternate_title))
+    for obj in session.dirty:
+        if isinstance(obj, Game) and inspect(obj).attrs.title.history.has_changes():
+            game_changes.append((title_index.set_title, obj.id, obj.title))
+        elif isinstance(obj, Release) and (inspect(obj).attrs.alternate_title.history.has_changes()
+                                           or inspect(obj).attrs.game_id.history.has_changes()):
+            release_changes.append((title_index.set_alternate_title, obj.game_id, obj.id, obj.alternate_title))
+    for obj in session.deleted:
+        if isinstance(obj, Game):
+            game_changes.append((title_index.remove_game, obj.id))
+        elif isinstance(obj, Release):
+            release_changes.append((title_index.remove_alternate_title, obj.id))
+
+    for fn, *args in game_changes + release_changes:
+        after_commit(session, lambda fn=fn, args=args: fn(*args))
@@ -0,0 +1,186 @@
+from extensions import db
+from sqlalchemy import event
+from array import array
+import heapq
+import time
+
+from models import Game, GameViewBucket
+from .events import after_commit
+from .index import InMemoryIndex
+from .view_counter import view_counter
+
+__all__ = ['TrendingEngine', 'trending', 'current_hour']
+
+def current_hour():
+    """
+    Get the current hour as hours since the Unix epoch
+    :return: Int
+    """
+    return int(time.time() // 3600)
+
+class TrendingEngine(InMemoryIndex):
+    """
+    Exponentially decayed trending score over a sliding window of hourly view buckets.
+
+    Each game keeps a ring buffer with one slot per hour of the window. A view
+    in hour h adds 2 ** ((h - epoch) / half_life) to the game's score; because
+    every score decays at the same rate, that relative score orders games the
+    same way as the decayed one without rescoring anything as time passes. A
+    bucket leaving the window subtracts its contribution again.
+
+    Buckets are persisted in `game_view_buckets` through the view counter, and
+    each worker re-reads the hours since its previous build every
+    `refresh_seconds` to merge in views recorded by other workers, adding its
+    own views that the view counter has not written yet.
+    """
+    config_prefix = 'TRENDING'
+    refresh_seconds = 60
+
+    def __init__(self, app=None):
+        self.window_hours = 168
+        self.half_life_hours = 24
+        self.top_k = 50
+        self._rings = {}
+        self._scores = {}
+        self._top = []
+        self._epoch = None
+        self._hour = None
+        self._built_hour = None
+        super().__init__(app)
+
+    def init_app(self, app):
+        self.window_hours = app.config.get('TRENDING_WINDOW_HOURS', self.window_hours)
+        self.half_life_hours = app.config.get('TRENDING_HALF_LIFE_HOURS', self.half_life_hours)
+        self.top_k = app.config.get('TRENDING_TOP_K', self.top_k)
+        super().init_app(app)
+
+    def build(self):
+        hour = current_hour()
+        with self._lock:
+            full = self._hour is None
+            # Other workers can only have changed the hours since the previous build (and the one before, still open then)
+            since = hour - self.window_hours + 1 if full else max(min(self._built_hour, hour) - 1, hour - self.window_hours + 1)
+        buckets = db.session.query(GameViewBucket.game_id, GameViewBucket.hour, GameViewBucket.views)\
+            .filter(GameViewBucket.hour >= since, GameViewBucket.hour <= hour).all()
+
+        # The database lacks this worker's views that are still buffered in the view counter
+        views_by_bucket = { (game_id, bucket_hour): views for game_id, bucket_hour, views in buckets }
+        for row_key, amount in view_counter.pending_row_counts(GameViewBucket.views).items():
+            row = dict(row_key)
+            if since <= row['hour'] <= hour:
+                key = (row['game_id'], row['hour'])
+                views_by_bucket[key] = views_by_bucket.get(key, 0) + amount
+
+        with self._lock:
+            if full:
+                self._rings = {}
+                self._scores = {}
+                self._epoch = hour
+                self._hour = hour
+            self._advance(hour)
+            for (game_id, bucket_hour), views in views_by_bucket.items():
+                # Counts only grow: never go below what this worker already counted
+                self._set_bucket(game_id, bucket_hour, max(views, self._bucket(game_id, bucket_hour)))
+            self._built_hour = hour
+            self._recompute_top()
+            self._mark_built()
+
+    def record_view(self, game_id):
+        """
+        Count a page view for a Game
+        :param game_id: Int
+        """
+        hour = current_hour()
+        view_counter.increment_row(GameViewBucket.views, { 'game_id': game_id, 'hour': hour })
+        with self._lock:
+            if self._hour is None:
+                return
+            self._advance(hour)
+            ring = self._ring(game_id)
+            self._set_bucket(game_id, hour, ring[hour % self.window_hours] + 1)
+            self._update_top(game_id)
+
+    def top(self, limit):
+        """
+        Get the ids of the highest scoring Games
+        :param limit: Int (at most top_k)
+        :return: List of game ids
+        """
+        self.ensure_fresh()
+        with self._lock:
+            if current_hour() != self._hour:
+                self._advance(current_hour())
+                self._recompute_top()
+            return [game_id for score, game_id in self._top[:limit]]
+
+    def remove_game(self, game_id):
+        with self._lock:
+            self._rings.pop(game_id, None)
+            if self._scores.pop(game_id, None) is not None:
+                self._recompute_top()
+
+    def _weight(self, hour):
+        return 2.0 ** ((hour - self._epoch) / self.half_life_hours)
+
+    def _ring(self, game_id):
+        ring = self._rings.get(game_id)
+        if ring is None:
+            ring = self._rings[game_id] = array('I', bytes(4 * self.window_hours))
+            self._scores[game_id] = 0.0
+        return ring
+
+    def _bucket(self, game_id, hour):
+        ring = self._rings.get(game_id)
+        if ring is None or hour <= self._hour - self.window_hours or hour > self._hour:
+            return 0
+        return ring[hour % self.window_hours]
+
+    def _set_bucket(self, game_id, hour, views):
+        if hour <= self._hour - self.window_hours or hour > self._hour:
+            return
+        ring = self._ring(game_id)
+        slot = hour % self.window_hours
+        self._scores[game_id] += (views - ring[slot]) * self._weight(hour)
+        ring[slot] = views
+
+    def _advance(self, hour):
+        # Expire the buckets of every hour that slid out of the window
+        if hour <= self._hour:
+            return
+        expired = range(max(self._hour - self.window_hours + 1, hour - 2 * self.window_hours), hour - self.window_hours + 1)
+        for game_id, ring in list(self._rings.items()):
+            for expired_hour in expired:
+                slot = expired_hour % self.window_hours
+                if ring[slot]:
+                    self._scores[game_id] -= ring[slot] * self._weight(expired_hour)
+                    ring[slot] = 0
+            if not any(ring):
+                del self._rings[game_id]
+                del self._scores[game_id]
+        self._hour = hour
+
+        # Rebase long-running workers before the relative weights grow too large
+        if hour - self._epoch > 64 * self.half_life_hours:
+            factor = self._weight(hour)
+            self._scores = {game_id: score / factor for game_id, score in self._scores.items()}
+            self._top = [(score / factor, game_id) for score, game_id in self._top]
+            self._epoch = hour
+
+    def _update_top(self, game_id):
+        entry = (self._scores[game_id], game_id)
+        top = [item for item in self._top if item[1] != game_id]
+        if len(top) < self.top_k or entry > top[-1]:
+            top.append(entry)
+            top.sort(reverse=True)
+            self._top = top[:self.top_k]
+
+    def _recompute_top(self):
+        self._top = heapq.nlargest(self.top_k, ((score, game_id) for game_id, score in self._scores.items() if score > 0))
+
+trending = TrendingEngine()
+
+@event.listens_for(db.session, 'after_flush')
+def track_deleted_games(session, flush_context):
+    for obj in session.deleted:
+        if isinstance(obj, Game):
+            after_commit(session, lambda game_id=obj.id: trending.remove_game(game_id))
@@ -0,0 +1,103 @@
+from extensions import db
+from sqlalchemy import event, inspect
+from collections import OrderedDict
+from threading import Lock
+import time
+
+from models import Favourite, LibraryEntry
+from .events import after_commit
+
+__all__ = ['UserStatusCache', 'user_status']
+
+class UserStatusCache():
+    """
+    Favourite and library membership of a User, for many Games at once.
+
+    Without caching, statuses are read with one query per table restricted to
+    the requested games. With `cache_size` set, the whole membership of each
+    recently active User is loaded once (still one query per table) and kept in
+    an LRU, invalidated when that User's favourites or library entries are
+    committed. Other workers only notice after `cache_seconds`.
+    """
+    def __init__(self, app=None):
+        self._lock = Lock()
+        self._users = OrderedDict()
+        self._generation = 0
+        self.cache_size = 0
+        self.cache_seconds = 60
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.cache_size = app.config.get('USER_STATUS_CACHE_SIZE', self.cache_size)
+        self.cache_seconds = app.config.get('USER_STATUS_CACHE_SECONDS', self.cache_seconds)
+
+    def get(self, user_id, game_ids):
+        """
+        Get the status of each Game for a User
+        :param user_id: Int
+        :param game_ids: List of game ids
+        :return: Dict of game_id => { favourite, library, play_status, score }
+        """
+        if self.cache_size:
+            membership = self._membership(user_id)
+        else:
+            membership = self._load(user_id, game_ids)
+        return { game_id: membership.get(game_id, _status()) for game_id in game_ids }
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+            self._generation += 1
+
+    def _membership(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._users.get(user_id)
+            if cached is not None and now - cached[1] < self.cache_seconds:
+                self._users.move_to_end(user_id)
+                return cached[0]
+            generation = self._generation
+
+        membership = self._load(user_id)
+
+        with self._lock:
+            # Skip caching if a write was committed while loading
+            if self._generation == generation:
+                self._users[user_id] = (membership, now)
+                self._users.move_to_end(user_id)
+                while len(self._users) > self.cache_size:
+                    self._users.popitem(last=False)
+        return membership
+
+    def _load(self, user_id, game_ids=None):
+        favourites = db.session.query(Favourite.game_id).filter(Favourite.user_id == user_id)
+        entries = db.session.query(LibraryEntry.game_id, LibraryEntry.play_status_id, LibraryEntry.score)\
+            .filter(LibraryEntry.user_id == user_id)
+        if game_ids is not None:
+            favourites = favourites.filter(Favourite.game_id.in_(game_ids))
+            entries = entries.filter(LibraryEntry.game_id.in_(game_ids))
+
+        membership = {}
+        for (game_id,) in favourites:
+            membership.setdefault(game_id, _status())['favourite'] = True
+        # The most recent entry wins when a Game is in the library more than once
+        for game_id, play_status_id, score in entries.order_by(LibraryEntry.id.asc()):
+            membership.setdefault(game_id, _status()).update(library=True, play_status=play_status_id, score=score)
+        return membership
+
+def _status():
+    return { 'favourite': False, 'library': False, 'play_status': None, 'score': None }
+
+user_status = UserStatusCache()
+
+@event.listens_for(db.session, 'after_flush')
+def track_membership_changes(session, flush_context):
+    user_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Favourite, LibraryEntry)):
+            user_ids.add(obj.user_id)
+            history = inspect(obj).attrs.user_id.history
+            user_ids.update(history.deleted or ())
+    for user_id in user_ids:
+        after_commit(session, lambda user_id=user_id: user_status.invalidate(user_id))
@@ -0,0 +1,158 @@
+from extensions import db
+from sqlalchemy import case
+from sqlalchemy.dialects.mysql import insert
+from threading import Lock, Thread, Event
+import atexit
+import logging
+
+__all__ = ['ViewCounter', 'view_counter']
+
+logger = logging.getLogger(__name__)
+
+class ViewCounter():
+    """
+    Write-behind buffer for page view counters.
+
+    Increments accumulate in memory per worker and are written as one
+    `UPDATE ... SET col = col + CASE id WHEN ... END` per counter column (or one
+    batched `INSERT ... ON DUPLICATE KEY UPDATE` for counter rows), every
+    `flush_seconds` or as soon as `max_pending` views are buffered, and again
+    when the worker exits. A worker killed without running its exit handlers
+    loses at most `max_unflushed` views while the database is reachable;
+    failed flushes are kept and retried.
+    """
+    def __init__(self, app=None):
+        self._lock = Lock()
+        self._pending = {}
+        self._pending_rows = {}
+        self._flushing_rows = {}
+        self._pending_total = 0
+        self._wakeup = Event()
+        self._thread = None
+        self.app = None
+        self.flush_seconds = 10
+        self.max_pending = 1000
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_seconds = app.config.get('VIEW_COUNTER_FLUSH_SECONDS', self.flush_seconds)
+        self.max_pending = app.config.get('VIEW_COUNTER_MAX_PENDING', self.max_pending)
+        atexit.register(self.flush)
+
+    @property
+    def max_unflushed(self):
+        """
+        Upper bound on views that can be lost if the worker dies abruptly
+        """
+        return self.max_pending
+
+    @property
+    def pending(self):
+        return self._pending_total
+
+    def increment(self, column, id, amount=1):
+        """
+        Buffer a counter increment
+        :param column: Model attribute, e.g. Game.trending_page_views
+        :param id: Int
+        :param amount: Int
+        """
+        key = (column.table, column.key)
+        with self._lock:
+            counts = self._pending.setdefault(key, {})
+            counts[id] = counts.get(id, 0) + amount
+            self._pending_total += amount
+            full = self._pending_total >= self.max_pending
+            self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def increment_row(self, column, key, amount=1):
+        """
+        Buffer an increment of a counter row that may not exist yet
+        :param column: Model attribute holding the count, e.g. GameViewBucket.views
+        :param key: Dict of primary key values, e.g. { 'game_id': 1, 'hour': 448000 }
+        :param amount: Int
+        """
+        table_key = (column.table, column.key)
+        row_key = tuple(sorted(key.items()))
+        with self._lock:
+            counts = self._pending_rows.setdefault(table_key, {})
+            counts[row_key] = counts.get(row_key, 0) + amount
+            self._pending_total += amount
+            full = self._pending_total >= self.max_pending
+            self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def pending_row_counts(self, column):
+        """
+        Get the row increments of a counter that are not in the database yet, including a flush in progress
+        :param column: Model attribute holding the count, e.g. GameViewBucket.views
+        :return: Dict of sorted primary key items => amount
+        """
+        table_key = (column.table, column.key)
+        counts = {}
+        with self._lock:
+            for source in (self._flushing_rows, self._pending_rows):
+                for row_key, amount in source.get(table_key, {}).items():
+                    counts[row_key] = counts.get(row_key, 0) + amount
+        return counts
+
+    def flush(self):
+        """
+        Write all buffered increments to the database
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            pending_rows, self._pending_rows = self._pending_rows, {}
+            self._flushing_rows = pending_rows
+            self._pending_total = 0
+        if not pending and not pending_rows:
+            return
+
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as connection:
+                    for (table, column_name), counts in pending.items():
+                        column = table.c[column_name]
+                        connection.execute(
+                            table.update()
+                                .where(table.c.id.in_(list(counts)))
+                                .values({ column_name: db.func.coalesce(column, 0) + case(counts, value=table.c.id, else_=0) })
+                        )
+                    for (table, column_name), counts in pending_rows.items():
+                        statement = insert(table)
+                        statement = statement.on_duplicate_key_update({ column_name: table.c[column_name] + statement.inserted[column_name] })
+                        connection.execute(statement, [dict(row_key, **{ column_name: amount }) for row_key, amount in counts.items()])
+        except Exception:
+            logger.exception('Unable to flush view counts, retrying on next flush')
+            self._restore(self._pending, pending)
+            self._restore(self._pending_rows, pending_rows)
+        finally:
+            with self._lock:
+                self._flushing_rows = {}
+
+    def _restore(self, target, pending):
+        with self._lock:
+            for key, counts in pending.items():
+                current = target.setdefault(key, {})
+                for id, amount in counts.items():
+                    current[id] = current.get(id, 0) + amount
+                    self._pending_total += amount
+
+    def _ensure_thread(self):
+        # Started lazily so each forked worker runs its own flusher
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = Thread(target=self._run, name='view-counter-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            self.flush()
+
+view_counter = ViewCounter()
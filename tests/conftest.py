@@ -0,0 +1,53 @@
+import os
+
+# Run against an in-memory SQLite database, set before the app reads its config
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+os.environ.setdefault('PRAETORIAN_SECRET_KEY', 'test secret')
+
+import pytest
+from sqlalchemy import event
+
+from app import app as flask_app
+from extensions import db
+from services import view_counter
+
+@pytest.fixture(scope='session')
+def app():
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture(autouse=True)
+def no_view_counts(monkeypatch):
+    # Page views are written with MySQL-only SQL, keep them out of the buffer
+    monkeypatch.setattr(view_counter, 'increment', lambda *args, **kwargs: None)
+    monkeypatch.setattr(view_counter, 'increment_row', lambda *args, **kwargs: None)
+
+@pytest.fixture
+def count_queries(app, client):
+    """
+    Count the statements a GET request sends to the database, once the per-worker indexes are warm
+    :return: Function taking a url and returning (response, Int)
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def count(url, **kwargs):
+        client.get(url, **kwargs)
+        db.session.remove()
+        del statements[:]
+        response = client.get(url, **kwargs)
+        db.session.remove()
+        return response, len(statements)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    yield count
+    event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
@@ -0,0 +1,67 @@
+import pytest
+from datetime import date
+
+from extensions import db
+from models import User, Role, Game, Release, Genre, Developer, Publisher, Platform, Region, DateType
+
+"""
+Query counts of the endpoints served with the loader plans in api/v1/loaders.py
+
+Each count must stay the same however many Releases or Genres a Game has, a
+higher count usually means a relationship the schema dumps is lazy loaded.
+"""
+
+@pytest.fixture(scope='module')
+def catalog(app):
+    """
+    A Game with 20 Releases and 3 Genres, and one with a single Release
+    :return: Dict of name => id
+    """
+    admin = Role(name='admin')
+    user = User(username='loader', email='loader@example.com', password='x', is_verified=1, roles=[admin])
+    platforms = [Platform(name='Platform {}'.format(i)) for i in range(3)]
+    publishers = [Publisher(name='Publisher {}'.format(i)) for i in range(3)]
+    developers = [Developer(name='Developer {}'.format(i)) for i in range(3)]
+    genres = [Genre(name='Genre {}'.format(i)) for i in range(3)]
+    region = Region(name='NA')
+    date_type = DateType(format='Y')
+
+    def game(title, rank, releases, game_genres):
+        slug = title.lower().replace(' ', '-')
+        return Game(
+            title=title, slug=slug, synopsis='Synopsis', icon=slug + '.png', banner=slug + '.png',
+            developer=developers[0], score=80, library_count=0, score_rank=rank, popularity_rank=rank,
+            trending_page_views=0, user=user, genres=game_genres,
+            releases=[
+                Release(platform=platforms[i % 3], publisher=publishers[i % 3], codeveloper=developers[(i + 1) % 3],
+                        region=region, date=date(2000, 1, 1), date_type=date_type, alternate_title='{} {}'.format(title, i))
+                for i in range(releases)
+            ],
+        )
+
+    big = game('Chrono Trigger', 1, 20, genres)
+    small = game('Metroid Prime', 2, 1, genres[:1])
+    db.session.add_all([big, small])
+    db.session.commit()
+    ids = { 'big': big.id, 'small': small.id, 'big_release': big.releases[0].id }
+    db.session.remove()
+    return ids
+
+@pytest.mark.parametrize('url, expected', [
+    ('/api/v1/games/{big}', 3),
+    ('/api/v1/games/', 3),
+    ('/api/v1/games/search?query=chrono', 3),
+    ('/api/v1/releases/game/{big}', 1),
+    ('/api/v1/releases/{big_release}', 1),
+])
+def test_query_count(catalog, count_queries, url, expected):
+    response, queries = count_queries(url.format(**catalog))
+    assert response.status_code == 200
+    assert queries == expected
+
+@pytest.mark.parametrize('url', ['/api/v1/games/{}', '/api/v1/releases/game/{}'])
+def test_query_count_does_not_grow_with_releases(catalog, count_queries, url):
+    big_response, big_queries = count_queries(url.format(catalog['big']))
+    small_response, small_queries = count_queries(url.format(catalog['small']))
+    assert big_response.status_code == small_response.status_code == 200
+    assert big_queries == small_queries
@@ -1,8 +1,9 @@
 # import os, sys
-from extensions import db
+from extensions import db, guard
+from flask_praetorian.exceptions import PraetorianError
 from PIL import Image
 from io import BytesIO
-import base64
+import base64, secrets
 from slugify import slugify
 
 def get_auto_increment(table_name):
@@ -95,4 +96,36 @@ def base64_validation(base64_string, max_file_size):
     return True
 
 def slugify_text(text):
-    return slugify(text, replacements=([['\'', '']]))
\ No newline at end of file
+    return slugify(text, replacements=([['\'', '']]))
+
+def parse_id_list(text):
+    """
+    Parse a comma separated list of ids (e.g. "1,4,7"), ignoring invalid entries
+    :param text: String
+    :return: List of Int
+    """
+    ids = []
+    for part in (text or '').split(','):
+        part = part.strip()
+        if part.isdigit():
+            ids.append(int(part))
+    return ids
+
+def get_current_user_id():
+    """
+    Get the id of the User authenticating the request, on endpoints where authentication is optional
+    :return: Int, None when the request carries no valid token
+    """
+    try:
+        return guard.extract_jwt_token(guard.read_token_from_header()).get('id')
+    except PraetorianError:
+        return None
+
+def image_file_name(name, file_type):
+    """
+    Unique file name for an uploaded image, so a new upload never overwrites a file that is still being served or deleted
+    :param name: String or Int (e.g. the owner's id)
+    :param file_type: String
+    :return: String
+    """
+    return '{}-{}.{}'.format(name, secrets.token_hex(6), file_type)